@@ -0,0 +1,262 @@
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning "this kernel path cannot copy between these two files", not "the copy failed"
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF,
+                   errno.ENOTSOCK}
+
+def human_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+class CopyVerificationError(Exception):
+    pass
+
+class CopyProgress:
+    """A snapshot of a running copy, handed to the progress callback."""
+
+    def __init__(self, source: Path, destination: Path, copied: int, total: int, started: float,
+                 resumed_from: int, method: str, phase: str = "copying"):
+        self.source = source
+        self.destination = destination
+        self.copied = copied
+        self.total = total
+        self.resumed_from = resumed_from
+        self.method = method
+        self.phase = phase
+        self.elapsed = time.monotonic() - started
+
+    @property
+    def fraction(self) -> float:
+        return min(self.copied / self.total, 1.0) if self.total else 1.0
+
+    @property
+    def rate(self) -> float:
+        """Bytes per second copied in this run, not counting a resumed prefix."""
+        return (self.copied - self.resumed_from) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        return (self.total - self.copied) / self.rate if self.rate else None
+
+    def describe(self) -> str:
+        if self.phase == "verifying":
+            return f"Verifying {self.destination.name}..."
+        eta = f", {self.eta:.0f}s left" if self.eta is not None else ""
+        return (f"Copying {self.source.name}: {human_bytes(self.copied)} of {human_bytes(self.total)} "
+                f"({self.fraction:.0%}, {human_bytes(self.rate)}/s{eta})")
+
+class CopyEngine:
+    """
+    Copies one file through the fastest path the platform offers: copy_file_range, then sendfile,
+    then a large-buffer read/write loop. The data is written to <name>.partial next to the
+    destination and renamed into place once complete, so readers never see a half-written file.
+    With a checksum the source has to pass through user space anyway, so the read/write loop hashes
+    each chunk as it copies it; the kernel paths are used for copies with checksum="none".
+
+    Every checkpoint_bytes the partial file is fsynced and the running checksum recorded in
+    <name>.partial.json; a later copy of the same, unchanged source re-hashes the partial file,
+    resumes from the last checkpoint that still matches and finishes with the same checksum.
+    """
+
+    def __init__(self, chunk_size: int = 8 * 1024 * 1024, checksum: str = "sha256", verify: bool = True,
+                 checkpoint_bytes: int = 128 * 1024 * 1024, progress_interval: float = 0.5, zero_copy: bool = True):
+        if checksum != "none" and checksum not in hashlib.algorithms_available:
+            raise ValueError(f"Unknown checksum algorithm: {checksum}")
+        self.chunk_size = chunk_size
+        self.checksum = checksum
+        self.verify = verify and checksum != "none"
+        self.checkpoint_bytes = max(checkpoint_bytes, chunk_size)
+        self.progress_interval = progress_interval
+        self.zero_copy = zero_copy
+
+    @classmethod
+    def from_env(cls) -> "CopyEngine":
+        return cls(
+            chunk_size=int(float(os.getenv("copy_chunk_mb", "8")) * 1024 * 1024),
+            checksum=os.getenv("copy_checksum", "sha256").lower(),
+            verify=os.getenv("copy_verify", "true").lower() == "true",
+            checkpoint_bytes=int(float(os.getenv("copy_checkpoint_mb", "128")) * 1024 * 1024),
+            zero_copy=os.getenv("copy_zero_copy", "true").lower() == "true"
+        )
+
+    @staticmethod
+    def partial_paths(destination: Path):
+        partial = destination.with_name(f".{destination.name}.partial")
+        return partial, partial.with_name(partial.name + ".json")
+
+    def _hasher(self):
+        return hashlib.new(self.checksum) if self.checksum != "none" else None
+
+    def _methods(self) -> List[str]:
+        methods = []
+        # Hashing a kernel copy would read the source a second time
+        if self.zero_copy and self.checksum == "none":
+            if hasattr(os, "copy_file_range"):
+                methods.append("copy_file_range")
+            # Only Linux sendfile writes to regular files; macOS and the BSDs need a socket
+            if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+                methods.append("sendfile")
+        return methods + ["chunked"]
+
+    def _load_state(self, state_path: Path, source_stat: os.stat_result) -> Optional[Dict]:
+        try:
+            state = json.loads(state_path.read_text())
+        except (OSError, ValueError):
+            return None
+        # A changed source, or another checksum, makes the partial file useless
+        if (state.get("size"), state.get("mtime_ns"), state.get("checksum")) != \
+                (source_stat.st_size, source_stat.st_mtime_ns, self.checksum):
+            return None
+        return state
+
+    def _save_state(self, state_path: Path, source_stat: os.stat_result, checkpoints: List[List]):
+        temp = state_path.with_name(state_path.name + ".tmp")
+        temp.write_text(json.dumps({"size": source_stat.st_size, "mtime_ns": source_stat.st_mtime_ns,
+                                    "checksum": self.checksum, "checkpoints": checkpoints}))
+        os.replace(temp, state_path)
+
+    def _verified_offset(self, partial: Path, state: Dict, buffer: bytearray):
+        """Re-hash the partial file; return the last checkpoint it still matches, its hasher and the checkpoints kept."""
+        hasher, offset, kept = self._hasher(), 0, []
+        view = memoryview(buffer)
+        with open(partial, "rb", buffering=0) as handle:
+            for checkpoint_offset, digest in state.get("checkpoints", []):
+                candidate = hasher.copy() if hasher is not None else None
+                position = offset
+                while position < checkpoint_offset:
+                    read = handle.readinto(view[:min(len(buffer), checkpoint_offset - position)])
+                    if not read:
+                        break
+                    if candidate is not None:
+                        candidate.update(view[:read])
+                    position += read
+                if position != checkpoint_offset or (candidate is not None and candidate.hexdigest() != digest):
+                    break
+                hasher, offset = candidate, checkpoint_offset
+                kept.append([checkpoint_offset, digest])
+        return offset, hasher, kept
+
+    def _transfer(self, method: str, src, dst, offset: int, count: int, view: memoryview) -> int:
+        """Copy up to count bytes at offset with one method; returns bytes copied, 0 at end of file."""
+        if method == "copy_file_range":
+            return os.copy_file_range(src.fileno(), dst.fileno(), count, offset, offset)
+        if method == "sendfile":
+            dst.seek(offset)
+            return os.sendfile(dst.fileno(), src.fileno(), offset, count)
+        src.seek(offset)
+        read = src.readinto(view[:count])
+        dst.seek(offset)
+        written = 0
+        while written < read:
+            written += dst.write(view[written:read])
+        return read
+
+    def digest(self, path) -> str:
+        """Checksum of a whole file, with the engine's algorithm (sha256 when checksums are off)."""
+        hasher = self._hasher() or hashlib.sha256()
+        view = memoryview(bytearray(self.chunk_size))
+        with open(path, "rb", buffering=0) as handle:
+            while True:
+                read = handle.readinto(view)
+                if not read:
+                    break
+                hasher.update(view[:read])
+        return hasher.hexdigest()
+
+    def copy(self, source, destination, progress: Callable[[CopyProgress], None] = None,
+             resume: bool = True) -> Dict:
+        """Copy source to destination (a file path); raises OSError or CopyVerificationError on failure."""
+        source, destination = Path(source), Path(destination)
+        source_stat = source.stat()
+        total = source_stat.st_size
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        partial, state_path = self.partial_paths(destination)
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+
+        offset, hasher, checkpoints = 0, self._hasher(), []
+        state = self._load_state(state_path, source_stat) if resume and partial.exists() else None
+        if state is not None:
+            offset, hasher, checkpoints = self._verified_offset(partial, state, buffer)
+            logger.info(f"Resuming copy of {source} at {human_bytes(offset)} of {human_bytes(total)}")
+        resumed_from = offset
+        started = time.monotonic()
+        methods = self._methods()
+        method = methods[0]
+
+        def report(phase: str = "copying"):
+            if progress is not None:
+                progress(CopyProgress(source, destination, offset, total, started, resumed_from, method, phase))
+
+        with open(source, "rb", buffering=0) as src, open(partial, "r+b" if offset else "wb", buffering=0) as dst:
+            dst.truncate(offset)
+            last_report = 0.0
+            next_checkpoint = offset + self.checkpoint_bytes
+            while offset < total:
+                count = min(self.chunk_size, total - offset)
+                try:
+                    copied = self._transfer(method, src, dst, offset, count, view)
+                except OSError as e:
+                    if method == "chunked" or e.errno not in FALLBACK_ERRNOS:
+                        raise
+                    copied = 0
+                if copied == 0 and method != "chunked":
+                    # Not supported between these files (or a 0-byte answer from a pseudo filesystem)
+                    method = methods[methods.index(method) + 1]
+                    continue
+                if copied == 0:
+                    raise OSError(errno.EIO, f"{source} ended at {offset} bytes, expected {total}")
+                if hasher is not None:
+                    hasher.update(view[:copied])
+                offset += copied
+                if offset >= next_checkpoint and offset < total:
+                    os.fsync(dst.fileno())
+                    checkpoints.append([offset, hasher.hexdigest() if hasher is not None else ""])
+                    self._save_state(state_path, source_stat, checkpoints)
+                    next_checkpoint = offset + self.checkpoint_bytes
+                if progress is not None and time.monotonic() - last_report >= self.progress_interval:
+                    last_report = time.monotonic()
+                    report()
+            os.fsync(dst.fileno())
+        report()
+
+        digest = hasher.hexdigest() if hasher is not None else None
+        if self.verify:
+            report("verifying")
+            written = self.digest(partial)
+            if written != digest:
+                # The partial file is wrong somewhere; a resume could not trust any of it
+                partial.unlink(missing_ok=True)
+                state_path.unlink(missing_ok=True)
+                raise CopyVerificationError(f"Checksum mismatch for {destination}: copied {written}, source {digest}")
+        shutil.copystat(source, partial)
+        os.replace(partial, destination)
+        state_path.unlink(missing_ok=True)
+        seconds = time.monotonic() - started
+        logger.info(f"Copied {source} to {destination} ({human_bytes(total)}, {method}, {seconds:.1f}s)")
+        return {
+            "status": "success",
+            "source": str(source),
+            "destination": str(destination),
+            "bytes": total,
+            "seconds": round(seconds, 3),
+            "method": method,
+            "checksum": f"{self.checksum}:{digest}" if digest else None,
+            "verified": self.verify,
+            "resumed_from": resumed_from
+        }
+
+__all__ = ['CopyEngine', 'CopyProgress', 'CopyVerificationError', 'human_bytes']
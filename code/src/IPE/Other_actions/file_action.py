@@ -1,10 +1,14 @@
-from typing import Dict
-import shutil
+from typing import Callable, Dict, List, Tuple
 import os
+import glob
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 import logging
-from langchain_groq import ChatGroq
 from dotenv import load_dotenv
+from createModels.model_router import ModelRouter
+from Other_actions.copy_engine import CopyEngine, CopyProgress, human_bytes
 
 load_dotenv()
 
@@ -14,10 +18,81 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class BatchProgress:
+    """Progress of a folder or glob copy, summed over its files"""
+
+    def __init__(self, files_done: int, files_total: int, copied: int, total: int, started: float):
+        self.files_done = files_done
+        self.files_total = files_total
+        self.copied = copied
+        self.total = total
+        self.elapsed = time.monotonic() - started
+
+    @property
+    def fraction(self) -> float:
+        if self.total:
+            return min(self.copied / self.total, 1.0)
+        return self.files_done / self.files_total if self.files_total else 1.0
+
+    def describe(self) -> str:
+        rate = self.copied / self.elapsed if self.elapsed > 0 else 0.0
+        return (f"{self.files_done} of {self.files_total} files done, {human_bytes(self.copied)} of "
+                f"{human_bytes(self.total)} ({human_bytes(rate)}/s)")
+
 class FileCopyTool:
-    @staticmethod
-    def copy_file(source: str, destination: str) -> Dict[str, str]:
-        """Copy file from source to destination"""
+    GLOB_CHARS = ("*", "?", "[")
+
+    def __init__(self, engine: CopyEngine = None, workers: int = None, skip_identical: str = None):
+        self.engine = engine or CopyEngine.from_env()
+        self.workers = workers or int(os.getenv("copy_workers", "4"))
+        # mtime: same size and modification time, hash: same checksum, none: always copy
+        self.skip_identical = (skip_identical or os.getenv("copy_skip_identical", "mtime")).lower()
+
+    @classmethod
+    def is_glob(cls, source: str) -> bool:
+        """True for a pattern; a path that exists is taken literally, so report[1].txt stays a file name"""
+        return not Path(source).exists() and any(char in source for char in cls.GLOB_CHARS)
+
+    @classmethod
+    def is_batch(cls, source: str) -> bool:
+        """True for a glob pattern or a folder, which copy_many handles"""
+        return Path(source).is_dir() or cls.is_glob(source)
+
+    @classmethod
+    def expand(cls, source: str, destination: str) -> List[Tuple[Path, Path]]:
+        """(source file, destination file) pairs; the layout below the folder or glob base is kept"""
+        dest_root = Path(destination)
+        if cls.is_glob(source):
+            parts = Path(source).parts
+            literal = next(i for i, part in enumerate(parts) if any(char in part for char in cls.GLOB_CHARS))
+            base = Path(*parts[:literal]) if literal else Path(".")
+            files = [Path(match) for match in glob.glob(source, recursive=True)]
+        else:
+            base = Path(source)
+            files = list(base.rglob("*"))
+        pairs = []
+        for path in sorted(files):
+            # Leftovers of an interrupted copy are resumed by the engine, never copied as files
+            if not path.is_file() or path.name.endswith((".partial", ".partial.json", ".partial.json.tmp")):
+                continue
+            pairs.append((path, dest_root / path.relative_to(base)))
+        return pairs
+
+    def is_identical(self, source: Path, destination: Path) -> bool:
+        """Whether destination already holds source, so a rerun can skip it"""
+        if self.skip_identical == "none" or not destination.is_file():
+            return False
+        source_stat, dest_stat = source.stat(), destination.stat()
+        if source_stat.st_size != dest_stat.st_size:
+            return False
+        if self.skip_identical == "hash":
+            return self.engine.digest(source) == self.engine.digest(destination)
+        # The engine copies the modification time, so an unchanged source matches its earlier copy to the
+        # nanosecond; filesystems with coarser timestamps copy again, which is safe, or can use hash mode
+        return abs(source_stat.st_mtime_ns - dest_stat.st_mtime_ns) < 1_000_000
+
+    def copy_file(self, source: str, destination: str, progress: Callable[[CopyProgress], None] = None) -> Dict[str, str]:
+        """Copy file from source to destination, resuming an earlier interrupted copy of the same file"""
         try:
             source_path = Path(source)
             dest_path = Path(destination)
@@ -26,28 +101,102 @@ class FileCopyTool:
             if not source_path.is_file():
                 return {"status": "failed", "message": f"Source file does not exist: {source_path}"}
 
-            # Create destination directory if it doesn't exist
-            dest_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Copy file
-            shutil.copy2(source_path, dest_path)
-            
+            # Copying into an existing folder keeps the file name, as shutil.copy2 did
+            if dest_path.is_dir():
+                dest_path = dest_path / source_path.name
+
+            if self.is_identical(source_path, dest_path):
+                return {"status": "skipped", "source": str(source_path), "destination": str(dest_path),
+                        "message": f"{dest_path} is already identical to {source_path}, nothing copied"}
+
+            result = self.engine.copy(source_path, dest_path, progress=progress)
+
+            details = f"{human_bytes(result['bytes'])} in {result['seconds']:.1f}s"
+            if result["resumed_from"]:
+                details += f", resumed at {human_bytes(result['resumed_from'])}"
+            if result["checksum"]:
+                details += f", {result['checksum']}{' verified' if result['verified'] else ''}"
             return {
-                "status": "success", 
-                "message": f"File copied successfully from {source_path} to {dest_path}"
+                **result,
+                "message": f"File copied successfully from {source_path} to {dest_path} ({details})"
             }
-        
+
         except Exception as e:
             logger.error(f"File copy error: {str(e)}")
             return {"status": "failed", "message": f"Error copying file: {str(e)}"}
 
+    def copy_many(self, source: str, destination: str, progress: Callable[[BatchProgress], None] = None) -> Dict:
+        """Copy every file of a folder or glob on a thread pool; progress is reported from the calling thread"""
+        try:
+            pairs = self.expand(source, destination)
+        except Exception as e:
+            logger.error(f"File expansion error: {str(e)}")
+            return {"status": "failed", "message": f"Error listing {source}: {str(e)}"}
+        if not pairs:
+            return {"status": "failed", "message": f"No files found for {source}"}
+
+        sizes = {path: path.stat().st_size for path, _ in pairs}
+        total = sum(sizes.values())
+        copied = {}
+        lock = threading.Lock()
+        started = time.monotonic()
+
+        def copy_one(pair: Tuple[Path, Path]) -> Dict:
+            path, target = pair
+
+            def file_progress(update: CopyProgress):
+                with lock:
+                    copied[path] = update.copied
+
+            result = self.copy_file(str(path), str(target), progress=file_progress)
+            result.setdefault("source", str(path))
+            with lock:
+                copied[path] = sizes[path]
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(pairs))), thread_name_prefix="file-copy") as pool:
+            futures = [pool.submit(copy_one, pair) for pair in pairs]
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=self.engine.progress_interval)
+                if progress is not None:
+                    with lock:
+                        snapshot = BatchProgress(len(futures) - len(pending), len(futures), sum(copied.values()),
+                                                 total, started)
+                    progress(snapshot)
+        results = [future.result() for future in futures]
+        return self.summarize(source, destination, results, time.monotonic() - started)
+
+    @staticmethod
+    def summarize(source: str, destination: str, results: List[Dict], seconds: float) -> Dict:
+        """One status and chat message for a batch of per-file results"""
+        copied = [result for result in results if result["status"] == "success"]
+        skipped = [result for result in results if result["status"] == "skipped"]
+        failed = [result for result in results if result["status"] == "failed"]
+        copied_bytes = sum(result["bytes"] for result in copied)
+        message = (f"Copied {len(copied)} of {len(results)} files from {source} to {destination} "
+                   f"({human_bytes(copied_bytes)} in {seconds:.1f}s)")
+        if skipped:
+            message += f", {len(skipped)} unchanged files skipped"
+        if failed:
+            message += f", {len(failed)} failed:\n" + "\n".join(f"- {result['source']}: {result['message']}" for result in failed[:10])
+            if len(failed) > 10:
+                message += f"\n- ... and {len(failed) - 10} more"
+        logger.info(message.splitlines()[0])
+        return {
+            "status": "failed" if failed and not (copied or skipped) else "partial" if failed else "success",
+            "copied": len(copied),
+            "skipped": len(skipped),
+            "failed": len(failed),
+            "bytes": copied_bytes,
+            "seconds": round(seconds, 3),
+            "results": results,
+            "message": message
+        }
+
 class FileOperationAgent:
     def __init__(self):
-        self.llm = ChatGroq(
-            api_key=os.getenv("groq_api_key"),
-            model="llama3-70b-8192",
-            temperature=0
-        )
+        self.llm = ModelRouter.shared().for_task("extract", temperature=0)
         self.copy_tool = FileCopyTool()
 
     def extract_paths_from_llm(self, text: str) -> Dict[str, str]:
@@ -56,7 +205,9 @@ class FileOperationAgent:
             prompt = f"""
             Extract the source and destination paths from this command.
             Respond ONLY with the two full paths separated by a pipe symbol (|).
-            Include the filename in both paths.
+            For a single file, include the filename in both paths.
+            For a folder or a wildcard pattern, give the folder or pattern as the source and the
+            destination folder as the destination.
             Do not include any other text or explanations.
 
             Example command:
@@ -64,6 +215,11 @@ class FileOperationAgent:
             Example response:
             C:\\path1\\test.txt|C:\\path2\\test.txt
 
+            Example command:
+            "copy all the .log files from C:\\app\\inbound to C:\\app\\outbound"
+            Example response:
+            C:\\app\\inbound\\*.log|C:\\app\\outbound
+
             Command: {text}
             """
             
@@ -93,8 +249,8 @@ class FileOperationAgent:
             logger.error(f"LLM path extraction failed: {str(e)}")
             return {"status": "failed", "message": f"Error extracting paths: {str(e)}"}
 
-    def process_command(self, command: str) -> str:
-        """Process the command and execute file operation"""
+    def process_command(self, command: str, progress: Callable = None) -> str:
+        """Process the command and execute file operation, reporting copy progress to the callback"""
         try:
             # Validate command format
             if not command.startswith("[run]:"):
@@ -111,10 +267,12 @@ class FileOperationAgent:
             logger.info(f"Extracted source: {paths_result['source']}")
             logger.info(f"Extracted destination: {paths_result['destination']}")
 
-            # Execute file copy
-            copy_result = self.copy_tool.copy_file(
+            # Execute file copy; a folder or glob is copied in one go, file by file in parallel
+            copy = self.copy_tool.copy_many if self.copy_tool.is_batch(paths_result["source"]) else self.copy_tool.copy_file
+            copy_result = copy(
                 paths_result["source"],
-                paths_result["destination"]
+                paths_result["destination"],
+                progress=progress
             )
 
             return copy_result["message"]
@@ -1,18 +1,73 @@
 from langchain_groq import ChatGroq
 import os
+import threading
+import httpx
 from dotenv import load_dotenv
 
 class LLMModel:
   load_dotenv()
-  
+
   #getting keys
- 
+
+  # Shared clients keyed by (model, temperature, max_tokens, timeout, max_retries); every agent and Streamlit session reuses them
+  _clients = {}
+  _lock = threading.Lock()
+  _http_client = None
+  _http_async_client = None
+  _stats = {"created": 0, "reused": 0}
+
+  MODELS = {"lama3": "llama3-70b-8192"}
+
   def __init__(self, llm):
     self.llm = llm
 
+  @classmethod
+  def _http_clients(cls):
+    # One connection pool to the Groq API shared by all profiles; callers hold cls._lock
+    if cls._http_client is None:
+      pool_size = int(os.getenv("groq_pool_size", "20"))
+      limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+      cls._http_client = httpx.Client(limits=limits)
+      cls._http_async_client = httpx.AsyncClient(limits=limits)
+    return cls._http_client, cls._http_async_client
+
+  @classmethod
+  def get_client(cls, model_name: str = "llama3-70b-8192", temperature: float = 0.7, max_tokens: int = None,
+                 timeout: float = None, max_retries: int = 2) -> ChatGroq:
+    """Return the shared client for this profile, creating it on first use."""
+    key = (model_name, float(temperature), max_tokens, timeout, max_retries)
+    client = cls._clients.get(key)
+    if client is not None:
+      with cls._lock:
+        cls._stats["reused"] += 1
+      return client
+    with cls._lock:
+      client = cls._clients.get(key)
+      if client is None:
+        http_client, http_async_client = cls._http_clients()
+        client = ChatGroq(
+          api_key=os.getenv("groq_api_key"),
+          model=model_name,
+          temperature=temperature,
+          max_tokens=max_tokens,
+          timeout=timeout,
+          max_retries=max_retries,
+          http_client=http_client,
+          http_async_client=http_async_client
+        )
+        cls._clients[key] = client
+        cls._stats["created"] += 1
+      else:
+        cls._stats["reused"] += 1
+      return client
+
+  @classmethod
+  def registry_stats(cls) -> dict:
+    with cls._lock:
+      return {"profiles": [list(key) for key in cls._clients], **cls._stats}
+
   def InitialiseLLM(self):
-    groq_api_key = os.getenv("groq_api_key")
     match self.llm:
       case "lama3" :
-         model = ChatGroq(temperature=0.7, model_name="llama3-70b-8192", groq_api_key = groq_api_key)
-         return model
\ No newline at end of file
+         model = self.get_client(self.MODELS["lama3"], temperature=0.7)
+         return model
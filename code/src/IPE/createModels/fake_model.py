@@ -0,0 +1,113 @@
+import asyncio
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from createModels.intent_router import INCIDENT_PATTERN
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local stand-in for a Groq model that needs no API key. Answers are derived from the prompt
+    (intent JSON, an incident analysis with keywords, source|destination paths) and are delivered
+    at a configurable token rate, so latency-dependent code can be exercised offline.
+    """
+
+    model_name: str = "fake"
+    temperature: float = 0.0
+    tokens_per_second: float = 200.0
+    first_token_latency: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @staticmethod
+    def prompt_text(messages: List[BaseMessage]) -> str:
+        return messages[-1].content if messages else ""
+
+    def respond(self, prompt: str) -> str:
+        if "Analyze the following user input" in prompt:
+            user_input = prompt.split("User Input:", 1)[-1].split("there are 3 Rules", 1)[0].strip()
+            match = INCIDENT_PATTERN.search(user_input)
+            if match:
+                return ('{"action_type": "incident", "incident_number": "%s", "search_keywords": null, '
+                        '"conversation_context": null, "confidence": 0.95}' % match.group(0).upper())
+            if re.search(r"\b(search|find|keywords?|articles?)\b", user_input, re.I):
+                return ('{"action_type": "kb_search", "incident_number": null, "search_keywords": "%s", '
+                        '"conversation_context": null, "confidence": 0.85}' % user_input.replace('"', "")[:80])
+            return ('{"action_type": "conversation", "incident_number": null, "search_keywords": null, '
+                    '"conversation_context": "general conversation", "confidence": 0.9}')
+        if "Analyze these incident details" in prompt:
+            match = re.search(r"Short Description:\s*(.+)", prompt)
+            summary = match.group(1).strip() if match else "unknown issue"
+            words = summary.lower().split()
+            keyword = " ".join(words[:2]) or "incident"
+            return (f"1. **Main issue:** {summary}\n"
+                    f"2. **Category/Impact:** Service issue\n"
+                    f"3. **Key technical terms:** {', '.join(words[:4])}\n\n"
+                    f"**Searchable keywords for KB article search:**\n\n"
+                    f"keywords: \"{keyword}\", \"{summary.lower()}\"")
+        if "Extract the source and destination paths" in prompt:
+            command = prompt.split("Command:", 1)[-1]
+            match = re.search(r"from\s+(\S+)\s+to\s+(\S+)", command)
+            return f"{match.group(1)}|{match.group(2)}" if match else "|"
+        return "Hello! I'm running on the local fake model. How can I help you today?"
+
+    def delay(self, text: str) -> float:
+        return self.first_token_latency + len(TOKEN_PATTERN.findall(text)) / self.tokens_per_second
+
+    def result(self, text: str, prompt: str) -> ChatResult:
+        tokens = len(TOKEN_PATTERN.findall(text))
+        message = AIMessage(content=text, usage_metadata={
+            "input_tokens": len(prompt.split()), "output_tokens": tokens, "total_tokens": len(prompt.split()) + tokens
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = self.prompt_text(messages)
+        text = self.respond(prompt)
+        delay, timeout = self.delay(text), kwargs.get("timeout")
+        if timeout is not None and delay > timeout:
+            # Give up at the per-call timeout, as the Groq client does
+            time.sleep(timeout)
+            raise TimeoutError(f"Fake model request timed out after {timeout:.2f}s")
+        time.sleep(delay)
+        return self.result(text, prompt)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = self.prompt_text(messages)
+        text = self.respond(prompt)
+        delay, timeout = self.delay(text), kwargs.get("timeout")
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"Fake model request timed out after {timeout:.2f}s")
+        await asyncio.sleep(delay)
+        return self.result(text, prompt)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for token in TOKEN_PATTERN.findall(self.respond(self.prompt_text(messages))):
+            time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for token in TOKEN_PATTERN.findall(self.respond(self.prompt_text(messages))):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+__all__ = ['FakeChatModel']
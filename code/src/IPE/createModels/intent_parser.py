@@ -0,0 +1,151 @@
+import json
+import re
+from typing import Dict, Optional
+from createModels.intent_router import INCIDENT_PATTERN
+
+ACTION_TYPES = ("incident", "kb_search", "conversation")
+
+# Declared output of the classifier; sent as JSON mode instructions and enforced by validate_intent.
+INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action_type": {"type": "string", "enum": list(ACTION_TYPES)},
+        "incident_number": {"type": ["string", "null"], "pattern": "^INC[0-9]{5,10}$"},
+        "search_keywords": {"type": ["string", "null"]},
+        "conversation_context": {"type": ["string", "null"]},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+    },
+    "required": ["action_type", "confidence"]
+}
+
+FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)\s*(?:```|$)", re.S)
+PY_LITERALS = {"None": "null", "True": "true", "False": "false"}
+PY_LITERAL_PATTERN = re.compile(r"\b(None|True|False)\b")
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+ACTION_FIELD_PATTERN = re.compile(r"[\"']action_type[\"']\s*:\s*[\"'](\w+)[\"']")
+INCIDENT_FIELD_PATTERN = re.compile(r"[\"']incident_number[\"']\s*:\s*(?:[\"']([^\"']*)[\"']|(null|None))")
+
+class IntentParseError(ValueError):
+    pass
+
+def extract_object(text: str) -> str:
+    """
+    Return the first {...} object in text, skipping prose around it. A truncated object is closed
+    (open string, then missing braces) so an answer cut off by max_tokens can still be read.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise IntentParseError("No JSON object in model output")
+    depth = 0
+    quote = None
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:] + (quote or "") + "}" * depth
+
+def repair_json(text: str) -> str:
+    """Fix the defects models commonly produce: code fences, prose, Python literals, single quotes, trailing commas."""
+    fenced = FENCE_PATTERN.search(text)
+    if fenced:
+        text = fenced.group(1)
+    text = extract_object(text)
+    text = PY_LITERAL_PATTERN.sub(lambda match: PY_LITERALS[match.group(1)], text)
+    if '"' not in text:
+        text = text.replace("'", '"')
+    return TRAILING_COMMA_PATTERN.sub(r"\1", text)
+
+def validate_intent(data) -> Dict:
+    """Check a decoded object against INTENT_SCHEMA and normalize it to the InputAnalyzer format."""
+    if not isinstance(data, dict):
+        raise IntentParseError("Intent is not a JSON object")
+    action_type = str(data.get("action_type", "")).strip().lower()
+    if action_type not in ACTION_TYPES:
+        raise IntentParseError(f"Unknown action_type: {data.get('action_type')!r}")
+    incident_number = data.get("incident_number") or None
+    if incident_number is not None:
+        incident_number = str(incident_number).strip().upper()
+        if not INCIDENT_PATTERN.fullmatch(incident_number):
+            incident_number = None
+    if action_type == "incident" and incident_number is None:
+        raise IntentParseError("Incident intent without a valid incident_number")
+    try:
+        confidence = min(max(float(data.get("confidence", 0.0)), 0.0), 1.0)
+    except (TypeError, ValueError):
+        raise IntentParseError(f"Invalid confidence: {data.get('confidence')!r}")
+    return {
+        "action_type": action_type,
+        "incident_number": incident_number,
+        "search_keywords": data.get("search_keywords") or None,
+        "conversation_context": data.get("conversation_context") or None,
+        "confidence": confidence
+    }
+
+def parse_intent(text: str) -> Dict:
+    """Strict json.loads on the fast path, repair only when that fails."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        try:
+            data = json.loads(repair_json(text or ""))
+        except ValueError as e:
+            raise IntentParseError(f"Unparseable intent: {str(e)}")
+    return validate_intent(data)
+
+class IncrementalIntentParser:
+    """
+    Fed the classifier output chunk by chunk. feed() returns an analysis as soon as the stream has
+    shown an incident action_type and an incident_number that appears in the user's own input, so
+    the caller can route without waiting for the rest of the completion; close() parses the full text.
+    Only incidents exit early: their number can be checked against the input, while kb_search
+    keywords and conversation intents still need the model's confidence at the end of the object.
+    """
+
+    def __init__(self, user_input: str = ""):
+        # Whole incident numbers only, so a number cut short by the stream never matches a longer one
+        self.user_numbers = {match.upper() for match in INCIDENT_PATTERN.findall(user_input or "")}
+        self.buffer = ""
+        self.early = None
+
+    def feed(self, chunk: str) -> Optional[Dict]:
+        self.buffer += chunk or ""
+        if self.early is not None:
+            return self.early
+        action = ACTION_FIELD_PATTERN.search(self.buffer)
+        if not action or action.group(1).lower() != "incident":
+            return None
+        incident = INCIDENT_FIELD_PATTERN.search(self.buffer)
+        if not incident or not incident.group(1):
+            return None
+        incident_number = incident.group(1).strip().upper()
+        # Only short-circuit on a number the user actually typed, never on one the model made up
+        if incident_number in self.user_numbers:
+            self.early = {
+                "action_type": "incident",
+                "incident_number": incident_number,
+                "search_keywords": None,
+                "conversation_context": None,
+                "confidence": 1.0,
+                "partial": True
+            }
+        return self.early
+
+    def close(self) -> Dict:
+        return self.early if self.early is not None else parse_intent(self.buffer)
+
+__all__ = ['INTENT_SCHEMA', 'IncrementalIntentParser', 'IntentParseError', 'parse_intent', 'repair_json',
+           'validate_intent']
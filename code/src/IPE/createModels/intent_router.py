@@ -0,0 +1,123 @@
+import re
+import logging
+from typing import Dict, List, Optional
+
+# Incident numbers look like INC0000123; users often type them in lowercase.
+INCIDENT_PATTERN = re.compile(r"\bINC\d{5,10}\b", re.IGNORECASE)
+
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi+|hello|hey|hiya|good (morning|afternoon|evening)|thanks|thank you|thx|bye|goodbye|"
+    r"how are you|what can you do|who are you)\b[\s\w,.!?']{0,30}$",
+    re.IGNORECASE
+)
+
+# A search verb together with a KB noun is an unambiguous KB request; either one alone only hints at it
+# ("why is the KB slow today", "what does this article say").
+KB_SEARCH_VERB_PATTERN = re.compile(r"\b(search|look ?up|recheck|re-check|find)\b", re.IGNORECASE)
+KB_NOUN_PATTERN = re.compile(
+    r"\b(kb|knowledge ?base|articles?|keywords?|known errors?|solutions?|workarounds?)\b",
+    re.IGNORECASE
+)
+KB_WEAK_TRIGGER_PATTERN = re.compile(r"\bfix\b", re.IGNORECASE)
+
+# Everything after one of these markers is treated as the keyword list; explicit markers win.
+KB_KEYWORD_MARKERS = (
+    re.compile(r"\b(?:keywords?|terms?)(?:\s+like)?\s*:?\s+(?P<keywords>.+)$", re.IGNORECASE),
+    re.compile(r"\b(?:like|for|about|on|regarding)\s+(?P<keywords>.+)$", re.IGNORECASE)
+)
+
+KEYWORD_SPLIT_PATTERN = re.compile(r"\s*(?:,|;|\band/or\b|\bor\b|\band\b)\s*", re.IGNORECASE)
+
+FILLER_WORDS = {
+    "can", "could", "you", "please", "help", "me", "with", "the", "a", "an", "some",
+    "search", "find", "look", "up", "lookup", "recheck", "check", "again", "kb", "knowledge",
+    "base", "article", "articles", "solution", "solutions", "related", "to", "any", "i", "want",
+    "need", "more", "keywords", "keyword", "like", "for", "about", "on", "regarding", "workaround",
+    "workarounds"
+}
+
+
+class IntentRouter:
+    """Deterministic rule tier that resolves obvious intents without calling the LLM."""
+
+    def __init__(self, min_confidence: float = 0.85):
+        self.min_confidence = min_confidence
+
+    def _build_analysis(self, action_type: str, confidence: float, incident_number: Optional[str] = None,
+                        search_keywords: Optional[str] = None,
+                        conversation_context: Optional[str] = None) -> Dict:
+        return {
+            "action_type": action_type,
+            "incident_number": incident_number,
+            "search_keywords": search_keywords,
+            "conversation_context": conversation_context,
+            "confidence": confidence
+        }
+
+    def extract_incident_numbers(self, user_input: str) -> List[str]:
+        """Return the distinct incident numbers in the input, upper-cased, in order of appearance."""
+        numbers = []
+        for match in INCIDENT_PATTERN.findall(user_input or ""):
+            number = match.upper()
+            if number not in numbers:
+                numbers.append(number)
+        return numbers
+
+    def extract_search_keywords(self, user_input: str) -> str:
+        """Pull comma separated search terms out of KB search phrasing."""
+        text = user_input.strip().rstrip("?.!")
+        for pattern in KB_KEYWORD_MARKERS:
+            marker = pattern.search(text)
+            if marker:
+                text = marker.group("keywords")
+                break
+
+        terms = []
+        for term in KEYWORD_SPLIT_PATTERN.split(text):
+            words = [word for word in term.strip().strip('"\'').split() if word.lower() not in FILLER_WORDS]
+            cleaned = " ".join(words).strip()
+            if cleaned and cleaned.lower() not in (t.lower() for t in terms):
+                terms.append(cleaned.lower())
+        return ", ".join(terms)
+
+    def classify(self, user_input: str) -> Optional[Dict]:
+        """
+        Classify the input with compiled rules.
+        Returns an analysis dict in the InputAnalyzer format, or None when the rules are not confident.
+        """
+        if not user_input or not user_input.strip():
+            return None
+
+        incident_numbers = self.extract_incident_numbers(user_input)
+        if len(incident_numbers) == 1:
+            return self._build_analysis("incident", 0.95, incident_number=incident_numbers[0])
+        if len(incident_numbers) > 1:
+            # Several incidents in one message is ambiguous, let the LLM decide.
+            return None
+
+        search_verb = KB_SEARCH_VERB_PATTERN.search(user_input)
+        kb_noun = KB_NOUN_PATTERN.search(user_input)
+        # "hey, find kb on vpn" opens like a greeting but is a KB request
+        if GREETING_PATTERN.match(user_input) and not search_verb and not kb_noun:
+            return self._build_analysis("conversation", 0.9, conversation_context="greeting and well-being inquiry")
+
+        if search_verb or kb_noun or KB_WEAK_TRIGGER_PATTERN.search(user_input):
+            keywords = self.extract_search_keywords(user_input)
+            if keywords:
+                return self._build_analysis("kb_search", 0.9 if search_verb and kb_noun else 0.6,
+                                            search_keywords=keywords)
+
+        return None
+
+    def route(self, user_input: str) -> Optional[Dict]:
+        """Return the rule analysis only if it clears the confidence threshold."""
+        try:
+            analysis = self.classify(user_input)
+        except Exception as e:
+            logging.error(f"Error in rule routing: {str(e)}")
+            return None
+        if analysis and analysis["confidence"] >= self.min_confidence:
+            return analysis
+        return None
+
+__all__ = ['IntentRouter', 'INCIDENT_PATTERN']
@@ -1,26 +1,130 @@
 import os
-from langchain_groq import ChatGroq
 from langgraph.graph import StateGraph, MessagesState, START, END
 from typing import Dict, List
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from dotenv import load_dotenv
 from langchain_core.tools import Tool, StructuredTool
 import logging
+import threading
+from collections import Counter
+from createModels.intent_router import IntentRouter
+from createModels.intent_parser import IncrementalIntentParser, parse_intent
+from createModels.model_router import ModelRouter
+from pipelineRuntime.deadline import raise_if_expired
 
 class InputAnalyzer:
     def __init__(self):
-        self.llm = ChatGroq(
-            api_key=os.getenv("groq_api_key"),
-            model="llama3-70b-8192",
-            temperature=0.7,
-            max_tokens=1024
-        )
+        self.llm = ModelRouter.shared().for_task("classify", temperature=0.7, max_tokens=1024)
+        # "stream": route as soon as the intent is readable from the partial output;
+        # "json": JSON mode (no streaming on Groq), parsed once complete
+        self.output_mode = os.getenv("intent_output_mode", "stream").lower()
+        if self.output_mode == "json":
+            self.llm = self.llm.bind(response_format={"type": "json_object"})
+        self.router = IntentRouter(min_confidence=float(os.getenv("rule_router_min_confidence", "0.85")))
+        self.tier_counts = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _record_tier(self, analysis: dict, tier: str) -> dict:
+        analysis["tier"] = tier
+        with self._stats_lock:
+            self.tier_counts[tier] += 1
+        return analysis
+
+    def routing_stats(self) -> dict:
+        """Return how many inputs each tier answered and the share that skipped the LLM."""
+        with self._stats_lock:
+            counts = dict(self.tier_counts)
+        total = sum(counts.values())
+        return {
+            "tiers": counts,
+            "total": total,
+            "llm_bypass_rate": counts.get("rules", 0) / total if total else 0.0
+        }
 
     def analyze_input(self, user_input: str) -> dict:
         """
-        Use LLM to analyze user input and determine appropriate action
+        Resolve obvious intents with the rule tier, fall back to the LLM when rules are not confident.
+        The returned analysis carries a "tier" key: "rules", "llm" or "fallback".
         """
-        prompt = f"""
+        analysis = self.route_by_rules(user_input)
+        if analysis:
+            return analysis
+        return self.analyze_input_with_llm(user_input)
+
+    async def aanalyze_input(self, user_input: str) -> dict:
+        """Async variant of analyze_input."""
+        analysis = self.route_by_rules(user_input)
+        if analysis:
+            return analysis
+        prompt = self.build_prompt(user_input)
+        try:
+            if self.output_mode == "stream":
+                analysis = await self.astream_analysis(user_input, prompt)
+            else:
+                analysis = self.parse_response((await self.llm.ainvoke([HumanMessage(content=prompt)])).content)
+            return self.llm_analysis(analysis)
+        except Exception as e:
+            return self.failed_analysis(e)
+
+    def route_by_rules(self, user_input: str) -> dict:
+        """The rule tier's analysis when it is confident, else None."""
+        analysis = self.router.route(user_input)
+        if analysis:
+            logging.info(f"Input analysis (rules): {analysis}")
+            return self._record_tier(analysis, "rules")
+        return None
+
+    def llm_analysis(self, analysis: dict) -> dict:
+        logging.info(f"Input analysis: {analysis}")
+        return self._record_tier(analysis, "llm")
+
+    def failed_analysis(self, error: Exception) -> dict:
+        # Out of time is the request's answer (OUT_OF_TIME), not a reason to fall back to chat
+        raise_if_expired(error)
+        logging.error(f"Error analyzing input: {str(error)}")
+        return self._record_tier(self.fallback_analysis(), "fallback")
+
+    @staticmethod
+    def fallback_analysis() -> dict:
+        return {
+            "action_type": "conversation",
+            "incident_number": None,
+            "search_keywords": None,
+            "conversation_context": "error handling",
+            "confidence": 1.0
+        }
+
+    @staticmethod
+    def parse_response(content: str) -> dict:
+        # Strict JSON first, repaired JSON second; raises IntentParseError if neither matches the schema
+        return parse_intent(content)
+
+    def stream_analysis(self, user_input: str, prompt: str) -> dict:
+        """Stream the classification and stop reading as soon as the intent can be routed."""
+        parser = IncrementalIntentParser(user_input)
+        stream = self.llm.stream([HumanMessage(content=prompt)])
+        try:
+            for chunk in stream:
+                if parser.feed(chunk.content):
+                    break
+        finally:
+            # Closing the stream ends the completion we no longer need
+            stream.close()
+        return parser.close()
+
+    async def astream_analysis(self, user_input: str, prompt: str) -> dict:
+        parser = IncrementalIntentParser(user_input)
+        stream = self.llm.astream([HumanMessage(content=prompt)])
+        try:
+            async for chunk in stream:
+                if parser.feed(chunk.content):
+                    break
+        finally:
+            await stream.aclose()
+        return parser.close()
+
+    def build_prompt(self, user_input: str) -> str:
+        return f"""
         Analyze the following user input and determine the appropriate action.
         
         User Input: {user_input}
@@ -49,6 +153,12 @@ class InputAnalyzer:
         Remember just give the json object dont give anything prefix test or suffix test just Json object 
         """
 
+    def analyze_input_with_llm(self, user_input: str) -> dict:
+        """
+        Use LLM to analyze user input and determine appropriate action
+        """
+        prompt = self.build_prompt(user_input)
+
         # 1. If the input contains an incident number (format: INCxxxxxxx), this is an incident request then just return the incident number 
         # ---------------------------------------------------
         # example 1:
@@ -84,20 +194,12 @@ class InputAnalyzer:
         # """
 
         try:
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            # Convert the LLM's response to a Python dictionary
-            python_safe_response = response.content.replace('null', 'None')
-            analysis = eval(python_safe_response)
-            logging.info(f"Input analysis: {analysis}")
-            return analysis
+            if self.output_mode == "stream":
+                analysis = self.stream_analysis(user_input, prompt)
+            else:
+                analysis = self.parse_response(self.llm.invoke([HumanMessage(content=prompt)]).content)
+            return self.llm_analysis(analysis)
         except Exception as e:
-            logging.error(f"Error analyzing input: {str(e)}")
-            return {
-                "action_type": "conversation",
-                "incident_number": None,
-                "search_keywords": None,
-                "conversation_context": "error handling",
-                "confidence": 1.0
-            }
+            return self.failed_analysis(e)
         
 __all__ = ['InputAnalyzer']
\ No newline at end of file
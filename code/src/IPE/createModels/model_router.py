@@ -0,0 +1,419 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, AsyncIterator, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import ensure_config
+from createModels.create_model import LLMModel
+from createModels.fake_model import FakeChatModel
+from pipelineRuntime.scheduler import Permit, scheduler
+from pipelineRuntime.deadline import check_deadline, raise_if_expired, remaining
+from pipelineRuntime.metrics import ERRORS, LLM_SECONDS, LLM_TOKENS, record_step
+
+# Which tier serves each kind of call; override with model_profile_<task>=<tier>
+TASK_PROFILES = {
+    "classify": "fast",
+    "extract": "fast",
+    "analyze": "large",
+    "chat": "large"
+}
+
+class ModelTier:
+    """One configured model with its request timeout and the latency it is expected to stay under."""
+
+    def __init__(self, name: str, model_name: str, timeout: float, latency_budget: float, fallback: str = None,
+                 fake_tokens_per_second: float = 200.0, fake_first_token_latency: float = 0.05):
+        self.name = name
+        self.model_name = model_name
+        self.timeout = timeout
+        self.latency_budget = latency_budget
+        self.fallback = fallback
+        self.fake_tokens_per_second = fake_tokens_per_second
+        self.fake_first_token_latency = fake_first_token_latency
+        # Health, updated by ModelRouter.record
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = None
+        self.tokens = 0
+        self.degraded_until = 0.0
+
+    @classmethod
+    def from_env(cls, name: str, model_name: str, timeout: float, latency_budget: float, fallback: str,
+                 fake_tokens_per_second: float, fake_first_token_latency: float) -> "ModelTier":
+        return cls(
+            name=name,
+            model_name=os.getenv(f"model_tier_{name}", model_name),
+            timeout=float(os.getenv(f"model_tier_{name}_timeout", str(timeout))),
+            latency_budget=float(os.getenv(f"model_tier_{name}_latency_budget", str(latency_budget))),
+            fallback=os.getenv(f"model_tier_{name}_fallback", fallback),
+            fake_tokens_per_second=float(os.getenv(f"fake_{name}_tokens_per_second", str(fake_tokens_per_second))),
+            fake_first_token_latency=float(os.getenv(f"fake_{name}_first_token_latency", str(fake_first_token_latency)))
+        )
+
+    def stats(self, now: float) -> Dict:
+        return {
+            "model": self.model_name,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "tokens": self.tokens,
+            "degraded": self.degraded_until > now
+        }
+
+class ModelRouter:
+    """
+    Maps task profiles (classify / extract / analyze / chat) to model tiers.
+    A tier that keeps failing or whose recent latency exceeds its budget is marked degraded for a
+    cooldown period; while degraded, calls go to its fallback tier first. llm_backend=fake serves
+    every tier from FakeChatModel at the tier's configured token rate.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, tiers: Dict[str, ModelTier], profiles: Dict[str, str] = None, backend: str = "groq",
+                 cooldown_seconds: float = 30.0, failure_threshold: int = 2, ewma_alpha: float = 0.2):
+        self.tiers = tiers
+        self.profiles = dict(profiles or TASK_PROFILES)
+        self.backend = backend
+        self.cooldown_seconds = cooldown_seconds
+        self.failure_threshold = failure_threshold
+        self.ewma_alpha = ewma_alpha
+        self._fake_clients = {}
+        # Every tier of a backend shares one account, hence one rate limit
+        self.scheduler = scheduler(backend)
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+        self.task_calls = {task: 0 for task in self.profiles}
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        tiers = {
+            "fast": ModelTier.from_env("fast", "llama-3.1-8b-instant", timeout=5.0, latency_budget=1.5,
+                                       fallback="large", fake_tokens_per_second=800.0, fake_first_token_latency=0.05),
+            "large": ModelTier.from_env("large", "llama3-70b-8192", timeout=30.0, latency_budget=8.0,
+                                        fallback="fast", fake_tokens_per_second=250.0, fake_first_token_latency=0.25)
+        }
+        profiles = {task: os.getenv(f"model_profile_{task}", tier) for task, tier in TASK_PROFILES.items()}
+        return cls(
+            tiers=tiers,
+            profiles=profiles,
+            backend=os.getenv("llm_backend", "groq").lower(),
+            cooldown_seconds=float(os.getenv("model_tier_cooldown", "30"))
+        )
+
+    @classmethod
+    def shared(cls) -> "ModelRouter":
+        """The process-wide router, so tier health is learned from every caller."""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls.from_env()
+        return cls._shared
+
+    def for_task(self, task: str, temperature: float = 0.0, max_tokens: int = None) -> "RoutedChatModel":
+        if task not in self.profiles:
+            raise ValueError(f"Unknown task profile: {task}")
+        return RoutedChatModel(self, task, temperature=temperature, max_tokens=max_tokens)
+
+    def client(self, tier_name: str, temperature: float, max_tokens: int = None):
+        tier = self.tiers[tier_name]
+        if self.backend == "fake":
+            key = (tier_name, float(temperature))
+            with self._lock:
+                client = self._fake_clients.get(key)
+                if client is None:
+                    client = self._fake_clients[key] = FakeChatModel(
+                        model_name=tier.model_name,
+                        temperature=temperature,
+                        tokens_per_second=tier.fake_tokens_per_second,
+                        first_token_latency=tier.fake_first_token_latency
+                    )
+            return client
+        # Fallback does the retrying, so each tier gets a single retry on transient errors
+        return LLMModel.get_client(tier.model_name, temperature=temperature, max_tokens=max_tokens,
+                                   timeout=tier.timeout, max_retries=1)
+
+    def tier_order(self, task: str) -> List[str]:
+        """Primary tier first unless it is degraded, then its fallback."""
+        primary = self.tiers[self.profiles[task]]
+        order = [primary.name]
+        if primary.fallback and primary.fallback in self.tiers and primary.fallback != primary.name:
+            order.append(primary.fallback)
+        with self._lock:
+            self.task_calls[task] = self.task_calls.get(task, 0) + 1
+            if primary.degraded_until > time.monotonic():
+                order.reverse()
+        return order
+
+    def record(self, tier_name: str, latency: float, error: Exception = None, usage: tuple = (0, 0), task: str = None):
+        """Update tier health and export the call's latency and (prompt, completion) token counts."""
+        tier = self.tiers[tier_name]
+        tokens = sum(usage)
+        LLM_SECONDS.observe(latency, task=task, tier=tier_name)
+        record_step(f"llm:{task}:{tier_name}", latency)
+        if error is not None:
+            ERRORS.inc(component="llm")
+        elif tokens:
+            LLM_TOKENS.observe(usage[0], task=task, tier=tier_name, kind="prompt")
+            LLM_TOKENS.observe(usage[1], task=task, tier=tier_name, kind="completion")
+        with self._lock:
+            tier.calls += 1
+            tier.tokens += tokens
+            if error is not None:
+                tier.failures += 1
+                tier.consecutive_failures += 1
+                if "timeout" in type(error).__name__.lower():
+                    tier.timeouts += 1
+            else:
+                tier.consecutive_failures = 0
+                tier.latency_ewma = latency if tier.latency_ewma is None else \
+                    self.ewma_alpha * latency + (1 - self.ewma_alpha) * tier.latency_ewma
+            too_slow = tier.latency_ewma is not None and tier.latency_ewma > tier.latency_budget and tier.calls >= 5
+            if tier.consecutive_failures >= self.failure_threshold or too_slow:
+                if tier.degraded_until <= time.monotonic():
+                    logging.warning(f"Model tier {tier_name} degraded, routing to its fallback for "
+                                    f"{self.cooldown_seconds:.0f}s")
+                tier.degraded_until = time.monotonic() + self.cooldown_seconds
+                # Half-open: the next probe after the cooldown starts from a clean slate
+                tier.consecutive_failures = 0
+                tier.latency_ewma = None
+
+    def record_fallback(self, task: str, tier_name: str, error: Exception):
+        logging.warning(f"Model tier {tier_name} failed for {task} ({type(error).__name__}), trying fallback")
+        with self._lock:
+            self.fallbacks += 1
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "profiles": dict(self.profiles),
+                "task_calls": dict(self.task_calls),
+                "fallbacks": self.fallbacks,
+                "tiers": {name: tier.stats(now) for name, tier in self.tiers.items()}
+            }
+
+class DeadlineCallback(BaseCallbackHandler):
+    """Stops a token stream at the deadline, including the streams LangGraph runs inside invoke()."""
+
+    raise_error = True
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        check_deadline()
+
+def _usage(message) -> tuple:
+    """(prompt, completion) tokens the provider reported for a message or chunk."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+def _stream_usage(reported: tuple, chunks: int, input) -> tuple:
+    # Streams that report no usage are counted as one token per chunk after a chars/4 prompt estimate
+    if sum(reported):
+        return reported
+    return (_prompt_chars(input) // 4, chunks) if chunks else (0, 0)
+
+def _prompt_chars(input) -> int:
+    if isinstance(input, str):
+        return len(input)
+    if isinstance(input, list):
+        return sum(len(str(getattr(message, "content", message))) for message in input)
+    return len(str(input))
+
+class RoutedChatModel:
+    """
+    Chat model facade for one task profile. invoke/ainvoke/stream/astream go to the tier chosen by
+    the router and fall back to the next tier on errors and timeouts; a stream only falls back if
+    it failed before producing its first chunk.
+    """
+
+    def __init__(self, router: ModelRouter, task: str, temperature: float = 0.0, max_tokens: int = None,
+                 **bound_kwargs):
+        self.router = router
+        self.task = task
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # Extra call arguments for every tier, e.g. response_format for JSON mode
+        self.bound_kwargs = bound_kwargs
+
+    @property
+    def model_name(self) -> str:
+        return self.router.tiers[self.router.profiles[self.task]].model_name
+
+    def answered_by_primary(self, result) -> bool:
+        """Whether invoke/ainvoke got result from the task's primary tier rather than a fallback."""
+        primary = self.router.profiles[self.task]
+        return (getattr(result, "response_metadata", None) or {}).get("tier", primary) == primary
+
+    def bind(self, **kwargs) -> "RoutedChatModel":
+        """Same task with other settings, e.g. bind(temperature=0) or bind(response_format=...)."""
+        kwargs = {**self.bound_kwargs, **kwargs}
+        temperature = kwargs.pop("temperature", self.temperature)
+        max_tokens = kwargs.pop("max_tokens", self.max_tokens)
+        return RoutedChatModel(self.router, self.task, temperature=temperature, max_tokens=max_tokens, **kwargs)
+
+    def _client(self, tier_name: str):
+        return self.router.client(tier_name, self.temperature, self.max_tokens)
+
+    def _estimate_tokens(self, input) -> int:
+        # About four characters per token, plus the whole completion budget until usage is reported
+        return _prompt_chars(input) // 4 + (self.max_tokens or 512)
+
+    def _call_kwargs(self, tier_name: str, kwargs: Dict) -> Dict:
+        """Call arguments for one tier; under a deadline the request timeout is cut to the time left."""
+        left = remaining()
+        if left is None:
+            return {**self.bound_kwargs, **kwargs}
+        check_deadline()
+        return {**self.bound_kwargs, "timeout": min(self.router.tiers[tier_name].timeout, left), **kwargs}
+
+    @staticmethod
+    def _config(config):
+        """Add DeadlineCallback to the callbacks the call inherits, when a deadline is set."""
+        if remaining() is None:
+            return config
+        config = ensure_config(config)
+        callbacks = config.get("callbacks")
+        if callbacks is None:
+            callbacks = [DeadlineCallback()]
+        elif isinstance(callbacks, list):
+            callbacks = callbacks + [DeadlineCallback()]
+        else:
+            callbacks = callbacks.copy()
+            callbacks.add_handler(DeadlineCallback(), inherit=False)
+        return {**config, "callbacks": callbacks}
+
+    def _settle(self, permit: Permit, tokens: int):
+        if tokens:
+            permit.charge(tokens=tokens)
+
+    def invoke(self, input, config=None, **kwargs):
+        error = None
+        order = self.router.tier_order(self.task)
+        estimate = self._estimate_tokens(input)
+        for tier_name in order:
+            started = time.perf_counter()
+            try:
+                with self.router.scheduler.acquire(tokens=estimate, timeout=remaining()) as permit:
+                    # Time spent queued for a slot is not the tier's latency
+                    started = time.perf_counter()
+                    result = self._client(tier_name).invoke(input, self._config(config), **self._call_kwargs(tier_name, kwargs))
+                    usage = _usage(result)
+                    self._settle(permit, sum(usage))
+                self.router.record(tier_name, time.perf_counter() - started, usage=usage, task=self.task)
+                result.response_metadata["tier"] = tier_name
+                return result
+            except Exception as e:
+                # Running out of request time says nothing about the tier, and leaves none for a fallback
+                raise_if_expired(e)
+                self.router.record(tier_name, time.perf_counter() - started, error=e, task=self.task)
+                if tier_name != order[-1]:
+                    self.router.record_fallback(self.task, tier_name, e)
+                error = e
+        raise error
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        error = None
+        order = self.router.tier_order(self.task)
+        estimate = self._estimate_tokens(input)
+        for tier_name in order:
+            started = time.perf_counter()
+            try:
+                with await self.router.scheduler.aacquire(tokens=estimate, timeout=remaining()) as permit:
+                    # Time spent queued for a slot is not the tier's latency
+                    started = time.perf_counter()
+                    result = await self._client(tier_name).ainvoke(input, self._config(config), **self._call_kwargs(tier_name, kwargs))
+                    usage = _usage(result)
+                    self._settle(permit, sum(usage))
+                self.router.record(tier_name, time.perf_counter() - started, usage=usage, task=self.task)
+                result.response_metadata["tier"] = tier_name
+                return result
+            except Exception as e:
+                # Running out of request time says nothing about the tier, and leaves none for a fallback
+                raise_if_expired(e)
+                self.router.record(tier_name, time.perf_counter() - started, error=e, task=self.task)
+                if tier_name != order[-1]:
+                    self.router.record_fallback(self.task, tier_name, e)
+                error = e
+        raise error
+
+    def stream(self, input, config=None, **kwargs) -> Iterator:
+        error = None
+        order = self.router.tier_order(self.task)
+        estimate = self._estimate_tokens(input)
+        for tier_name in order:
+            started = time.perf_counter()
+            emitted = 0
+            reported = (0, 0)
+            try:
+                # The slot is held until the stream ends or the consumer closes it
+                with self.router.scheduler.acquire(tokens=estimate, timeout=remaining()) as permit:
+                    started = time.perf_counter()
+                    for chunk in self._client(tier_name).stream(input, self._config(config), **self._call_kwargs(tier_name, kwargs)):
+                        emitted += 1
+                        chunk_usage = _usage(chunk)
+                        reported = (reported[0] + chunk_usage[0], reported[1] + chunk_usage[1])
+                        yield chunk
+                    usage = _stream_usage(reported, emitted, input)
+                    self._settle(permit, sum(usage))
+                self.router.record(tier_name, time.perf_counter() - started, usage=usage, task=self.task)
+                return
+            except GeneratorExit:
+                # The consumer stopped early, e.g. once the intent could be routed
+                self.router.record(tier_name, time.perf_counter() - started,
+                                   usage=_stream_usage(reported, emitted, input), task=self.task)
+                raise
+            except Exception as e:
+                # Running out of request time says nothing about the tier, and leaves none for a fallback
+                raise_if_expired(e)
+                self.router.record(tier_name, time.perf_counter() - started, error=e, task=self.task)
+                if emitted:
+                    raise
+                if tier_name != order[-1]:
+                    self.router.record_fallback(self.task, tier_name, e)
+                error = e
+        raise error
+
+    async def astream(self, input, config=None, **kwargs) -> AsyncIterator:
+        error = None
+        order = self.router.tier_order(self.task)
+        estimate = self._estimate_tokens(input)
+        for tier_name in order:
+            started = time.perf_counter()
+            emitted = 0
+            reported = (0, 0)
+            try:
+                # The slot is held until the stream ends or the consumer closes it
+                with await self.router.scheduler.aacquire(tokens=estimate, timeout=remaining()) as permit:
+                    started = time.perf_counter()
+                    async for chunk in self._client(tier_name).astream(input, self._config(config), **self._call_kwargs(tier_name, kwargs)):
+                        emitted += 1
+                        chunk_usage = _usage(chunk)
+                        reported = (reported[0] + chunk_usage[0], reported[1] + chunk_usage[1])
+                        yield chunk
+                    usage = _stream_usage(reported, emitted, input)
+                    self._settle(permit, sum(usage))
+                self.router.record(tier_name, time.perf_counter() - started, usage=usage, task=self.task)
+                return
+            except GeneratorExit:
+                # The consumer stopped early, e.g. once the intent could be routed
+                self.router.record(tier_name, time.perf_counter() - started,
+                                   usage=_stream_usage(reported, emitted, input), task=self.task)
+                raise
+            except Exception as e:
+                # Running out of request time says nothing about the tier, and leaves none for a fallback
+                raise_if_expired(e)
+                self.router.record(tier_name, time.perf_counter() - started, error=e, task=self.task)
+                if emitted:
+                    raise
+                if tier_name != order[-1]:
+                    self.router.record_fallback(self.task, tier_name, e)
+                error = e
+        raise error
+
+__all__ = ['ModelRouter', 'ModelTier', 'RoutedChatModel', 'TASK_PROFILES']
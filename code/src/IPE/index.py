@@ -1,26 +1,40 @@
 import streamlit as st
 import logging
+import os
 from langchain_core.messages import SystemMessage, HumanMessage
 from IPE.Other_actions.file_action import FileOperationAgent
 from langchainActions.servicenow_tools import WorkflowManager
+from langchainActions.async_servicenow_tools import AsyncWorkflowManager
+from pipelineRuntime.metrics import RequestTrace
 
 logging.basicConfig(level=logging.INFO)
 
+@st.cache_resource(show_spinner="Warming up the workflow...")
 def initialize_workflow():
-    """Initialize the workflow manager and create the workflow chain"""
-    try:
+    """Build the workflow manager and compiled graph once per process; every session shares it"""
+    # async_workflow=true serves all sessions from one event loop instead of a thread per request
+    if os.getenv("async_workflow", "false").lower() == "true":
+        workflow_manager = AsyncWorkflowManager()
+    else:
         workflow_manager = WorkflowManager()
-        workflow_manager.create_workflow()
-        return workflow_manager
+    return workflow_manager.warm_up()
+
+def get_workflow_manager():
+    """Return the shared workflow manager, None if it could not be built"""
+    try:
+        return initialize_workflow()
     except Exception as e:
+        # Exceptions are not cached, so the next request retries the initialization
         logging.error(f"Error initializing workflow: {str(e)}")
         return None
 
+@st.cache_resource
+def get_file_operation_agent():
+    """One FileOperationAgent per process, reused by every [run]: command"""
+    return FileOperationAgent()
+
 def initialize_session_state():
-    """Initialize session state variables"""
-    if 'workflow_manager' not in st.session_state:
-        st.session_state.workflow_manager = initialize_workflow()
-    
+    """Initialize session state variables, only the chat history is kept per session"""
     if 'messages' not in st.session_state:
         welcomeNote = "Hi, I'm a chatbot I can help you with all your queries. How can I help you?"
         st.session_state.messages = [{"role": "assistant", "content": welcomeNote, "type": "text"}]
@@ -30,19 +44,52 @@ def display_sidebar():
     with st.sidebar:
         llmmodel = st.selectbox("Select LLM", ["lama3"], index=0)
         type = st.selectbox("Framework", ["Langchain", "lamaindex"], index=0)
-    return llmmodel, type
+        workflow_manager = get_workflow_manager()
+        if workflow_manager:
+            with st.expander("Upstream queues"):
+                # Concurrency limit, queued calls and wait times per priority class
+                st.json(workflow_manager.scheduler_stats())
+        # Writes a flamegraph (.folded) and hotspot summary per request; off costs nothing
+        st.toggle("Profile requests", key="profile_requests", help="Profile each request and show its hotspots")
+        # Filled after each response, so the panel shows the request that was just answered
+        timing_panel = st.empty()
+    display_request_timing(timing_panel)
+    return llmmodel, type, timing_panel
+
+def display_request_timing(container):
+    """Show where the last request spent its time: classification, each node, ServiceNow and LLM calls"""
+    trace = st.session_state.get("last_trace")
+    if trace is None:
+        return
+    with container.container():
+        with st.expander(f"Last request: {trace.total_ms():.0f} ms", expanded=False):
+            st.dataframe(trace.breakdown(), hide_index=True, use_container_width=True)
+        if trace.profile:
+            with st.expander("Profile", expanded=False):
+                for kind, path in trace.profile["files"].items():
+                    st.caption(f"{kind}: {path}")
+                st.dataframe(trace.profile["hotspots"][:10], hide_index=True, use_container_width=True)
 
 def process_user_input(user_input):
     """Process user input and generate response"""
     try:
-        if not st.session_state.workflow_manager:
+        workflow_manager = get_workflow_manager()
+        if not workflow_manager:
             st.error("Workflow manager not initialized properly")
             return None
         if user_input.startswith("[run]:"):
-           file_operation_manager = FileOperationAgent()
-           response = file_operation_manager.process_command(user_input)
+           file_operation_manager = get_file_operation_agent()
+           # Large copies take minutes; show how far along they are instead of a bare spinner
+           progress_bar = st.progress(0.0, text="Starting file operation...")
+           response = file_operation_manager.process_command(
+               user_input, progress=lambda update: progress_bar.progress(update.fraction, text=update.describe()))
+           progress_bar.empty()
         else:
-            response = st.session_state.workflow_manager.invoke_chain(user_input)
+            # A generator: update_chat_history renders it chunk by chunk
+            st.session_state.last_trace = RequestTrace()
+            # Unchecked leaves the choice to the profile_requests env var
+            response = workflow_manager.stream_chain(user_input, st.session_state.last_trace,
+                                                     profile=st.session_state.get("profile_requests") or None)
         
         # Handle the response
         if response:
@@ -55,15 +102,28 @@ def process_user_input(user_input):
         st.error(f"Error processing request: {str(e)}")
         return None
 
+def render_stream(chunks):
+    """Render streamed chunks into one placeholder as they arrive and return the full text"""
+    placeholder = st.empty()
+    content = ""
+    for chunk in chunks:
+        content += chunk
+        placeholder.markdown(content + "▌", unsafe_allow_html=True)
+    placeholder.markdown(content, unsafe_allow_html=True)
+    return content
+
 def update_chat_history(role, content):
     """Update chat history with new messages"""
     if content:
-        message = {"role": role, "content": content, "type": "text"}
-        st.session_state.messages.append(message)
-        
         # Display the message
         with st.chat_message(role):
-            st.markdown(content,unsafe_allow_html=True)
+            if isinstance(content, str):
+                st.markdown(content,unsafe_allow_html=True)
+            else:
+                content = render_stream(content) or "No response generated"
+
+        message = {"role": role, "content": content, "type": "text"}
+        st.session_state.messages.append(message)
 
 def display_chat_history():
     """Display all messages in chat history"""
@@ -74,12 +134,15 @@ def display_chat_history():
 def main():
     """Main application function"""
     st.title("Integrated Platform Environment")
+
+    # Build (or reuse) the process-wide workflow before the first message is typed
+    get_workflow_manager()
     
     # Initialize session state
     initialize_session_state()
 
     # Setup sidebar
-    llmmodel, framework_type = display_sidebar()
+    llmmodel, framework_type, timing_panel = display_sidebar()
 
     # Display existing chat history
     display_chat_history()
@@ -96,11 +159,12 @@ def main():
         with st.spinner('Processing your request...'):
             response = process_user_input(user_input)
             
-            # Update chat with assistant response
-            if response:
-                update_chat_history("assistant", response)
-            else:
-                update_chat_history("assistant", "I apologize, but I couldn't process your request.")
+        # Update chat with assistant response, streamed responses render as they arrive
+        if response:
+            update_chat_history("assistant", response)
+        else:
+            update_chat_history("assistant", "I apologize, but I couldn't process your request.")
+        display_request_timing(timing_panel)
 
 if __name__ == "__main__":
     main()
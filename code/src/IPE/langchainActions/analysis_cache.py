@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Bump whenever ServiceNowTools.analysis_prompt changes so old analyses are not served for the new prompt.
+ANALYSIS_PROMPT_VERSION = "1"
+
+class MemoryAnalysisBackend:
+    """Bounded in-process LRU store for analyses."""
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class DiskAnalysisBackend:
+    """One JSON file per analysis under a fan-out directory, written atomically so readers never see partial files."""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)["analysis"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Unreadable analysis cache entry {key}: {str(e)}")
+            return None
+
+    def set(self, key: str, value: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"analysis": value, "created_at": time.time()}, f)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    os.remove(os.path.join(root, name))
+
+    def __len__(self):
+        return sum(1 for _, _, files in os.walk(self.directory) for name in files if name.endswith(".json"))
+
+class SqliteAnalysisBackend:
+    """Analyses kept in the shared ResultStore, so they survive restarts and are shared between processes."""
+
+    NAMESPACE = "analysis"
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, key: str) -> Optional[str]:
+        return self.store.get(self.NAMESPACE, key)
+
+    def set(self, key: str, value: str):
+        self.store.put(self.NAMESPACE, key, value)
+
+    def clear(self):
+        self.store.clear(self.NAMESPACE)
+
+    def __len__(self):
+        return self.store.count(self.NAMESPACE)
+
+class AnalysisCache:
+    """
+    Content-addressed cache of LLM incident analyses.
+    The key is a hash of the normalized incident details, prompt version, model name and temperature.
+    Sampled (temperature > 0) answers are only cached when cache_sampled is set; deterministic mode
+    (the from_env default) pins the analysis call to temperature 0 so every answer is cacheable.
+    """
+
+    def __init__(self, backend=None, model_name: str = "", temperature: float = 0.0,
+                 deterministic: bool = False, cache_sampled: bool = False,
+                 prompt_version: str = ANALYSIS_PROMPT_VERSION):
+        self.backend = backend if backend is not None else MemoryAnalysisBackend()
+        self.model_name = model_name
+        self.deterministic = deterministic
+        self.temperature = 0.0 if deterministic else temperature
+        self.cache_sampled = cache_sampled
+        self.prompt_version = prompt_version
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @classmethod
+    def from_env(cls, model_name: str, temperature: float, store=None) -> "AnalysisCache":
+        # With a result store the analyses are persisted there unless another backend is configured
+        backend_name = os.getenv("analysis_cache_backend", "sqlite" if store is not None else "memory").lower()
+        if backend_name == "disk":
+            backend = DiskAnalysisBackend(os.getenv("analysis_cache_dir", "~/.cache/ipe/analyses"))
+        elif backend_name == "sqlite" and store is not None:
+            backend = SqliteAnalysisBackend(store)
+        else:
+            backend = MemoryAnalysisBackend(int(os.getenv("analysis_cache_size", "2000")))
+        return cls(
+            backend=backend,
+            model_name=model_name,
+            temperature=temperature,
+            deterministic=os.getenv("analysis_deterministic", "true").lower() == "true",
+            cache_sampled=os.getenv("analysis_cache_sampled", "false").lower() == "true"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.temperature == 0 or self.cache_sampled
+
+    @staticmethod
+    def normalize(incident_details: str) -> str:
+        text = incident_details or ""
+        if text.startswith("Incident details found:"):
+            text = text[len("Incident details found:"):]
+        return re.sub(r"\s+", " ", text).strip()
+
+    def make_key(self, incident_details: str) -> str:
+        material = "\x1f".join([
+            self.normalize(incident_details),
+            self.prompt_version,
+            self.model_name,
+            f"{self.temperature:.3f}"
+        ])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, incident_details: str) -> Optional[str]:
+        if not self.enabled:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        try:
+            value = self.backend.get(self.make_key(incident_details))
+        except Exception as e:
+            logging.warning(f"Analysis cache read failed: {str(e)}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, incident_details: str, analysis: str):
+        if not self.enabled or not analysis:
+            return
+        try:
+            self.backend.set(self.make_key(incident_details), analysis)
+        except Exception as e:
+            logging.warning(f"Analysis cache write failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "enabled": self.enabled,
+                "deterministic": self.deterministic,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+__all__ = ['AnalysisCache', 'MemoryAnalysisBackend', 'DiskAnalysisBackend', 'SqliteAnalysisBackend',
+           'ANALYSIS_PROMPT_VERSION']
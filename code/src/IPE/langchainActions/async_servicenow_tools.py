@@ -0,0 +1,496 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator
+import httpx
+from langchain_core.messages import HumanMessage
+from langchainActions.servicenow_tools import ServiceNowAPI, ServiceNowTools, WorkflowManager
+from langchainActions.incident_cache import IncidentCache
+from langchainActions.single_flight import AsyncSingleFlight
+from pipelineRuntime.deadline import (DeadlineExceeded, clamp_timeout, raise_if_expired, remaining, request_deadline,
+                                      stage_deadline)
+from pipelineRuntime.scheduler import current_priority
+from pipelineRuntime.metrics import (CLASSIFY_SECONDS, REQUEST_SECONDS, SNOW_SECONDS, RequestTrace, measure,
+                                     request_trace)
+from pipelineRuntime.profiling import profile_request, profile_section
+
+class BackgroundLoop:
+    """A single event loop running in a daemon thread, shared by every sync caller in the process."""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ipe-async-loop", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def shared(cls) -> "BackgroundLoop":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def run(self, coro, timeout: float = None):
+        """Run a coroutine on the background loop and block until it finishes."""
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("BackgroundLoop.run cannot be called from the loop thread, await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+class AsyncServiceNowAPI(ServiceNowAPI):
+    """ServiceNowAPI on top of a pooled httpx.AsyncClient, with the same timeouts and retry policy."""
+
+    def _create_session(self):
+        # The httpx client is bound to the loop it is first used on, so it is created lazily.
+        self._client = None
+        self.in_flight = 0
+        return None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={key: value for key, value in self.headers.items() if value is not None},
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+        return self._client
+
+    def pool_stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "requests": self.request_count,
+                "errors": self.error_count,
+                "in_flight": self.in_flight,
+                "hedging": self.hedge.stats(),
+                "max_size": self.pool_size
+            }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt: int, response: httpx.Response = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.retry_policy.parse_retry_after(retry_after), self.retry_policy.max_retry_after)
+            except Exception:
+                pass
+        return self.retry_policy.backoff_factor * (2 ** attempt)
+
+    def _attempt_timeout(self, timeout):
+        timeout = clamp_timeout(timeout or self.timeout)
+        return httpx.Timeout(timeout[1], connect=timeout[0]) if isinstance(timeout, tuple) else timeout
+
+    async def _backoff(self, delay: float):
+        left = remaining()
+        if left is not None and delay >= left:
+            raise DeadlineExceeded("No time left to retry the ServiceNow read")
+        await asyncio.sleep(delay)
+
+    async def _fetch(self, url: str, params: Dict, timeout) -> Dict:
+        """One read with its retries: the decoded body, {} on an error response."""
+        attempts = (self.retry_policy.total or 0) + 1
+        with self._stats_lock:
+            self.in_flight += 1
+        try:
+            for attempt in range(attempts):
+                # Each attempt queues again, so a retry after a 429 waits out the scheduler's pause
+                with await self.scheduler.aacquire(timeout=remaining()) as permit:
+                    started = time.perf_counter()
+                    try:
+                        response = await self.client.get(url, params=params, timeout=self._attempt_timeout(timeout))
+                    except httpx.TransportError as e:
+                        if attempt + 1 == attempts:
+                            raise
+                        permit.failed(e)
+                        response = None
+                    if response is not None and response.status_code == 429:
+                        permit.throttled(self._retry_delay(attempt, response))
+                if response is None:
+                    await self._backoff(self._retry_delay(attempt))
+                    continue
+                if response.status_code == 200:
+                    self.hedge.record(time.perf_counter() - started)
+                    data = response.json()
+                    logging.debug(f"API Response: {data}")
+                    return data
+                if response.status_code in self.retry_policy.status_forcelist and attempt + 1 < attempts:
+                    await self._backoff(self._retry_delay(attempt, response))
+                    continue
+                logging.error(f"Error: {response.status_code}, {response.text}")
+                self._record_error()
+                return {}
+        finally:
+            with self._stats_lock:
+                self.in_flight -= 1
+
+    async def _hedged_fetch(self, url: str, params: Dict, timeout) -> Dict:
+        # Hedges add load, so only interactive reads are hedged
+        delay = self.hedge.delay() if current_priority() == "interactive" else None
+        if delay is None:
+            return await self._fetch(url, params, timeout)
+        first = asyncio.ensure_future(self._fetch(url, params, timeout))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        self.hedge.launched()
+        second = asyncio.ensure_future(self._fetch(url, params, timeout))
+        pending, data, error = {first, second}, {}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"No response from {url} within the deadline")
+                for task in done:
+                    try:
+                        data = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    if data:
+                        if task is second:
+                            self.hedge.won()
+                        return data
+            if error is not None and not data:
+                raise error
+            return data
+        finally:
+            # The slower attempt is cancelled, which also gives its connection back
+            for task in pending:
+                task.cancel()
+
+    async def get_details(self, url: str, params: Dict = {}, timeout=None) -> Dict:
+        with self._stats_lock:
+            self.request_count += 1
+        table = url.rstrip("/").rsplit("/", 1)[-1]
+        with measure(SNOW_SECONDS, f"snow:{table}", table=table):
+            try:
+                return await self._hedged_fetch(url, params, timeout)
+            except Exception as e:
+                logging.error(f"API request failed: {str(e)}")
+                self._record_error()
+                # An empty result would read as "not found"; a request out of time has to say so
+                raise_if_expired(e)
+                return {}
+
+class AsyncServiceNowTools(ServiceNowTools):
+    """Coroutine versions of the ServiceNow tools; the sync methods run them on the shared loop."""
+
+    def __init__(self):
+        super().__init__(snow_api=AsyncServiceNowAPI())
+        self.loop = BackgroundLoop.shared()
+        # Coalescing futures live on the shared loop, which every call path goes through
+        self.single_flight = AsyncSingleFlight()
+
+    async def afetch_incident_record(self, incident_number: str) -> Dict:
+        """Async variant of fetch_incident_record, sharing the same incident cache."""
+        entry, state = self.incident_cache.lookup(incident_number)
+        if state == IncidentCache.FRESH:
+            logging.info(f"Incident cache hit for {incident_number}")
+            return entry.record
+        try:
+            if state == IncidentCache.STALE:
+                probe = await self.snow_api.get_details(self.snow_api.incident_url,
+                                                        self.incident_params(incident_number, fields='sys_updated_on'))
+                if self.is_empty_result(probe):
+                    return self.settle_refresh(incident_number, entry, probe)
+                probe_record = self.first_record(probe) or {}
+                record = self.incident_cache.revalidate(incident_number, probe_record.get('sys_updated_on'))
+                if record is not None:
+                    logging.info(f"Incident cache revalidated for {incident_number}")
+                    return record
+
+            data = await self.snow_api.get_details(self.snow_api.incident_url, self.incident_params(incident_number))
+        except DeadlineExceeded:
+            if entry is None or not self.incident_cache.within_grace(entry):
+                raise
+            logging.warning(f"Out of time refreshing {incident_number}, serving cached record")
+            return entry.record
+        return self.settle_refresh(incident_number, entry, data)
+
+    async def aquery_incident(self, incident_number: str) -> str:
+        """Query ServiceNow for incident details."""
+        return await self.single_flight.do(("incident", incident_number.strip().upper()),
+                                           self._aquery_incident, incident_number)
+
+    async def _aquery_incident(self, incident_number: str) -> str:
+        logging.info(f"Executing query_incident for {incident_number}")
+        try:
+            record = await self.afetch_incident_record(incident_number)
+            details = self.snow_api.process_data({'result': [record] if record else []})
+            return self.format_incident(incident_number, details)
+        except DeadlineExceeded:
+            # The node turns this into a partial answer
+            raise
+        except Exception as e:
+            logging.error(f"Error in query_incident: {str(e)}")
+            return f"Error querying incident: {str(e)}"
+
+    async def aanalyze_incident(self, incident_details: str) -> str:
+        """Analyze incident details using Llama."""
+        return await self.single_flight.do(("analysis", self.analysis_cache.make_key(incident_details)),
+                                           self._aanalyze_incident, incident_details)
+
+    async def _aanalyze_incident(self, incident_details: str) -> str:
+        logging.info("Executing analyze_incident")
+        try:
+            cached = self.analysis_cache.get(incident_details)
+            if cached is not None:
+                logging.info("Analysis cache hit")
+                return f"Analysis complete: {cached}"
+            response = await self.analysis_llm.ainvoke([HumanMessage(content=self.analysis_prompt(incident_details))])
+            logging.info(f"Analysis result: {response.content}")
+            self.cache_analysis(incident_details, response)
+            return f"Analysis complete: {response.content}"
+        except DeadlineExceeded:
+            # The node turns this into a partial answer
+            raise
+        except Exception as e:
+            logging.error(f"Error in analyze_incident: {str(e)}")
+            return f"Error analyzing incident: {str(e)}"
+
+    async def afind_kb_articles(self, analysis: str) -> str:
+        """Find relevant KB articles based on analysis."""
+        logging.info("Executing find_kb_articles")
+        keywords = self.analyzer.extract_keywords(analysis)
+        if not keywords:
+            return "No keywords found to search with."
+        return await self.asearch_kb_articles(keywords)
+
+    async def asearch_kb_articles(self, keywords: str) -> str:
+        """Search KB articles for comma separated keywords or free text."""
+        return await self.single_flight.do(self.kb_flight_key(keywords), self._asearch_kb_articles, keywords)
+
+    async def _asearch_kb_articles(self, keywords: str) -> str:
+        try:
+            logging.info(f"Searching with keywords: {keywords}")
+            articles = self.search_kb_index(keywords)
+            if articles is None:
+                articles = self.cached_kb_search(keywords)
+            if articles is None:
+                articles = await self.snow_api.get_details(self.kb_url, self.kb_search_params(keywords))
+                self.store_kb_search(keywords, articles)
+            return self.format_kb_articles(articles)
+
+        except DeadlineExceeded:
+            # The node turns this into a partial answer
+            raise
+        except Exception as e:
+            logging.error(f"Error in find_kb_articles: {str(e)}")
+            return f"Error searching KB articles: {str(e)}"
+
+    def fetch_kb_page(self, params: Dict) -> Dict:
+        # Called from the KB index sync thread, never from the loop itself.
+        return self.loop.run(self.snow_api.get_details(self.kb_url, params))
+
+    def fetch_incidents(self, params: Dict) -> Dict:
+        # Bulk triage and watcher threads are never on the loop either
+        return self.loop.run(self.snow_api.get_details(self.snow_api.incident_url, params))
+
+    def query_incident(self, incident_number: str) -> str:
+        return self.loop.run(self.aquery_incident(incident_number))
+
+    def analyze_incident(self, incident_details: str) -> str:
+        return self.loop.run(self.aanalyze_incident(incident_details))
+
+    def find_kb_articles(self, analysis: str) -> str:
+        return self.loop.run(self.afind_kb_articles(analysis))
+
+    def search_kb_articles(self, keywords: str) -> str:
+        return self.loop.run(self.asearch_kb_articles(keywords))
+
+class AsyncWorkflowManager(WorkflowManager):
+    """WorkflowManager whose graph nodes are coroutines; invoke_chain stays a blocking facade."""
+
+    def __init__(self):
+        super().__init__(snow_tools=AsyncServiceNowTools())
+        self.loop = self.snow_tools.loop
+        self.single_flight = AsyncSingleFlight()
+
+    def create_workflow(self):
+        async def query_node(state):
+            try:
+                with stage_deadline("query"):
+                    result = await self.snow_tools.aquery_incident(state["incident_number"])
+            except DeadlineExceeded:
+                return self.timeout_update("query", state.get("related_kb"))
+            except Exception as e:
+                logging.error(f"Error in query_node: {str(e)}")
+                result = f"Error processing incident: {str(e)}"
+            return self.query_update(result)
+
+        async def analyze_node(state):
+            try:
+                with stage_deadline("analyze"):
+                    result = await self.snow_tools.aanalyze_incident(state["details"])
+            except DeadlineExceeded:
+                return self.timeout_update("analyze", state.get("related_kb"))
+            except Exception as e:
+                logging.error(f"Error in analyze_node: {str(e)}")
+                result = f"Error analyzing incident: {str(e)}"
+            return self.analysis_update(result)
+
+        async def kb_node(state):
+            try:
+                with stage_deadline("kb_search"):
+                    result = await self.snow_tools.afind_kb_articles(state["analysis"])
+            except DeadlineExceeded:
+                return self.timeout_update("kb_search", state.get("related_kb"))
+            except Exception as e:
+                logging.error(f"Error in kb_node: {str(e)}")
+                result = f"Error searching KB articles: {str(e)}"
+            return self.kb_update(result, state.get("related_kb"))
+
+        self.chain = self.compile_workflow(query_node, analyze_node, kb_node)
+        return self.chain
+
+    async def arun_incident_workflow(self, incident_number: str, related_kb: str = None) -> str:
+        result = await self.get_chain().ainvoke(self.initial_state(incident_number, related_kb))
+        return self.format_result(result)
+
+    def aspeculate(self, user_input: str) -> Dict:
+        """speculate() with the lookups running as tasks on the shared loop."""
+        return self.speculator.astart(user_input)
+
+    async def aprecomputed_response(self, incident_number: str) -> str:
+        entry = self.precomputed.get(incident_number)
+        if entry is None:
+            return None
+        record = await self.snow_tools.afetch_incident_record(incident_number)
+        return self.assemble_precomputed(incident_number, entry, record)
+
+    async def aclassify(self, user_input: str) -> Dict:
+        with stage_deadline("classify"), profile_section("classify"), \
+                measure(CLASSIFY_SECONDS, "classify", tier="none") as labels:
+            analysis = await self.input_analyzer.aanalyze_input(user_input)
+            labels["tier"] = analysis.get("tier")
+        return analysis
+
+    async def ainvoke_chain(self, user_input: str, trace: RequestTrace = None, profile: bool = None) -> str:
+        # Every node, ServiceNow read and LLM call below shares this request's time budget. A profile
+        # samples the loop thread, so requests running beside this one show up in it too
+        with request_deadline(), request_trace(trace), profile_request(user_input, profile), \
+                measure(REQUEST_SECONDS, "request", action="none") as labels:
+            try:
+                lookups = self.aspeculate(user_input)
+                analysis = await self.aclassify(user_input)
+                logging.info(f"Input routed by {analysis.get('tier')} tier: {analysis['action_type']}")
+                labels["action"] = analysis["action_type"] if analysis["confidence"] >= 0.7 else "unclear"
+                speculation = self.speculator.resolve(lookups, analysis)
+
+                if analysis["confidence"] < 0.7:
+                    return "I'm not quite sure what you're asking for. Could you please rephrase your request?"
+
+                if analysis["action_type"] == "incident":
+                    incident_number = analysis['incident_number']
+                    precomputed = await self.aprecomputed_response(incident_number)
+                    if precomputed:
+                        self.speculator.settle(speculation, precomputed)
+                        return precomputed
+                    response = await self.single_flight.do(("pipeline", incident_number.upper()), self.arun_incident_workflow,
+                                                           incident_number, self.speculator.related_kb(speculation))
+                    self.speculator.settle(speculation, response)
+                    return response
+
+                elif analysis["action_type"] == "kb_search":
+                    with stage_deadline("kb_search"):
+                        return await self.snow_tools.afind_kb_articles(analysis["search_keywords"])
+
+                else:  # conversation
+                    prompt = self.conversation_prompt(user_input, analysis)
+                    with stage_deadline("chat"):
+                        response = await self.chat_llm.ainvoke([HumanMessage(content=prompt)])
+                    return response.content
+
+            except DeadlineExceeded:
+                labels["action"] = "timeout"
+                return self.OUT_OF_TIME
+            except Exception as e:
+                labels["action"] = "error"
+                logging.error("Error processing request", exc_info=True)
+                return f"I encountered an error while processing your request: {str(e)}"
+
+    async def astream_chain(self, user_input: str, trace: RequestTrace = None,
+                            profile: bool = None) -> AsyncIterator[str]:
+        """Async counterpart of WorkflowManager.stream_chain."""
+        # The pump task runs the generator in its own context, so the deadline stays with this request
+        with request_deadline(), request_trace(trace), profile_request(user_input, profile), \
+                measure(REQUEST_SECONDS, "request", action="none") as labels:
+            try:
+                lookups = self.aspeculate(user_input)
+                analysis = await self.aclassify(user_input)
+                logging.info(f"Input routed by {analysis.get('tier')} tier: {analysis['action_type']}")
+                labels["action"] = analysis["action_type"] if analysis["confidence"] >= 0.7 else "unclear"
+                speculation = self.speculator.resolve(lookups, analysis)
+
+                if analysis["confidence"] < 0.7:
+                    yield "I'm not quite sure what you're asking for. Could you please rephrase your request?"
+                elif analysis["action_type"] == "incident":
+                    precomputed = await self.aprecomputed_response(analysis['incident_number'])
+                    if precomputed:
+                        self.speculator.settle(speculation, precomputed)
+                        yield precomputed
+                        return
+                    initial_state = self.initial_state(analysis['incident_number'], self.speculator.related_kb(speculation))
+                    output = ["\n".join(message.content for message in initial_state["messages"])]
+                    yield output[0]
+                    streamed_nodes = set()
+                    async for mode, payload in self.get_chain().astream(initial_state, stream_mode=["updates", "messages"]):
+                        text = self.stream_event_text(mode, payload, streamed_nodes)
+                        if text:
+                            output.append(text)
+                            yield text
+                    self.speculator.settle(speculation, "".join(output))
+                elif analysis["action_type"] == "kb_search":
+                    with stage_deadline("kb_search"):
+                        result = await self.snow_tools.afind_kb_articles(analysis["search_keywords"])
+                    yield result
+                else:  # conversation
+                    prompt = self.conversation_prompt(user_input, analysis)
+                    with stage_deadline("chat"):
+                        async for chunk in self.chat_llm.astream([HumanMessage(content=prompt)]):
+                            if chunk.content:
+                                yield chunk.content
+            except DeadlineExceeded:
+                labels["action"] = "timeout"
+                yield self.OUT_OF_TIME
+            except Exception as e:
+                labels["action"] = "error"
+                logging.error("Error processing request", exc_info=True)
+                yield f"I encountered an error while processing your request: {str(e)}"
+
+    def invoke_chain(self, user_input: str, trace: RequestTrace = None, profile: bool = None) -> str:
+        return self.loop.run(self.ainvoke_chain(user_input, trace, profile))
+
+    def stream_chain(self, user_input: str, trace: RequestTrace = None, profile: bool = None) -> Iterator[str]:
+        """Blocking iterator over astream_chain, fed from the shared loop through a queue."""
+        chunks = queue.Queue()
+        done = object()
+
+        async def pump():
+            stream = self.astream_chain(user_input, trace, profile)
+            try:
+                async for chunk in stream:
+                    chunks.put(chunk)
+            finally:
+                await stream.aclose()
+                chunks.put(done)
+
+        task = asyncio.run_coroutine_threadsafe(pump(), self.loop.loop)
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is done:
+                    return
+                yield chunk
+        finally:
+            # A consumer that stops early must not leave the request running on the loop
+            task.cancel()
+
+__all__ = ['AsyncServiceNowAPI', 'AsyncServiceNowTools', 'AsyncWorkflowManager', 'BackgroundLoop']
@@ -0,0 +1,158 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from createModels.intent_router import INCIDENT_PATTERN
+from langchainActions.servicenow_tools import ServiceNowTools
+from pipelineRuntime.scheduler import request_priority
+
+class BulkTriage:
+    """
+    Runs the query -> analyze -> KB search pipeline over many incidents.
+    Incidents are fetched with one numberIN query per chunk, analysis and KB search run on a bounded
+    thread pool, and results are yielded in completion order so they can be streamed out as JSONL.
+    """
+
+    def __init__(self, snow_tools: ServiceNowTools = None, workers: int = 8, chunk_size: int = 100,
+                 search_kb: bool = True):
+        self.snow_tools = snow_tools or ServiceNowTools()
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.search_kb = search_kb
+
+    @staticmethod
+    def parse_numbers(lines: Iterable[str]) -> List[str]:
+        """Pull incident numbers out of free-form lines, upper-cased and de-duplicated in input order."""
+        seen = {}
+        for line in lines:
+            for match in INCIDENT_PATTERN.findall(line):
+                seen.setdefault(match.upper(), None)
+        return list(seen)
+
+    def fields(self) -> str:
+        return 'number,' + self.snow_tools.INCIDENT_FIELDS
+
+    def fetch_chunk(self, numbers: List[str]) -> Dict[str, Dict]:
+        """Fetch a chunk of incidents in one request and prime the incident cache with them."""
+        params = {
+            'sysparm_query': "numberIN" + ",".join(numbers),
+            'sysparm_limit': str(len(numbers)),
+            'sysparm_fields': self.fields()
+        }
+        data = self.snow_tools.fetch_incidents(params)
+        if not data or 'result' not in data:
+            # get_details answers {} when the request failed, which must not read as "no such incidents"
+            raise ConnectionError(f"Fetching {len(numbers)} incidents from ServiceNow failed")
+        records = {}
+        for record in data['result']:
+            number = (record.get('number') or "").upper()
+            records[number] = record
+            self.snow_tools.incident_cache.put(number, record)
+        return records
+
+    def iter_by_numbers(self, numbers: List[str]) -> Iterator[List[Tuple[str, Union[Dict, Exception, None]]]]:
+        for start in range(0, len(numbers), self.chunk_size):
+            chunk = numbers[start:start + self.chunk_size]
+            try:
+                records = self.fetch_chunk(chunk)
+            except Exception as e:
+                logging.error(f"Fetching chunk {chunk[0]}..{chunk[-1]} failed: {str(e)}")
+                # The error stands in for each record, so those rows are reported as errors
+                yield [(number, e) for number in chunk]
+                continue
+            yield [(number, records.get(number)) for number in chunk]
+
+    def iter_by_query(self, query: str, limit: int = None) -> Iterator[List[Tuple[str, Optional[Dict]]]]:
+        """Page through the incidents matching an encoded query, e.g. active=true^state=1."""
+        offset = 0
+        while limit is None or offset < limit:
+            page_size = self.chunk_size if limit is None else min(self.chunk_size, limit - offset)
+            params = {
+                'sysparm_query': query,
+                'sysparm_limit': str(page_size),
+                'sysparm_offset': str(offset),
+                'sysparm_fields': self.fields()
+            }
+            data = self.snow_tools.fetch_incidents(params)
+            if not data or 'result' not in data:
+                raise ConnectionError(f"Fetching incidents at offset {offset} from ServiceNow failed")
+            batch = data['result']
+            if not batch:
+                return
+            for record in batch:
+                self.snow_tools.incident_cache.put(record.get('number', ''), record)
+            yield [((record.get('number') or "").upper(), record) for record in batch]
+            if len(batch) < page_size:
+                return
+            offset += page_size
+
+    def triage_record(self, incident_number: str, record: Union[Dict, Exception, None]) -> Dict:
+        """Triage one incident; record is None when it does not exist and the fetch error when its chunk failed."""
+        started = time.perf_counter()
+        result = {"incident_number": incident_number, "status": "ok"}
+        try:
+            if isinstance(record, Exception):
+                result["status"] = "error"
+                result["error"] = str(record)
+                return result
+            if not record:
+                result["status"] = "not_found"
+                return result
+            details = self.snow_tools.snow_api.process_data({'result': [record]})
+            result["short_description"] = record.get('short_description')
+            analysis = self.snow_tools.analyze_incident(self.snow_tools.format_incident(incident_number, details))
+            result["analysis"] = analysis
+            if analysis.startswith("Error"):
+                result["status"] = "error"
+            elif self.search_kb:
+                result["kb_articles"] = self.snow_tools.find_kb_articles(analysis)
+            return result
+        except Exception as e:
+            logging.error(f"Triage failed for {incident_number}: {str(e)}")
+            result["status"] = "error"
+            result["error"] = str(e)
+            return result
+        finally:
+            result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def run(self, numbers: List[str] = None, query: str = None, limit: int = None) -> Iterator[Dict]:
+        """Yield one result dict per incident as soon as it completes."""
+        batches = self.iter_by_numbers(numbers) if numbers is not None else self.iter_by_query(query, limit)
+        results = queue.Queue()
+        done = object()
+        # Fetching runs ahead of the workers by at most two tasks per worker
+        slots = threading.BoundedSemaphore(self.workers * 2)
+
+        def on_done(future):
+            slots.release()
+            results.put(future.result())
+
+        def produce():
+            # Bulk runs yield to interactive and watcher calls in the shared upstream schedulers
+            with request_priority("bulk"):
+                executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="triage")
+                try:
+                    for batch in batches:
+                        for incident_number, record in batch:
+                            slots.acquire()
+                            # Pool threads do not inherit the producer's context, so each task runs in a copy
+                            executor.submit(contextvars.copy_context().run, self.triage_record, incident_number,
+                                            record).add_done_callback(on_done)
+                except Exception as e:
+                    logging.error(f"Fetching incidents failed: {str(e)}")
+                    results.put({"status": "error", "error": f"Fetching incidents failed: {str(e)}"})
+                finally:
+                    executor.shutdown(wait=True)
+                    results.put(done)
+
+        threading.Thread(target=produce, name="triage-producer", daemon=True).start()
+        while True:
+            result = results.get()
+            if result is done:
+                return
+            yield result
+
+__all__ = ['BulkTriage']
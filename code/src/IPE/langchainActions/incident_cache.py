@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+class CacheEntry:
+    __slots__ = ("record", "sys_updated_on", "fetched_at")
+
+    def __init__(self, record: Dict, fetched_at: float):
+        self.record = record
+        self.sys_updated_on = record.get("sys_updated_on")
+        self.fetched_at = fetched_at
+
+class IncidentCache:
+    """
+    Size-bounded LRU cache of incident records keyed by incident number.
+    Entries older than the TTL are not dropped but reported as stale, so the caller
+    can revalidate them against sys_updated_on instead of refetching the whole record.
+    With a persistent store, records are written through to it and a miss is served from it
+    as a stale entry, so a restarted process only needs the sys_updated_on probe.
+    When ServiceNow cannot be reached, a stale entry may still be served for stale_grace_seconds
+    past its TTL.
+    """
+
+    FRESH = "fresh"
+    STALE = "stale"
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 60.0, store=None,
+                 stale_grace_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_grace_seconds = stale_grace_seconds
+        self.store = store
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidated = 0
+        self.refetched = 0
+
+    @staticmethod
+    def _key(incident_number: str) -> str:
+        return incident_number.strip().upper()
+
+    def lookup(self, incident_number: str) -> Tuple[Optional[CacheEntry], Optional[str]]:
+        """Return (entry, FRESH|STALE) for a cached incident, or (None, None) on a miss."""
+        key = self._key(incident_number)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            if time.monotonic() - entry.fetched_at <= self.ttl_seconds:
+                self.hits += 1
+                return entry, self.FRESH
+            return entry, self.STALE
+
+    def peek(self, incident_number: str) -> Optional[CacheEntry]:
+        """Read an entry without counting a hit or miss or changing its LRU position."""
+        key = self._key(incident_number)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            record = self.store.get("incident", key)
+            entry = CacheEntry(record, float("-inf")) if record is not None else None
+        return entry
+
+    def _load(self, key: str) -> Optional[CacheEntry]:
+        """Pull a snapshot from the persistent store as an already expired entry; callers hold the lock."""
+        if self.store is None:
+            return None
+        record = self.store.get("incident", key)
+        if record is None:
+            return None
+        entry = self._entries[key] = CacheEntry(record, float("-inf"))
+        self._evict()
+        return entry
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, incident_number: str, record: Dict):
+        key = self._key(incident_number)
+        with self._lock:
+            self._entries[key] = CacheEntry(record, time.monotonic())
+            self._entries.move_to_end(key)
+            self._evict()
+        if self.store is not None:
+            self.store.put("incident", key, record)
+
+    def revalidate(self, incident_number: str, sys_updated_on: Optional[str]) -> Optional[Dict]:
+        """
+        Compare a stale entry with the sys_updated_on reported by ServiceNow.
+        Returns the cached record (and restarts its TTL) when unchanged, otherwise None.
+        """
+        key = self._key(incident_number)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and sys_updated_on and entry.sys_updated_on == sys_updated_on:
+                entry.fetched_at = time.monotonic()
+                self.revalidated += 1
+                return entry.record
+            self.refetched += 1
+            return None
+
+    def within_grace(self, entry: CacheEntry) -> bool:
+        """Whether a stale entry may still stand in for ServiceNow while it is unreachable."""
+        return time.monotonic() - entry.fetched_at <= self.ttl_seconds + self.stale_grace_seconds
+
+    def invalidate(self, incident_number: str):
+        with self._lock:
+            self._entries.pop(self._key(incident_number), None)
+        if self.store is not None:
+            self.store.delete("incident", self._key(incident_number))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidated + self.refetched
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "revalidated": self.revalidated,
+                "refetched": self.refetched,
+                "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0
+            }
+
+__all__ = ['IncidentCache']
@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Dict, Tuple
+from langchainActions.bulk_triage import BulkTriage
+from langchainActions.precomputed_store import PrecomputedStore
+from langchainActions.servicenow_tools import ServiceNowTools
+from pipelineRuntime.scheduler import request_priority
+
+class IncidentWatcher:
+    """
+    Polls ServiceNow for new or updated incidents past a sys_updated_on watermark and pre-computes
+    their analysis and KB articles on a bounded work queue. The watermark is persisted only up to
+    the oldest incident still in progress, so a restart resumes without losing queued work.
+    An incident whose triage fails stays in progress and is retried with exponential backoff.
+    """
+
+    def __init__(self, snow_tools: ServiceNowTools, store: PrecomputedStore, query: str = "state=1",
+                 poll_interval: float = 30.0, workers: int = 4, queue_size: int = 200,
+                 state_path: str = None, page_size: int = 100, retry_backoff: float = 30.0,
+                 retry_backoff_max: float = 900.0):
+        self.snow_tools = snow_tools
+        self.store = store
+        self.query = query
+        self.poll_interval = poll_interval
+        self.workers = workers
+        self.page_size = page_size
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.state_path = os.path.expanduser(state_path) if state_path else None
+        self.work = queue.Queue(maxsize=queue_size)
+        self.triage = BulkTriage(snow_tools=snow_tools)
+        self._lock = threading.Lock()
+        self._in_flight = Counter()
+        self._queued = set()
+        # (number, sys_updated_on) -> (record, attempts, due), for failed incidents still in flight
+        self._retries: Dict[Tuple[str, str], Tuple[Dict, int, float]] = {}
+        self._high_water = ""
+        self._stop = threading.Event()
+        self._threads = []
+        self.processed = 0
+        self.failed = 0
+        self.watermark = self.load_watermark()
+
+    def load_watermark(self) -> str:
+        if not self.state_path or not os.path.exists(self.state_path):
+            return ""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("watermark", "")
+        except Exception as e:
+            logging.error(f"Could not read watcher state: {str(e)}")
+            return ""
+
+    def save_watermark(self):
+        with self._lock:
+            # Never move past an incident that has not been processed yet
+            watermark = min(self._in_flight) if self._in_flight else self._high_water or self.watermark
+            self.watermark = watermark
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"watermark": watermark, "saved_at": time.time()}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def poll_params(self, since: str, offset: int) -> Dict:
+        query = self.query
+        if since:
+            query += f"^sys_updated_on>={since}"
+        return {
+            'sysparm_query': query + "^ORDERBYsys_updated_on",
+            'sysparm_limit': str(self.page_size),
+            'sysparm_offset': str(offset),
+            'sysparm_fields': self.triage.fields()
+        }
+
+    def poll_once(self) -> int:
+        """Queue every incident changed since the watermark; blocks while the work queue is full."""
+        since = self.watermark
+        offset = 0
+        queued = 0
+        while not self._stop.is_set():
+            data = self.snow_tools.fetch_incidents(self.poll_params(since, offset))
+            batch = (data or {}).get('result', [])
+            for record in batch:
+                number = (record.get('number') or "").upper()
+                updated_on = record.get('sys_updated_on') or ""
+                key = (number, updated_on)
+                with self._lock:
+                    if key in self._queued:
+                        continue
+                if not number:
+                    continue
+                # The chat path checks precomputed answers against the incident cache
+                self.snow_tools.incident_cache.put(number, record)
+                if self.store.has_version(number, updated_on):
+                    continue
+                with self._lock:
+                    self._release_older(number, updated_on)
+                    self._queued.add(key)
+                    self._in_flight[updated_on] += 1
+                    self._high_water = max(self._high_water, updated_on)
+                while not self._stop.is_set():
+                    try:
+                        self.work.put((number, record), timeout=1)
+                        queued += 1
+                        break
+                    except queue.Full:
+                        continue
+            if len(batch) < self.page_size:
+                break
+            offset += self.page_size
+        self.save_watermark()
+        return queued
+
+    def _release(self, key: Tuple[str, str]):
+        """Forget a version that is done; callers hold the lock."""
+        self._retries.pop(key, None)
+        self._queued.discard(key)
+        self._in_flight[key[1]] -= 1
+        if self._in_flight[key[1]] <= 0:
+            del self._in_flight[key[1]]
+
+    def _release_older(self, number: str, updated_on: str):
+        # A newer version supersedes a failed one waiting for its retry
+        for key in [key for key in self._retries if key[0] == number and key[1] < updated_on]:
+            self._release(key)
+
+    def process(self, incident_number: str, record: Dict):
+        key = (incident_number, record.get('sys_updated_on') or "")
+        done = False
+        try:
+            result = self.triage.triage_record(incident_number, record)
+            if result["status"] == "ok":
+                details = self.snow_tools.snow_api.process_data({'result': [record]})
+                self.store.put(incident_number, {
+                    "sys_updated_on": key[1],
+                    "details": self.snow_tools.format_incident(incident_number, details),
+                    "analysis": result.get("analysis"),
+                    "kb_articles": result.get("kb_articles")
+                })
+                done = True
+                with self._lock:
+                    self.processed += 1
+            else:
+                with self._lock:
+                    self.failed += 1
+        finally:
+            with self._lock:
+                if key not in self._queued:
+                    pass  # Superseded by a newer version while it ran
+                elif done:
+                    self._release(key)
+                else:
+                    # Still in flight, so the watermark cannot move past it until a retry succeeds
+                    attempts = self._retries.get(key, (None, 0, 0.0))[1] + 1
+                    delay = min(self.retry_backoff * 2 ** (attempts - 1), self.retry_backoff_max)
+                    self._retries[key] = (record, attempts, time.monotonic() + delay)
+                    logging.warning(f"Pre-analysis of {incident_number} failed, retry {attempts} in {delay:.0f}s")
+
+    def requeue_retries(self) -> int:
+        """Queue the failed incidents whose backoff has passed; returns how many were queued."""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for key, (record, attempts, due_at) in self._retries.items():
+                if due_at <= now:
+                    # Not due again until this attempt has run
+                    self._retries[key] = (record, attempts, float("inf"))
+                    due.append((key, record, attempts, due_at))
+        for index, (key, record, attempts, due_at) in enumerate(due):
+            try:
+                self.work.put_nowait((key[0], record))
+            except queue.Full:
+                with self._lock:
+                    for pending in due[index:]:
+                        if pending[0] in self._retries:
+                            self._retries[pending[0]] = pending[1:]
+                return index
+        return len(due)
+
+    def _worker(self):
+        with request_priority("background"):
+            self._work_loop()
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            try:
+                incident_number, record = self.work.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.process(incident_number, record)
+            except Exception as e:
+                logging.error(f"Pre-analysis failed for {incident_number}: {str(e)}")
+            finally:
+                self.work.task_done()
+
+    def _poller(self):
+        with request_priority("background"):
+            self._poll_loop()
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.requeue_retries()
+                queued = self.poll_once()
+                if queued:
+                    logging.info(f"Incident watcher queued {queued} incidents, watermark {self.watermark}")
+            except Exception as e:
+                logging.error(f"Incident watcher poll failed: {str(e)}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._threads:
+            return self
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._worker, name=f"incident-watcher-{i}", daemon=True)
+                         for i in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._poller, name="incident-watcher-poll", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logging.info(f"Incident watcher started from watermark '{self.watermark}'")
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self.save_watermark()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "watermark": self.watermark,
+                "queue_depth": self.work.qsize(),
+                "in_flight": sum(self._in_flight.values()),
+                "processed": self.processed,
+                "failed": self.failed,
+                "retrying": len(self._retries),
+                "store": self.store.stats()
+            }
+
+__all__ = ['IncidentWatcher']
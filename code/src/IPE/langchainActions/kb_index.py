@@ -0,0 +1,273 @@
+import gzip
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+KB_FIELDS = ("number", "short_description", "kb_cause", "kb_workaround")
+# Matches in the title count more than matches in the cause/workaround text.
+FIELD_WEIGHTS = {"number": 3.0, "short_description": 2.0, "kb_cause": 1.0, "kb_workaround": 1.0}
+INDEX_FORMAT_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "the", "to", "with", "not", "no", "was", "when", "this", "that", "can", "i", "my"
+}
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower())
+            if token not in STOP_WORDS and len(token) > 1]
+
+class KBIndex:
+    """
+    In-process BM25 index over the known error articles.
+    Articles are synced incrementally from the table API by sys_updated_on and the postings
+    are persisted to a gzipped JSON file so a restart does not need a full resync.
+    Incremental syncs never see deleted or retired articles, so a full sync replaces the
+    index every full_sync_interval seconds.
+    """
+
+    def __init__(self, path: str = None, max_age_seconds: float = 3600.0, k1: float = 1.2, b: float = 0.75,
+                 full_sync_interval: float = 86400.0):
+        self.path = os.path.expanduser(path) if path else None
+        self.max_age_seconds = max_age_seconds
+        self.full_sync_interval = full_sync_interval
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._sync_listeners: List[Callable[[], None]] = []
+        self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self.docs: List[Optional[Dict]] = []
+            self.doc_ids: Dict[str, int] = {}
+            self.doc_lengths: List[float] = []
+            self.postings: Dict[str, Dict[int, float]] = {}
+            self.doc_terms: List[Dict[str, float]] = []
+            self.total_length = 0.0
+            self.watermark = ""
+            self.last_sync = 0.0
+            self.last_full_sync = 0.0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @staticmethod
+    def doc_key(article: Dict) -> str:
+        return article.get("sys_id") or article.get("number", "")
+
+    def documents(self) -> List[Dict]:
+        with self._lock:
+            return [doc for doc in self.docs if doc is not None]
+
+    def add_sync_listener(self, listener: Callable[[], None]):
+        """Register a callback run after every successful sync."""
+        self._sync_listeners.append(listener)
+
+    def is_stale(self) -> bool:
+        return not self.doc_ids or time.time() - self.last_sync > self.max_age_seconds
+
+    def full_sync_due(self) -> bool:
+        return self.full_sync_interval > 0 and time.time() - self.last_full_sync > self.full_sync_interval
+
+    def _swap_in(self, staged: "KBIndex"):
+        """Replace the live postings with a fully built index in one step."""
+        with self._lock:
+            self.docs = staged.docs
+            self.doc_ids = staged.doc_ids
+            self.doc_lengths = staged.doc_lengths
+            self.postings = staged.postings
+            self.doc_terms = staged.doc_terms
+            self.total_length = staged.total_length
+            self.watermark = staged.watermark
+
+    def _weighted_terms(self, article: Dict) -> Dict[str, float]:
+        terms = Counter()
+        for field in KB_FIELDS:
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(str(article.get(field) or "")):
+                terms[token] += weight
+        return dict(terms)
+
+    def _remove(self, ordinal: int):
+        for term in self.doc_terms[ordinal]:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(ordinal, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths[ordinal]
+        self.doc_terms[ordinal] = {}
+        self.doc_lengths[ordinal] = 0.0
+        self.docs[ordinal] = None
+
+    def upsert(self, articles: List[Dict]):
+        """Add or replace articles, keeping postings and the sys_updated_on watermark current."""
+        with self._lock:
+            for article in articles:
+                key = self.doc_key(article)
+                if not key:
+                    continue
+                ordinal = self.doc_ids.get(key)
+                if ordinal is None:
+                    ordinal = len(self.docs)
+                    self.doc_ids[key] = ordinal
+                    self.docs.append(None)
+                    self.doc_lengths.append(0.0)
+                    self.doc_terms.append({})
+                else:
+                    self._remove(ordinal)
+
+                terms = self._weighted_terms(article)
+                self.docs[ordinal] = {field: article.get(field) for field in KB_FIELDS + ("sys_id", "sys_updated_on")}
+                self.doc_terms[ordinal] = terms
+                self.doc_lengths[ordinal] = sum(terms.values())
+                self.total_length += self.doc_lengths[ordinal]
+                for term, weight in terms.items():
+                    self.postings.setdefault(term, {})[ordinal] = weight
+
+                updated_on = article.get("sys_updated_on") or ""
+                if updated_on > self.watermark:
+                    self.watermark = updated_on
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """Rank articles for the query with BM25 over the weighted fields."""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            doc_count = len(self.doc_ids)
+            if not query_terms or not doc_count:
+                return []
+            avg_length = self.total_length / doc_count or 1.0
+            scores: Dict[int, float] = {}
+            for term in query_terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for ordinal, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ordinal] / avg_length)
+                    scores[ordinal] = scores.get(ordinal, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [dict(self.docs[ordinal], score=round(score, 4)) for ordinal, score in top]
+
+    def sync_params(self, since: str, offset: int, page_size: int) -> Dict:
+        query = "ORDERBYsys_updated_on"
+        if since:
+            query = f"sys_updated_on>={since}^" + query
+        return {
+            'sysparm_query': query,
+            'sysparm_fields': ",".join(KB_FIELDS + ("sys_id", "sys_updated_on")),
+            'sysparm_limit': str(page_size),
+            'sysparm_offset': str(offset)
+        }
+
+    def sync(self, fetch: Callable[[Dict], Dict], page_size: int = 500, full: bool = False) -> int:
+        """
+        Pull articles changed since the watermark (or everything when full=True) page by page.
+        A full sync is built into a separate index and swapped in once complete, so searches keep
+        using the old postings meanwhile and articles removed upstream drop out of the index.
+        fetch takes table API params and returns the decoded JSON response.
+        Returns the number of articles received, or -1 if another sync is already running.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return -1
+        try:
+            target = KBIndex(k1=self.k1, b=self.b) if full else self
+            # The watermark moves while pages are applied, so paging uses the value from the start.
+            since = target.watermark
+            received = 0
+            offset = 0
+            while True:
+                data = fetch(self.sync_params(since, offset, page_size))
+                if not data or 'result' not in data:
+                    logging.warning("KB index sync stopped: no response from ServiceNow")
+                    return received
+                batch = data['result']
+                target.upsert(batch)
+                received += len(batch)
+                if len(batch) < page_size:
+                    break
+                offset += page_size
+            if full:
+                self._swap_in(target)
+                self.last_full_sync = time.time()
+            self.last_sync = time.time()
+            logging.info(f"KB index synced {received} articles, {len(self)} indexed, watermark {self.watermark}")
+            self.save()
+            for listener in self._sync_listeners:
+                listener()
+            return received
+        except Exception as e:
+            logging.error(f"KB index sync failed: {str(e)}")
+            return 0
+        finally:
+            self._sync_lock.release()
+
+    def sync_in_background(self, fetch: Callable[[Dict], Dict]):
+        """Start a sync on a daemon thread unless one is already running; full when one is due."""
+        if self._sync_lock.locked():
+            return
+        threading.Thread(target=self.sync, args=(fetch,), kwargs={"full": self.full_sync_due()},
+                         name="kb-index-sync", daemon=True).start()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            live = [(ordinal, doc) for ordinal, doc in enumerate(self.docs) if doc is not None]
+            remap = {ordinal: position for position, (ordinal, _) in enumerate(live)}
+            payload = {
+                "version": INDEX_FORMAT_VERSION,
+                "watermark": self.watermark,
+                "last_sync": self.last_sync,
+                "last_full_sync": self.last_full_sync,
+                "docs": [doc for _, doc in live],
+                "postings": {term: [[remap[o], w] for o, w in postings.items()]
+                             for term, postings in self.postings.items()}
+            }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+            if payload.get("version") != INDEX_FORMAT_VERSION:
+                logging.warning(f"Ignoring KB index with format version {payload.get('version')}")
+                return False
+            with self._lock:
+                self.docs = payload["docs"]
+                self.doc_ids = {self.doc_key(doc): ordinal for ordinal, doc in enumerate(self.docs)}
+                self.doc_terms = [{} for _ in self.docs]
+                self.doc_lengths = [0.0] * len(self.docs)
+                self.postings = {}
+                for term, entries in payload["postings"].items():
+                    self.postings[term] = {ordinal: weight for ordinal, weight in entries}
+                    for ordinal, weight in entries:
+                        self.doc_terms[ordinal][term] = weight
+                        self.doc_lengths[ordinal] += weight
+                self.total_length = sum(self.doc_lengths)
+                self.watermark = payload["watermark"]
+                self.last_sync = payload["last_sync"]
+                self.last_full_sync = payload.get("last_full_sync", 0.0)
+            logging.info(f"Loaded KB index with {len(self)} articles from {self.path}")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to load KB index: {str(e)}")
+            return False
+
+__all__ = ['KBIndex', 'tokenize']
@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchainActions.kb_index import tokenize
+
+SEMANTIC_FORMAT_VERSION = 2
+
+def article_text(article: Dict) -> str:
+    # The title is repeated so it weighs more than the cause/workaround text.
+    title = article.get("short_description") or ""
+    return " ".join([title, title, article.get("kb_cause") or "", article.get("kb_workaround") or ""])
+
+class HashingEmbedder:
+    """
+    Offline embedder: hashed word unigrams, bigrams and character trigrams with TF-IDF weighting.
+    It needs no model download; fit_embed_documents() learns the IDF weights from the corpus and
+    returns them for the index to keep next to the matrix they were applied to.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    @property
+    def fingerprint(self) -> str:
+        return f"hashing-v1-{self.dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        features = list(tokens)
+        features.extend(f"{a}_{b}" for a, b in zip(tokens, tokens[1:]))
+        for token in tokens:
+            padded = f"<{token}>"
+            features.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def _raw_vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks the sign so colliding features tend to cancel out instead of piling up.
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vector
+
+    def _raw_matrix(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self._raw_vector(text)
+        return matrix
+
+    def fit_embed_documents(self, texts: List[str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Returns the document matrix and the IDF weights it was built with."""
+        matrix = self._raw_matrix(texts)
+        document_frequency = np.count_nonzero(matrix, axis=0)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self._weight(matrix, idf), idf
+
+    @staticmethod
+    def _weight(vectors: np.ndarray, idf: Optional[np.ndarray]) -> np.ndarray:
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        if idf is not None:
+            vectors = vectors * idf
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def embed_documents(self, texts: List[str], idf: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._weight(self._raw_matrix(texts), idf)
+
+    def embed_query(self, text: str, idf: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._weight(self._raw_vector(text), idf)
+
+class LangChainEmbedder:
+    """Adapter for any LangChain Embeddings implementation (e.g. a local sentence-transformers model)."""
+
+    def __init__(self, embeddings, name: str):
+        self.embeddings = embeddings
+        self.name = name
+
+    @property
+    def fingerprint(self) -> str:
+        return f"langchain-{self.name}"
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def embed_documents(self, texts: List[str], idf: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._normalize(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32))
+
+    def embed_query(self, text: str, idf: Optional[np.ndarray] = None) -> np.ndarray:
+        return self._normalize(np.asarray(self.embeddings.embed_query(text), dtype=np.float32))
+
+    def fit_embed_documents(self, texts: List[str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        # Model embeddings are not corpus-weighted
+        return self.embed_documents(texts), None
+
+def embedder_from_env():
+    """Hashing embedder unless kb_embedding_model names a HuggingFace model that can be loaded."""
+    model_name = os.getenv("kb_embedding_model")
+    if model_name:
+        try:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            return LangChainEmbedder(HuggingFaceEmbeddings(model_name=model_name), model_name)
+        except Exception as e:
+            logging.warning(f"Embedding model {model_name} unavailable, using hashing embedder: {str(e)}")
+    return HashingEmbedder(int(os.getenv("kb_embedding_dim", "256")))
+
+class SemanticKBIndex:
+    """
+    Embedding matrix for the known error articles: one contiguous float32 array (rows are unit vectors)
+    saved as .npy and memory-mapped on load. A query is one matrix-vector product plus argpartition.
+    The IDF weights the matrix was built with are swapped together with it, so a query is always
+    weighted the same way as the documents it is scored against.
+    """
+
+    def __init__(self, directory: str = None, embedder=None):
+        self.directory = os.path.expanduser(directory) if directory else None
+        self.embedder = embedder or HashingEmbedder()
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.idf: Optional[np.ndarray] = None
+        self.docs: List[Dict] = []
+        self.source_sync = 0.0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _paths(self):
+        return (os.path.join(self.directory, "kb_embeddings.npy"),
+                os.path.join(self.directory, "kb_embeddings.json"))
+
+    def build(self, articles: List[Dict], source_sync: float = 0.0):
+        """Embed all articles and swap the new matrix in atomically."""
+        texts = [article_text(article) for article in articles]
+        matrix, idf = self.embedder.fit_embed_documents(texts)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        with self._lock:
+            self.matrix = matrix
+            self.idf = idf
+            self.docs = list(articles)
+            self.source_sync = source_sync
+        logging.info(f"Semantic KB index built with {len(articles)} articles")
+        self.save()
+
+    def rebuild_in_background(self, articles: List[Dict], source_sync: float = 0.0):
+        if not self._build_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.build(articles, source_sync)
+            except Exception as e:
+                logging.error(f"Semantic KB index build failed: {str(e)}")
+            finally:
+                self._build_lock.release()
+
+        threading.Thread(target=run, name="kb-semantic-build", daemon=True).start()
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        with self._lock:
+            matrix, idf, docs = self.matrix, self.idf, self.docs
+        if not docs or not query:
+            return []
+        scores = matrix @ self.embedder.embed_query(query, idf)
+        if len(docs) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(docs))
+        top = top[np.argsort(-scores[top])]
+        return [dict(docs[i], score=round(float(scores[i]), 4)) for i in top if scores[i] > 0]
+
+    def save(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        matrix_path, meta_path = self._paths()
+        with self._lock:
+            matrix, idf, docs, source_sync = self.matrix, self.idf, self.docs, self.source_sync
+        tmp_matrix = f"{matrix_path}.tmp.npy"
+        np.save(tmp_matrix, matrix)
+        os.replace(tmp_matrix, matrix_path)
+        tmp_meta = f"{meta_path}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": SEMANTIC_FORMAT_VERSION,
+                "embedder": self.embedder.fingerprint,
+                "idf": idf.tolist() if idf is not None else None,
+                "source_sync": source_sync,
+                "docs": docs
+            }, f)
+        os.replace(tmp_meta, meta_path)
+
+    def load(self, mmap: bool = True) -> bool:
+        if not self.directory:
+            return False
+        matrix_path, meta_path = self._paths()
+        if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+            return False
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != SEMANTIC_FORMAT_VERSION or meta.get("embedder") != self.embedder.fingerprint:
+                logging.warning("Semantic KB index on disk was built with a different embedder, ignoring it")
+                return False
+            matrix = np.load(matrix_path, mmap_mode="r" if mmap else None)
+            idf = np.asarray(meta["idf"], dtype=np.float32) if meta.get("idf") is not None else None
+            with self._lock:
+                self.matrix = matrix
+                self.idf = idf
+                self.docs = meta["docs"]
+                self.source_sync = meta["source_sync"]
+            logging.info(f"Loaded semantic KB index with {len(self.docs)} articles")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to load semantic KB index: {str(e)}")
+            return False
+
+__all__ = ['SemanticKBIndex', 'HashingEmbedder', 'LangChainEmbedder', 'embedder_from_env']
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class PrecomputedStore:
+    """Analyses and KB results computed ahead of time, keyed by incident number."""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def put(self, incident_number: str, entry: Dict):
+        key = incident_number.upper()
+        with self._lock:
+            self._entries[key] = dict(entry, stored_at=time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, incident_number: str) -> Optional[Dict]:
+        key = incident_number.upper()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["stored_at"] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def invalidate(self, incident_number: str):
+        """Drop an entry whose incident changed after it was computed."""
+        with self._lock:
+            if self._entries.pop(incident_number.upper(), None) is not None:
+                self.invalidated += 1
+
+    def has_version(self, incident_number: str, sys_updated_on: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(incident_number.upper())
+            return entry is not None and entry.get("sys_updated_on") == sys_updated_on
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+__all__ = ['PrecomputedStore']
@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Bump when the table layout changes; older databases are rebuilt on open since they only hold cached data.
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_expires ON results (expires_at);
+CREATE INDEX IF NOT EXISTS results_created ON results (created_at);
+"""
+
+class ResultStore:
+    """
+    SQLite (WAL) store that keeps incident snapshots, analyses and KB results across restarts.
+    Values are JSON, grouped by namespace, each namespace with its own TTL. Writes are queued and
+    committed in batches by a background thread so the request path never waits on fsync; reads
+    check the not-yet-written batch first so a value is visible as soon as it is put.
+    """
+
+    def __init__(self, path: str, ttls: Dict[str, float] = None, max_bytes: int = 256 * 1024 * 1024,
+                 batch_size: int = 200, flush_interval: float = 0.5):
+        self.path = os.path.expanduser(path)
+        self.ttls = ttls or {}
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending: Dict[tuple, tuple] = {}
+        self._pending_lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.written = 0
+        self.evicted = 0
+        self.batches = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._migrate()
+        self._writer = threading.Thread(target=self._write_loop, name="result-store-writer", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultStore"]:
+        """The configured store, None when result_store_enabled is false or the database cannot be opened."""
+        if os.getenv("result_store_enabled", "true").lower() != "true":
+            return None
+        try:
+            return cls(
+                path=os.getenv("result_store_path", "~/.cache/ipe/results.db"),
+                ttls={
+                    "incident": float(os.getenv("result_store_incident_ttl", "86400")),
+                    "analysis": float(os.getenv("result_store_analysis_ttl", "604800")),
+                    "kb": float(os.getenv("result_store_kb_ttl", "3600"))
+                },
+                max_bytes=int(os.getenv("result_store_max_mb", "256")) * 1024 * 1024
+            )
+        except Exception as e:
+            logging.error(f"Result store unavailable, continuing without it: {str(e)}")
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent with NORMAL; a crash may only lose the last batches
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # One connection per thread, WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _migrate(self):
+        conn = self._connect()
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                if version:
+                    logging.info(f"Result store schema {version} is outdated, rebuilding as {SCHEMA_VERSION}")
+                conn.execute("DROP TABLE IF EXISTS results")
+                conn.executescript(SCHEMA)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, namespace: str, key: str) -> Any:
+        now = time.time()
+        with self._pending_lock:
+            pending = self._pending.get((namespace, key))
+        if pending is not None:
+            value, expires_at = pending
+        else:
+            row = self._reader().execute(
+                "SELECT value, expires_at FROM results WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            value, expires_at = (json.loads(row[0]), row[1]) if row else (None, None)
+        with self._lock:
+            if value is None or (expires_at is not None and expires_at < now):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return value
+
+    def put(self, namespace: str, key: str, value: Any, ttl: float = None):
+        ttl = self.ttls.get(namespace) if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._pending_lock:
+            self._pending[(namespace, key)] = (value, expires_at)
+        self._writes.put((namespace, key, value, expires_at))
+
+    def delete(self, namespace: str, key: str):
+        self.put(namespace, key, None, ttl=0)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._writes.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logging.error(f"Result store write of {len(batch)} entries failed: {str(e)}")
+            finally:
+                with self._pending_lock:
+                    for namespace, key, value, expires_at in batch:
+                        pending = self._pending.get((namespace, key))
+                        # A newer put of the same key stays pending until its own batch is written
+                        if pending is not None and pending[0] is value and pending[1] == expires_at:
+                            del self._pending[(namespace, key)]
+                for _ in batch:
+                    self._writes.task_done()
+
+    def _write_batch(self, batch):
+        conn = getattr(self, "_write_conn", None)
+        if conn is None:
+            conn = self._write_conn = self._connect()
+        now = time.time()
+        # Only the last write of a key in the batch counts
+        latest = {(namespace, key): (namespace, key, value, expires_at) for namespace, key, value, expires_at in batch}
+        rows, deletes = [], []
+        for namespace, key, value, expires_at in latest.values():
+            if value is None:
+                deletes.append((namespace, key))
+                continue
+            encoded = json.dumps(value)
+            rows.append((namespace, key, encoded, len(encoded), now, expires_at))
+        with conn:
+            conn.executemany("DELETE FROM results WHERE namespace = ? AND key = ?", deletes)
+            conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+        with self._lock:
+            self.written += len(rows)
+            self.batches += 1
+        self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired rows, then the oldest ones until the values fit in max_bytes."""
+        with conn:
+            evicted = conn.execute("DELETE FROM results WHERE expires_at < ?", (now,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes * 0.9
+                oldest = []
+                for namespace, key, size in conn.execute(
+                        "SELECT namespace, key, size FROM results ORDER BY created_at"):
+                    oldest.append((namespace, key))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany("DELETE FROM results WHERE namespace = ? AND key = ?", oldest)
+                evicted += len(oldest)
+        if evicted:
+            with self._lock:
+                self.evicted += evicted
+
+    def flush(self):
+        """Block until every queued write is committed."""
+        self._writes.join()
+
+    def clear(self, namespace: str = None):
+        self.flush()
+        with self._connect() as conn:
+            if namespace:
+                conn.execute("DELETE FROM results WHERE namespace = ?", (namespace,))
+            else:
+                conn.execute("DELETE FROM results")
+
+    def count(self, namespace: str = None) -> int:
+        if namespace:
+            sql, args = "SELECT COUNT(*) FROM results WHERE namespace = ?", (namespace,)
+        else:
+            sql, args = "SELECT COUNT(*) FROM results", ()
+        return self._reader().execute(sql, args).fetchone()[0]
+
+    def stats(self) -> Dict:
+        rows = self._reader().execute(
+            "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM results GROUP BY namespace"
+        ).fetchall()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "namespaces": {namespace: {"entries": entries, "bytes": size} for namespace, entries, size in rows},
+                "pending_writes": self._writes.qsize(),
+                "written": self.written,
+                "batches": self.batches,
+                "evicted": self.evicted,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+__all__ = ['ResultStore', 'SCHEMA_VERSION']
@@ -1,38 +1,210 @@
 import os
-from langchain_groq import ChatGroq
 from langgraph.graph import StateGraph, MessagesState, START, END
-from typing import Dict, List
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import operator
+from typing import Annotated, Dict, Iterator, List
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, SystemMessage
 from dotenv import load_dotenv
 from langchain_core.tools import Tool, StructuredTool
+import asyncio
+import contextvars
 import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from createModels.model_actions import InputAnalyzer
+from createModels.model_router import ModelRouter
+from langchainActions.incident_cache import IncidentCache
+from langchainActions.analysis_cache import AnalysisCache
+from langchainActions.result_store import ResultStore
+from langchainActions.kb_index import KBIndex
+from langchainActions.kb_semantic import SemanticKBIndex, embedder_from_env
+from langchainActions.single_flight import SingleFlight
+from langchainActions.precomputed_store import PrecomputedStore
+from langchainActions.speculation import Speculator
+from pipelineRuntime.scheduler import Permit, current_priority, scheduler, scheduler_stats
+from pipelineRuntime.deadline import (DeadlineExceeded, clamp_timeout, raise_if_expired, remaining,
+                                      request_deadline, stage_deadline)
+from pipelineRuntime.hedging import HedgePolicy
+from pipelineRuntime.metrics import (CLASSIFY_SECONDS, ERRORS, NODE_SECONDS, REGISTRY, REQUEST_SECONDS, SNOW_SECONDS,
+                                     RequestTrace, measure, request_trace, start_metrics_server)
+from pipelineRuntime.profiling import profile_request, profile_section
+
+class BoundedRetry(Retry):
+    """Retry policy that honours Retry-After but never sleeps longer than max_retry_after seconds."""
+
+    def __init__(self, *args, max_retry_after: float = 10.0, **kwargs):
+        self.max_retry_after = max_retry_after
+        super().__init__(*args, **kwargs)
+
+    def new(self, **kwargs):
+        kwargs.setdefault("max_retry_after", self.max_retry_after)
+        return super().new(**kwargs)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
 
 class ServiceNowAPI:
-    def __init__(self):
+    def __init__(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None,
+                 max_retries: int = None, backoff_factor: float = None):
         load_dotenv()
         self.snow_instance = os.getenv("snow_instance")
         self.incident_url = os.getenv("incident_url")
         self.rest_key = os.getenv("rest_key")
         self.headers = {
             "x-sn-apikey": self.rest_key,
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
         }
+        self.pool_size = pool_size or int(os.getenv("snow_pool_size", "20"))
+        self.timeout = (
+            connect_timeout or float(os.getenv("snow_connect_timeout", "3.05")),
+            read_timeout or float(os.getenv("snow_read_timeout", "15"))
+        )
+        self.retry_policy = BoundedRetry(
+            total=max_retries if max_retries is not None else int(os.getenv("snow_max_retries", "3")),
+            backoff_factor=backoff_factor if backoff_factor is not None else float(os.getenv("snow_backoff_factor", "0.3")),
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            max_retry_after=float(os.getenv("snow_max_retry_after", "10"))
+        )
+        self.session = self._create_session()
+        # Shared by every ServiceNowAPI in the process, so bulk, watcher and chat calls queue together
+        self.scheduler = scheduler("snow")
+        # Interactive reads slower than the recent p95 get a duplicate request; the first answer wins
+        self.hedge = HedgePolicy.from_env("snow")
+        self._hedge_pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="snow-hedge")
+        self._stats_lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
 
-    def get_details(self, url: str, params: Dict = {}) -> Dict:
-        try:
-            response = requests.get(url, headers=self.headers, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                logging.debug(f"API Response: {data}")
-                return data
-            else:
-                logging.error(f"Error: {response.status_code}, {response.text}")
+    def _create_session(self) -> requests.Session:
+        """Build a keep-alive session whose connection pool is shared by every call."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=self.retry_policy,
+            pool_block=False
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def pool_stats(self) -> Dict:
+        """Return request counters and per-host connection pool usage."""
+        hosts = {}
+        for adapter in {id(a): a for a in self.session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    "connections_opened": pool.num_connections,
+                    "requests_sent": pool.num_requests,
+                    "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                    "max_size": self.pool_size
+                }
+        with self._stats_lock:
+            return {
+                "requests": self.request_count,
+                "errors": self.error_count,
+                "hedging": self.hedge.stats(),
+                "hosts": hosts
+            }
+
+    def close(self):
+        self.session.close()
+
+    def _observe(self, permit: Permit, response: requests.Response):
+        """Report the 429s urllib3 retried internally, and every retry, to the scheduler."""
+        retries = getattr(response.raw, "retries", None)
+        history = getattr(retries, "history", None) or ()
+        if history:
+            permit.charge(requests=len(history))
+        for attempt in history:
+            if attempt.status == 429:
+                permit.throttled()
+        if response.status_code == 429:
+            permit.throttled(self.retry_policy.get_retry_after(response.raw) if response.raw is not None else None)
+
+    def _get(self, url: str, params: Dict, timeout) -> requests.Response:
+        """One read through the scheduler, cut short by the request deadline."""
+        with self.scheduler.acquire(timeout=remaining()) as permit:
+            started = time.perf_counter()
+            response = self.session.get(url, params=params, timeout=clamp_timeout(timeout))
+            self._observe(permit, response)
+        if response.status_code == 200:
+            self.hedge.record(time.perf_counter() - started)
+        return response
+
+    def _hedged_get(self, url: str, params: Dict, timeout) -> requests.Response:
+        # Hedges add load, so only interactive reads are hedged
+        delay = self.hedge.delay() if current_priority() == "interactive" else None
+        if delay is None:
+            return self._get(url, params, timeout)
+        first = self._hedge_pool.submit(contextvars.copy_context().run, self._get, url, params, timeout)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        self.hedge.launched()
+        second = self._hedge_pool.submit(contextvars.copy_context().run, self._get, url, params, timeout)
+        pending, response, error = {first, second}, None, None
+        while pending:
+            done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"No response from {url} within the deadline")
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if response.status_code == 200:
+                    if future is second:
+                        self.hedge.won()
+                    return response
+        if response is None:
+            raise error
+        return response
+
+    def _record_error(self):
+        with self._stats_lock:
+            self.error_count += 1
+        ERRORS.inc(component="snow")
+
+    def get_details(self, url: str, params: Dict = {}, timeout=None) -> Dict:
+        with self._stats_lock:
+            self.request_count += 1
+        table = url.rstrip("/").rsplit("/", 1)[-1]
+        with measure(SNOW_SECONDS, f"snow:{table}", table=table):
+            try:
+                response = self._hedged_get(url, params, timeout or self.timeout)
+                if response.status_code == 200:
+                    data = response.json()
+                    logging.debug(f"API Response: {data}")
+                    return data
+                else:
+                    logging.error(f"Error: {response.status_code}, {response.text}")
+                    self._record_error()
+                    return {}
+            except Exception as e:
+                logging.error(f"API request failed: {str(e)}")
+                self._record_error()
+                # An empty result would read as "not found"; a request out of time has to say so
+                raise_if_expired(e)
                 return {}
-        except Exception as e:
-            logging.error(f"API request failed: {str(e)}")
-            return {}
 
     def process_data(self, data: Dict) -> str:
         if data.get('result') and len(data['result']) > 0:
@@ -48,12 +220,7 @@ class ServiceNowAPI:
 
 class IncidentAnalyzer:
     def __init__(self):
-        self.llm = ChatGroq(
-            api_key=os.getenv("groq_api_key"),
-            model="llama3-70b-8192",
-            temperature=0.7,
-            max_tokens=1024
-        )
+        self.llm = ModelRouter.shared().for_task("analyze", temperature=0.7, max_tokens=1024)
 
     def extract_keywords(self, analysis_string) -> str:
         try:
@@ -73,37 +240,181 @@ class IncidentAnalyzer:
             return ""
 
 class ServiceNowTools:
-    def __init__(self):
-        self.snow_api = ServiceNowAPI()
+    KB_SEARCH_URL = "https://dev306388.service-now.com/api/now/table/kb_template_known_error_article"
+
+    INCIDENT_FIELDS = 'short_description,description,cmdb_ci,work_notes,sys_updated_on'
+
+    def __init__(self, snow_api: ServiceNowAPI = None, incident_cache: IncidentCache = None,
+                 result_store: ResultStore = None):
+        self.snow_api = snow_api or ServiceNowAPI()
         self.analyzer = IncidentAnalyzer()
+        # Persists incidents, analyses and KB results so a restarted process starts warm
+        self.result_store = result_store or ResultStore.from_env()
+        self.incident_cache = incident_cache or IncidentCache(
+            max_entries=int(os.getenv("incident_cache_size", "1000")),
+            ttl_seconds=float(os.getenv("incident_cache_ttl", "60")),
+            store=self.result_store,
+            stale_grace_seconds=float(os.getenv("incident_cache_stale_grace", "300"))
+        )
+        self.analysis_cache = AnalysisCache.from_env(
+            model_name=getattr(self.analyzer.llm, "model_name", ""),
+            temperature=getattr(self.analyzer.llm, "temperature", 0.0),
+            store=self.result_store
+        )
+        # Deterministic mode pins the analysis call to temperature 0 so its answers are cacheable.
+        self.analysis_llm = self.analyzer.llm.bind(temperature=0) if self.analysis_cache.deterministic else self.analyzer.llm
+        # Concurrent identical lookups share one upstream call
+        self.single_flight = SingleFlight()
+        self.kb_url = os.getenv("kb_url", self.KB_SEARCH_URL)
+        self.kb_index = None
+        if os.getenv("kb_index_enabled", "true").lower() == "true":
+            self.kb_index = KBIndex(
+                path=os.getenv("kb_index_path", "~/.cache/ipe/kb_index.json.gz"),
+                max_age_seconds=float(os.getenv("kb_index_max_age", "3600")),
+                full_sync_interval=float(os.getenv("kb_index_full_sync_interval", "86400"))
+            )
+            self.kb_index.load()
+        # kb_search_mode: "bm25" ranks by keyword overlap, "semantic" by embedding similarity.
+        self.kb_search_mode = os.getenv("kb_search_mode", "bm25").lower()
+        self.semantic_index = None
+        if self.kb_index is not None and self.kb_search_mode == "semantic":
+            self.semantic_index = SemanticKBIndex(
+                directory=os.getenv("kb_semantic_dir", "~/.cache/ipe/kb_semantic"),
+                embedder=embedder_from_env()
+            )
+            self.semantic_index.load()
+            self.kb_index.add_sync_listener(self.rebuild_semantic_index)
+            if len(self.kb_index) and self.semantic_index.source_sync < self.kb_index.last_sync:
+                self.rebuild_semantic_index()
 
-    def query_incident(self, incident_number: str) -> str:
-        """Query ServiceNow for incident details."""
-        logging.info(f"Executing query_incident for {incident_number}")
-        try:
-            params = {
-                'sysparm_query': "number=" + incident_number,
-                'sysparm_limit': '1',
-                'sysparm_fields': 'short_description,description,cmdb_ci,work_notes',
-                'sysparm_suppress_cache_control': 'true'
-            }
-            jsonResponse = self.snow_api.get_details(self.snow_api.incident_url, params)
-            details = self.snow_api.process_data(jsonResponse)
-            if details:
-                logging.info(f"Found incident details: {details}")
-                return f"Incident details found: {details}"
-            else:
-                logging.warning(f"Incident not found: {incident_number}")
-                return "Incident not found."
-        except Exception as e:
-            logging.error(f"Error in query_incident: {str(e)}")
-            return f"Error querying incident: {str(e)}"
+    @staticmethod
+    def kb_flight_key(keywords: str):
+        """The same keyword set in any order or case is one search."""
+        return ("kb", frozenset(term.strip().strip('"').lower() for term in keywords.split(',') if term.strip()))
 
-    def analyze_incident(self, incident_details: str) -> str:
-        """Analyze incident details using Llama."""
-        logging.info("Executing analyze_incident")
+    def rebuild_semantic_index(self):
+        self.semantic_index.rebuild_in_background(self.kb_index.documents(), self.kb_index.last_sync)
+
+    def fetch_kb_page(self, params: Dict) -> Dict:
+        """Fetch one page of known error articles, used by the KB index sync."""
+        return self.snow_api.get_details(self.kb_url, params)
+
+    def fetch_incidents(self, params: Dict) -> Dict:
+        """Fetch one page of incidents for bulk triage and the incident watcher."""
+        return self.snow_api.get_details(self.snow_api.incident_url, params)
+
+    def search_kb_index(self, keywords: str) -> Dict:
+        """
+        Rank articles from the local index. Returns None when the index is stale so the caller
+        falls back to the remote LIKE search; a background sync is started in that case.
+        """
+        if self.kb_index is None:
+            return None
+        if self.kb_index.is_stale():
+            self.kb_index.sync_in_background(self.fetch_kb_page)
+            logging.info("KB index is stale, using remote search until the sync completes")
+            return None
+        if self.semantic_index is not None and len(self.semantic_index):
+            hits = self.semantic_index.search(keywords, limit=5)
+        else:
+            hits = self.kb_index.search(keywords, limit=5)
+        logging.info(f"KB index returned {len(hits)} articles")
+        return {'result': hits}
+
+    def incident_params(self, incident_number: str, fields: str = INCIDENT_FIELDS) -> Dict:
+        """Table API parameters for a single incident lookup."""
+        return {
+            'sysparm_query': "number=" + incident_number,
+            'sysparm_limit': '1',
+            'sysparm_fields': fields,
+            'sysparm_suppress_cache_control': 'true'
+        }
+
+    def cache_stats(self) -> Dict:
+        stats = {"incident": self.incident_cache.stats(), "analysis": self.analysis_cache.stats()}
+        if self.result_store is not None:
+            stats["result_store"] = self.result_store.stats()
+        return stats
+
+    def kb_result_key(self, keywords: str) -> str:
+        return "|".join(sorted(self.kb_flight_key(keywords)[1]))
+
+    def cached_kb_search(self, keywords: str) -> Dict:
+        """Remote KB search results persisted by an earlier search with the same keywords, or None."""
+        if self.result_store is None:
+            return None
+        return self.result_store.get("kb", self.kb_result_key(keywords))
+
+    def store_kb_search(self, keywords: str, articles: Dict):
+        if self.result_store is not None and articles:
+            self.result_store.put("kb", self.kb_result_key(keywords), articles)
+
+    def coalescing_stats(self) -> Dict:
+        return self.single_flight.stats()
+
+    @staticmethod
+    def first_record(data: Dict) -> Dict:
+        if data and data.get('result'):
+            return data['result'][0]
+        return None
+
+    @staticmethod
+    def is_empty_result(data: Dict) -> bool:
+        """ServiceNow answered, without a row; get_details returns {} when the request itself failed."""
+        return bool(data) and 'result' in data and not data['result']
+
+    def settle_refresh(self, incident_number: str, entry, data: Dict) -> Dict:
+        """Cache a refetched record, forget a deleted one, or fall back to the cached copy while ServiceNow is down."""
+        record = self.first_record(data)
+        if record:
+            self.incident_cache.put(incident_number, record)
+            return record
+        if self.is_empty_result(data):
+            if entry is not None:
+                logging.info(f"Incident {incident_number} no longer exists, dropping the cached record")
+                self.incident_cache.invalidate(incident_number)
+            return None
+        if entry is not None and self.incident_cache.within_grace(entry):
+            logging.warning(f"Refetch failed for {incident_number}, serving cached record")
+            return entry.record
+        return None
+
+    def fetch_incident_record(self, incident_number: str) -> Dict:
+        """Return the raw incident record, served from the cache while it is unchanged in ServiceNow."""
+        entry, state = self.incident_cache.lookup(incident_number)
+        if state == IncidentCache.FRESH:
+            logging.info(f"Incident cache hit for {incident_number}")
+            return entry.record
         try:
-            prompt = f"""
+            if state == IncidentCache.STALE:
+                # Only sys_updated_on is fetched to decide whether the cached record is still current.
+                probe = self.snow_api.get_details(self.snow_api.incident_url,
+                                                  self.incident_params(incident_number, fields='sys_updated_on'))
+                if self.is_empty_result(probe):
+                    return self.settle_refresh(incident_number, entry, probe)
+                probe_record = self.first_record(probe) or {}
+                record = self.incident_cache.revalidate(incident_number, probe_record.get('sys_updated_on'))
+                if record is not None:
+                    logging.info(f"Incident cache revalidated for {incident_number}")
+                    return record
+
+            data = self.snow_api.get_details(self.snow_api.incident_url, self.incident_params(incident_number))
+        except DeadlineExceeded:
+            if entry is None or not self.incident_cache.within_grace(entry):
+                raise
+            logging.warning(f"Out of time refreshing {incident_number}, serving cached record")
+            return entry.record
+        return self.settle_refresh(incident_number, entry, data)
+
+    def format_incident(self, incident_number: str, details: str) -> str:
+        if details:
+            logging.info(f"Found incident details: {details}")
+            return f"Incident details found: {details}"
+        logging.warning(f"Incident not found: {incident_number}")
+        return "Incident not found."
+
+    def analysis_prompt(self, incident_details: str) -> str:
+        return f"""
             Analyze these incident details and extract key points for KB article search:
             {incident_details}
             
@@ -125,6 +436,76 @@ class ServiceNowTools:
 
             These keywords can be used to search for relevant KB articles that may provide solutions or troubleshooting steps for the issue.
             """
+
+    def kb_search_params(self, keywords: str) -> Dict:
+        """Table API parameters for a LIKE search over the known error articles."""
+        search_terms = [term.strip().strip('"') for term in keywords.split(',')]
+        search_query = "short_descriptionLIKE" + search_terms[0]
+        for term in search_terms[1:]:
+            search_query += "^ORshort_descriptionLIKE" + term
+        return {
+            'sysparm_query': search_query,
+            'sysparm_type': "kb_knowledge_base",
+            'sysparm_limit': '5',
+            'sysparm_suppress_cache_control': 'true'
+        }
+
+    def format_kb_articles(self, articles: Dict) -> str:
+        if articles and articles.get('result'):
+            kb_articles = []
+            for article in articles['result']:
+                
+                article_info = ( f"       \n"
+                    f"**<h4>KB Article</h4>**\n"
+                    f"**Number:** <p>{article.get('number', 'N/A')}<p>\n"
+                    f"**Title:** <p>{article.get('short_description', 'N/A')}</p>\n"
+                    f"**Cause:** {article.get('kb_cause', 'N/A')}\n"
+                    f"**WorkAround:** {article.get('kb_workaround', 'N/A')}"                                           
+                )
+                kb_articles.append(article_info)
+            return "KB articles found: " + "\n".join(kb_articles)
+        
+        logging.warning("No KB articles found")
+        return "No relevant KB articles found."
+
+    def query_incident(self, incident_number: str) -> str:
+        """Query ServiceNow for incident details."""
+        return self.single_flight.do(("incident", incident_number.strip().upper()),
+                                     self._query_incident, incident_number)
+
+    def _query_incident(self, incident_number: str) -> str:
+        logging.info(f"Executing query_incident for {incident_number}")
+        try:
+            record = self.fetch_incident_record(incident_number)
+            details = self.snow_api.process_data({'result': [record] if record else []})
+            return self.format_incident(incident_number, details)
+        except DeadlineExceeded:
+            # The node turns this into a partial answer
+            raise
+        except Exception as e:
+            logging.error(f"Error in query_incident: {str(e)}")
+            return f"Error querying incident: {str(e)}"
+
+    def cache_analysis(self, incident_details: str, response):
+        # The cache is keyed on the primary tier's model; a fallback tier's answer would be served as its own
+        if self.analysis_llm.answered_by_primary(response):
+            self.analysis_cache.put(incident_details, response.content)
+        else:
+            logging.info(f"Analysis answered by the {response.response_metadata.get('tier')} tier, not cached")
+
+    def analyze_incident(self, incident_details: str) -> str:
+        """Analyze incident details using Llama."""
+        return self.single_flight.do(("analysis", self.analysis_cache.make_key(incident_details)),
+                                     self._analyze_incident, incident_details)
+
+    def _analyze_incident(self, incident_details: str) -> str:
+        logging.info("Executing analyze_incident")
+        try:
+            cached = self.analysis_cache.get(incident_details)
+            if cached is not None:
+                logging.info("Analysis cache hit")
+                return f"Analysis complete: {cached}"
+            prompt = self.analysis_prompt(incident_details)
             # response ="""**Incident Analysis:**
             #     1. **Main issue:** Unable to access team file share
             #     2. **Category/Impact:** File access issue, affecting team collaboration
@@ -133,9 +514,13 @@ class ServiceNowTools:
             #     **Searchable keywords for KB article search:**
 
             #     keywords: "file share access", "team folder access", "file share issue", "team file share problem", "access denied file share"""""
-            response = self.analyzer.llm.invoke([HumanMessage(content=prompt)])
+            response = self.analysis_llm.invoke([HumanMessage(content=prompt)])
             logging.info(f"Analysis result: {response.content}")
+            self.cache_analysis(incident_details, response)
             return f"Analysis complete: {response.content}"
+        except DeadlineExceeded:
+            # The node turns this into a partial answer
+            raise
         except Exception as e:
             logging.error(f"Error in analyze_incident: {str(e)}")
             return f"Error analyzing incident: {str(e)}"
@@ -143,219 +528,506 @@ class ServiceNowTools:
     def find_kb_articles(self, analysis: str) -> str:
         """Find relevant KB articles based on analysis."""
         logging.info("Executing find_kb_articles")
+        keywords = self.analyzer.extract_keywords(analysis)
+        if not keywords:
+            return "No keywords found to search with."
+        return self.search_kb_articles(keywords)
+
+    def search_kb_articles(self, keywords: str) -> str:
+        """Search KB articles for comma separated keywords or free text."""
+        return self.single_flight.do(self.kb_flight_key(keywords), self._search_kb_articles, keywords)
+
+    def _search_kb_articles(self, keywords: str) -> str:
         try:
-            keywords = self.analyzer.extract_keywords(analysis)
-            if not keywords:
-                return "No keywords found to search with."
-                
             logging.info(f"Searching with keywords: {keywords}")
+            articles = self.search_kb_index(keywords)
+            if articles is None:
+                articles = self.cached_kb_search(keywords)
+            if articles is None:
+                articles = self.snow_api.get_details(self.kb_url, self.kb_search_params(keywords))
+                self.store_kb_search(keywords, articles)
+            return self.format_kb_articles(articles)
             
-            search_terms = [term.strip().strip('"') for term in keywords.split(',')]
-            search_query = "short_descriptionLIKE" + search_terms[0]
-            for term in search_terms[1:]:
-                search_query += "^ORshort_descriptionLIKE" + term
-
-            url = f"https://dev306388.service-now.com/api/now/table/kb_template_known_error_article"
-            params = {
-                'sysparm_query': search_query,
-                'sysparm_type': "kb_knowledge_base",
-                'sysparm_limit': '5',
-                'sysparm_suppress_cache_control': 'true'
-            }
-
-            articles = self.snow_api.get_details(url, params)
-            
-            if articles and articles.get('result'):
-                kb_articles = []
-                for article in articles['result']:
-                    
-                    article_info = ( f"       \n"
-                        f"**<h4>KB Article</h4>**\n"
-                        f"**Number:** <p>{article.get('number', 'N/A')}<p>\n"
-                        f"**Title:** <p>{article.get('short_description', 'N/A')}</p>\n"
-                        f"**Cause:** {article.get('kb_cause', 'N/A')}\n"
-                        f"**WorkAround:** {article.get('kb_workaround', 'N/A')}"                                           
-                    )
-                    kb_articles.append(article_info)
-                return "KB articles found: " + "\n".join(kb_articles)
-            
-            logging.warning("No KB articles found")
-            return "No relevant KB articles found."
-            
+        except DeadlineExceeded:
+            # The node turns this into a partial answer
+            raise
         except Exception as e:
             logging.error(f"Error in find_kb_articles: {str(e)}")
             return f"Error searching KB articles: {str(e)}"
 
+class IncidentStatus:
+    PENDING = "pending"
+    FOUND = "found"
+    NOT_FOUND = "not_found"
+    ANALYZED = "analyzed"
+    DONE = "done"
+    ERROR = "error"
+    # A stage ran out of time; the answer carries what the earlier stages found
+    PARTIAL = "partial"
+    # status after a node -> the node that runs next; every other status ends the run
+    NEXT_STEP = {FOUND: "analyze", ANALYZED: "kb_search"}
+
+class IncidentState(MessagesState):
+    """
+    Typed state of the incident workflow. Nodes return only the fields they set; messages and
+    kb_articles are append-only, and routing reads status instead of scanning message text.
+    """
+    incident_number: str
+    status: str
+    details: str
+    analysis: str
+    kb_articles: Annotated[List[str], operator.add]
+    # KB result for the incident's short description, found speculatively during classification
+    related_kb: str
+
 class WorkflowManager:
-    def __init__(self):
-        self.snow_tools = ServiceNowTools()
+    # What the answer says in place of a stage that ran out of time
+    TIMEOUT_MESSAGES = {
+        "query": "Incident details unavailable: ServiceNow did not answer within the time budget.",
+        "analyze": "Analysis skipped: the time budget for this request ran out.",
+        "kb_search": "KB search skipped: the time budget for this request ran out."
+    }
+    OUT_OF_TIME = "This request ran out of time before an answer was ready. Please try again."
+
+    def __init__(self, snow_tools: ServiceNowTools = None):
+        self.snow_tools = snow_tools or ServiceNowTools()
         self.input_analyzer = InputAnalyzer()
+        self.chat_llm = ModelRouter.shared().for_task("chat", temperature=0.7, max_tokens=1024)
         self.tools = [
             StructuredTool.from_function(
                 func=self.snow_tools.query_incident,
+                coroutine=getattr(self.snow_tools, "aquery_incident", None),
                 name="query_incident",
                 description="Query ServiceNow for incident details"
             ),
             StructuredTool.from_function(
                 func=self.snow_tools.analyze_incident,
+                coroutine=getattr(self.snow_tools, "aanalyze_incident", None),
                 name="analyze_incident",
                 description="Analyze incident details using Llama"
             ),
             StructuredTool.from_function(
                 func=self.snow_tools.find_kb_articles,
+                coroutine=getattr(self.snow_tools, "afind_kb_articles", None),
                 name="find_kb_articles",
                 description="Find relevant KB articles based on analysis"
             )
         ]
         self.chain = None
+        self._chain_lock = threading.Lock()
+        self.single_flight = SingleFlight()
+        # Filled by the incident watcher, answers for incidents analyzed before anyone asked
+        self.precomputed = PrecomputedStore(
+            max_entries=int(os.getenv("precomputed_size", "5000")),
+            ttl_seconds=float(os.getenv("precomputed_ttl", "3600"))
+        )
+        self.watcher = None
+        self.speculator = Speculator(
+            self.snow_tools,
+            workers=int(os.getenv("speculation_workers", "4")),
+            max_candidates=int(os.getenv("speculation_max_candidates", "2")),
+            enabled=os.getenv("speculation_enabled", "true").lower() == "true"
+        )
+        REGISTRY.register_collector("workflow", self.collect_metrics)
+
+    def get_chain(self):
+        """Return the compiled graph, building it once even when concurrent sessions race for it."""
+        if self.chain is None:
+            with self._chain_lock:
+                if self.chain is None:
+                    self.create_workflow()
+        return self.chain
+
+    def warm_up(self):
+        """Do the one-off work the first request would otherwise pay for: compile the graph, refresh the KB index."""
+        self.get_chain()
+        kb_index = self.snow_tools.kb_index
+        if kb_index is not None and kb_index.is_stale():
+            kb_index.sync_in_background(self.snow_tools.fetch_kb_page)
+        if os.getenv("incident_watcher_enabled", "false").lower() == "true":
+            self.start_watcher()
+        start_metrics_server()
+        logging.info("Workflow manager warmed up")
+        return self
+
+    def start_watcher(self):
+        """Start pre-analyzing new and updated incidents in the background."""
+        # Imported here: the watcher builds on BulkTriage, which imports this module
+        from langchainActions.incident_watcher import IncidentWatcher
+        if self.watcher is None:
+            self.watcher = IncidentWatcher(
+                snow_tools=self.snow_tools,
+                store=self.precomputed,
+                query=os.getenv("incident_watcher_query", "active=true"),
+                poll_interval=float(os.getenv("incident_watcher_interval", "30")),
+                workers=int(os.getenv("incident_watcher_workers", "4")),
+                queue_size=int(os.getenv("incident_watcher_queue_size", "200")),
+                retry_backoff=float(os.getenv("incident_watcher_retry_backoff", "30")),
+                state_path=os.getenv("incident_watcher_state", "~/.cache/ipe/incident_watcher.json")
+            )
+        return self.watcher.start()
+
+    def precomputed_response(self, incident_number: str) -> str:
+        """The workflow answer assembled from the watcher's results, None when nothing current was precomputed."""
+        entry = self.precomputed.get(incident_number)
+        if entry is None:
+            return None
+        # A fresh incident cache entry answers without a request, a stale one costs the sys_updated_on probe
+        return self.assemble_precomputed(incident_number, entry, self.snow_tools.fetch_incident_record(incident_number))
+
+    def assemble_precomputed(self, incident_number: str, entry: Dict, record: Dict) -> str:
+        if not record or record.get('sys_updated_on') != entry.get("sys_updated_on"):
+            logging.info(f"Precomputed analysis for {incident_number} is out of date, running the workflow")
+            self.precomputed.invalidate(incident_number)
+            return None
+        initial_state = self.initial_state(incident_number)
+        parts = [message.content for message in initial_state["messages"]]
+        parts += [entry["details"], entry["analysis"]]
+        if entry.get("kb_articles"):
+            parts.append(entry["kb_articles"])
+        logging.info(f"Serving precomputed analysis for {incident_number}")
+        return "\n".join(parts)
+
+    @staticmethod
+    def query_update(result: str) -> Dict:
+        """State update for the query node: the tool output plus a status the router can switch on."""
+        if result.startswith("Incident details found"):
+            status = IncidentStatus.FOUND
+        elif result.startswith("Error"):
+            status = IncidentStatus.ERROR
+        else:
+            status = IncidentStatus.NOT_FOUND
+        return {"messages": [AIMessage(content=result)], "details": result, "status": status}
+
+    @staticmethod
+    def analysis_update(result: str) -> Dict:
+        status = IncidentStatus.ANALYZED if result.startswith("Analysis complete") else IncidentStatus.ERROR
+        return {"messages": [AIMessage(content=result)], "analysis": result, "status": status}
+
+    @staticmethod
+    def kb_update(result: str, related_kb: str = None) -> Dict:
+        # Fall back to the speculative short-description search when the analysis keywords found nothing
+        if not result.startswith("KB articles found") and (related_kb or "").startswith("KB articles found"):
+            result = related_kb
+        status = IncidentStatus.ERROR if result.startswith("Error") else IncidentStatus.DONE
+        return {"messages": [AIMessage(content=result)], "kb_articles": [result], "status": status}
+
+    @classmethod
+    def timeout_update(cls, stage: str, related_kb: str = None) -> Dict:
+        """State update for a stage that ran out of time; a speculative KB result is still shown."""
+        message = cls.TIMEOUT_MESSAGES[stage]
+        update = {"messages": [AIMessage(content=message)], "status": IncidentStatus.PARTIAL}
+        if stage == "query":
+            update["details"] = message
+        elif stage == "analyze":
+            update["analysis"] = message
+        if (related_kb or "").startswith("KB articles found"):
+            update["messages"].append(AIMessage(content=related_kb))
+            update["kb_articles"] = [related_kb]
+        return update
+
+    @staticmethod
+    def get_next_step(state: Dict) -> str:
+        """Route on the status field; anything but a successful stage ends the run."""
+        return IncidentStatus.NEXT_STEP.get(state.get("status"), "end")
+
+    @staticmethod
+    def instrument_node(name: str, node):
+        """Wrap a sync or async graph node so its latency is recorded under the status it returned."""
+        def finish(labels: Dict, update: Dict):
+            labels["status"] = (update or {}).get("status", "")
+            if labels["status"] == IncidentStatus.ERROR:
+                ERRORS.inc(component=f"node:{name}")
+
+        if asyncio.iscoroutinefunction(node):
+            async def timed_node(state):
+                with profile_section(f"node:{name}"), \
+                        measure(NODE_SECONDS, f"node:{name}", node=name, status="exception") as labels:
+                    update = await node(state)
+                    finish(labels, update)
+                return update
+        else:
+            def timed_node(state):
+                with profile_section(f"node:{name}"), \
+                        measure(NODE_SECONDS, f"node:{name}", node=name, status="exception") as labels:
+                    update = node(state)
+                    finish(labels, update)
+                return update
+        return timed_node
+
+    def compile_workflow(self, query_node, analyze_node, kb_node):
+        """Wire the query -> analyze -> kb_search nodes into a compiled graph."""
+        workflow = StateGraph(IncidentState)
+
+        # Add nodes and edges
+        workflow.add_node("query", self.instrument_node("query", query_node))
+        workflow.add_node("analyze", self.instrument_node("analyze", analyze_node))
+        workflow.add_node("kb_search", self.instrument_node("kb_search", kb_node))
+
+        # Strictly forward edges: every run takes at most three steps
+        workflow.add_edge(START, "query")
+        workflow.add_conditional_edges("query", self.get_next_step, {"analyze": "analyze", "end": END})
+        workflow.add_conditional_edges("analyze", self.get_next_step, {"kb_search": "kb_search", "end": END})
+        workflow.add_edge("kb_search", END)
+        return workflow.compile()
 
     def create_workflow(self):
-        workflow = StateGraph(MessagesState)
-        
         def query_node(state):
-            messages = state["messages"]
-            incident_number = None
-            for message in messages:
-                if isinstance(message, HumanMessage) and "INC" in message.content:
-                    for word in message.content.split():
-                        if word.startswith("INC"):
-                            incident_number = word
-                            break
-            
-            if incident_number:
-                try:
-                    result = self.snow_tools.query_incident(incident_number)
-                    return {
-                        "messages": messages + [AIMessage(content=result)]
-                    }
-                except Exception as e:
-                    logging.error(f"Error in query_node: {str(e)}")
-                    return {
-                        "messages": messages + [AIMessage(content=f"Error processing incident: {str(e)}")]
-                    }
-            return state
+            try:
+                with stage_deadline("query"):
+                    result = self.snow_tools.query_incident(state["incident_number"])
+            except DeadlineExceeded:
+                return self.timeout_update("query", state.get("related_kb"))
+            except Exception as e:
+                logging.error(f"Error in query_node: {str(e)}")
+                result = f"Error processing incident: {str(e)}"
+            return self.query_update(result)
 
         def analyze_node(state):
-            messages = state["messages"]
-            last_message = messages[-1]
-            if "Incident details found" in last_message.content:
-                try:
-                    result = self.snow_tools.analyze_incident(last_message.content)
-                    return {
-                        "messages": messages + [AIMessage(content=result)]
-                    }
-                except Exception as e:
-                    logging.error(f"Error in analyze_node: {str(e)}")
-                    return {
-                        "messages": messages + [AIMessage(content=f"Error analyzing incident: {str(e)}")]
-                    }
-            return state
+            try:
+                with stage_deadline("analyze"):
+                    result = self.snow_tools.analyze_incident(state["details"])
+            except DeadlineExceeded:
+                return self.timeout_update("analyze", state.get("related_kb"))
+            except Exception as e:
+                logging.error(f"Error in analyze_node: {str(e)}")
+                result = f"Error analyzing incident: {str(e)}"
+            return self.analysis_update(result)
 
         def kb_node(state):
-            messages = state["messages"]
-            last_message = messages[-1]
-            if "Analysis complete" in last_message.content:
-                try:
-                    result = self.snow_tools.find_kb_articles(last_message.content)
-                    return {
-                        "messages": messages + [AIMessage(content=result)]
-                    }
-                except Exception as e:
-                    logging.error(f"Error in kb_node: {str(e)}")
-                    return {
-                        "messages": messages + [AIMessage(content=f"Error searching KB articles: {str(e)}")]
-                    }
-            return state
+            try:
+                with stage_deadline("kb_search"):
+                    result = self.snow_tools.find_kb_articles(state["analysis"])
+            except DeadlineExceeded:
+                return self.timeout_update("kb_search", state.get("related_kb"))
+            except Exception as e:
+                logging.error(f"Error in kb_node: {str(e)}")
+                result = f"Error searching KB articles: {str(e)}"
+            return self.kb_update(result, state.get("related_kb"))
 
-        # Add nodes and edges
-        workflow.add_node("query", query_node)
-        workflow.add_node("analyze", analyze_node)
-        workflow.add_node("kb_search", kb_node)
-        
-        def get_next_step(state: Dict) -> str:
-            messages = state["messages"]
-            if not messages:
-                return "end"
-                
-            last_message = messages[-1]
-            content = last_message.content.lower()
-            
-            if "incident details found" in content:
-                return "analyze"
-            elif "analysis complete" in content:
-                return "kb_search"
-            elif any([
-                "kb articles found" in content,
-                "no relevant kb articles found" in content,
-                "error" in content
-            ]):
-                return "end"
-            else:
-                return "query"
-
-        workflow.add_edge(START, "query")
-        for node in ["query", "analyze", "kb_search"]:
-            workflow.add_conditional_edges(
-                node,
-                get_next_step,
-                {
-                    "query": "query",
-                    "analyze": "analyze",
-                    "kb_search": "kb_search",
-                    "end": END
-                }
-            )
-        self.chain = workflow.compile()
+        self.chain = self.compile_workflow(query_node, analyze_node, kb_node)
         return self.chain
-    
-    def invoke_chain(self, user_input: str) -> str:
+
+    def coalescing_stats(self) -> Dict:
+        """How many pipeline runs and tool calls were shared with an identical in-flight call."""
+        return {"pipeline": self.single_flight.stats(), "tools": self.snow_tools.coalescing_stats()}
+
+    def scheduler_stats(self) -> Dict:
+        """Concurrency limit, queue depth and wait times of the ServiceNow and LLM schedulers."""
+        return scheduler_stats()
+
+    def collect_metrics(self):
+        """Cache hit counts and upstream queue gauges, read from the stats the components already keep."""
+        caches = {**self.snow_tools.cache_stats(), "precomputed": self.precomputed.stats()}
+        for cache, stats in caches.items():
+            labels = {"cache": cache}
+            yield "ipe_cache_hits_total", "counter", "Cache lookups answered from the cache", labels, stats.get("hits", 0)
+            yield "ipe_cache_misses_total", "counter", "Cache lookups that went upstream", labels, stats.get("misses", 0)
+            yield "ipe_cache_hit_ratio", "gauge", "Share of lookups answered from the cache", labels, stats.get("hit_rate", 0.0)
+        for upstream, stats in scheduler_stats().items():
+            labels = {"upstream": upstream}
+            yield "ipe_upstream_limit", "gauge", "Adaptive concurrency limit", labels, stats["limit"]
+            yield "ipe_upstream_in_flight", "gauge", "Calls holding a slot", labels, stats["in_flight"]
+            yield "ipe_upstream_queue_depth", "gauge", "Calls waiting for a slot", labels, stats["queue_depth"]
+
+    def speculation_stats(self) -> Dict:
+        """Wall time saved by fetching incidents during classification, and the work thrown away."""
+        return self.speculator.stats()
+
+    def speculate(self, user_input: str) -> Dict:
+        """
+        Start fetching INC-shaped tokens while the input is classified. The rule tier is not consulted
+        first; when it answers, the query step simply joins the fetch already in flight.
+        """
+        return self.speculator.start(user_input)
+
+    def run_incident_workflow(self, incident_number: str, related_kb: str = None) -> str:
+        result = self.get_chain().invoke(self.initial_state(incident_number, related_kb))
+        return self.format_result(result)
+
+    @staticmethod
+    def initial_state(incident_number: str, related_kb: str = None) -> Dict:
+        return {
+            "messages": [
+                SystemMessage(content="Processing ServiceNow incident workflow."),
+                HumanMessage(content=f"Process incident {incident_number}")
+            ],
+            "incident_number": incident_number,
+            "status": IncidentStatus.PENDING,
+            "kb_articles": [],
+            "related_kb": related_kb or ""
+        }
+
+    @staticmethod
+    def format_result(result) -> str:
+        if isinstance(result, dict) and "messages" in result:
+            formatted_response = []
+            for message in result["messages"]:
+                if hasattr(message, 'content'):
+                    formatted_response.append(message.content)
+            return "\n".join(formatted_response)
+        return None
+
+    @staticmethod
+    def stream_event_text(mode: str, payload, streamed_nodes: set) -> str:
+        """
+        Turn one ("updates" | "messages") graph event into chat text.
+        LLM tokens are emitted as they arrive; a node whose tokens were streamed only adds a line break
+        when it finishes, other nodes emit their whole message once done.
+        """
+        if mode == "messages":
+            chunk, metadata = payload
+            node = metadata.get("langgraph_node")
+            if isinstance(chunk, AIMessageChunk) and chunk.content:
+                if node not in streamed_nodes:
+                    streamed_nodes.add(node)
+                    return "\nAnalysis complete: " + chunk.content if node == "analyze" else "\n" + chunk.content
+                return chunk.content
+            return ""
+        text = ""
+        for node, update in payload.items():
+            if not update or not update.get("messages"):
+                continue
+            # A streamed node only adds text when it was cut short by the deadline
+            if node in streamed_nodes and update.get("status") != IncidentStatus.PARTIAL:
+                continue
+            text += "\n" + "\n".join(message.content for message in update["messages"])
+        return text
+
+    def stream_incident(self, incident_number: str, related_kb: str = None) -> Iterator[str]:
+        """Yield the incident workflow output incrementally: node results as they finish, analysis token by token."""
+        initial_state = self.initial_state(incident_number, related_kb)
+        yield "\n".join(message.content for message in initial_state["messages"])
+        streamed_nodes = set()
+        for mode, payload in self.get_chain().stream(initial_state, stream_mode=["updates", "messages"]):
+            text = self.stream_event_text(mode, payload, streamed_nodes)
+            if text:
+                yield text
+
+    def stream_chain(self, user_input: str, trace: RequestTrace = None, profile: bool = None) -> Iterator[str]:
+        """Streaming counterpart of invoke_chain, yielding text chunks as soon as they are available."""
+        # Stepped inside its own context, so the request deadline never leaks into the caller between chunks
+        context = contextvars.copy_context()
+        chunks = context.run(self._stream_request, user_input, trace, profile)
         try:
-            # Let LLM analyze the input
+            while True:
+                try:
+                    chunk = context.run(next, chunks)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            context.run(chunks.close)
+
+    def _stream_request(self, user_input: str, trace: RequestTrace = None, profile: bool = None) -> Iterator[str]:
+        with request_deadline(), request_trace(trace), profile_request(user_input, profile), \
+                measure(REQUEST_SECONDS, "request", action="none") as labels:
+            try:
+                lookups = self.speculate(user_input)
+                analysis = self.classify(user_input)
+                logging.info(f"Input routed by {analysis.get('tier')} tier: {analysis['action_type']}")
+                labels["action"] = analysis["action_type"] if analysis["confidence"] >= 0.7 else "unclear"
+                speculation = self.speculator.resolve(lookups, analysis)
+
+                if analysis["confidence"] < 0.7:
+                    yield "I'm not quite sure what you're asking for. Could you please rephrase your request?"
+                elif analysis["action_type"] == "incident":
+                    precomputed = self.precomputed_response(analysis['incident_number'])
+                    if precomputed:
+                        self.speculator.settle(speculation, precomputed)
+                        yield precomputed
+                    else:
+                        output = []
+                        for chunk in self.stream_incident(analysis['incident_number'], self.speculator.related_kb(speculation)):
+                            output.append(chunk)
+                            yield chunk
+                        self.speculator.settle(speculation, "".join(output))
+                elif analysis["action_type"] == "kb_search":
+                    with stage_deadline("kb_search"):
+                        result = self.snow_tools.find_kb_articles(analysis["search_keywords"])
+                    yield result
+                else:  # conversation
+                    prompt = self.conversation_prompt(user_input, analysis)
+                    with stage_deadline("chat"):
+                        for chunk in self.chat_llm.stream([HumanMessage(content=prompt)]):
+                            if chunk.content:
+                                yield chunk.content
+            except DeadlineExceeded:
+                labels["action"] = "timeout"
+                yield self.OUT_OF_TIME
+            except Exception as e:
+                labels["action"] = "error"
+                logging.error("Error processing request", exc_info=True)
+                yield f"I encountered an error while processing your request: {str(e)}"
+
+    def classify(self, user_input: str) -> Dict:
+        """analyze_input under the classify budget, timed per routing tier."""
+        with stage_deadline("classify"), profile_section("classify"), \
+                measure(CLASSIFY_SECONDS, "classify", tier="none") as labels:
             analysis = self.input_analyzer.analyze_input(user_input)
-            
-            if analysis["confidence"] < 0.7:
-                return "I'm not quite sure what you're asking for. Could you please rephrase your request?"
-
-            if analysis["action_type"] == "incident":
-                if not self.chain:
-                    self.chain = self.create_workflow()
-
-                initial_state = {
-                    "messages": [
-                        SystemMessage(content="Processing ServiceNow incident workflow."),
-                        HumanMessage(content=f"Process incident {analysis['incident_number']}")
-                    ]
-                }
-                
-                result = self.chain.invoke(
-                    initial_state,
-                    {"recursion_limit": 100}
-                )
-                
-                if isinstance(result, dict) and "messages" in result:
-                    formatted_response = []
-                    for message in result["messages"]:
-                        if hasattr(message, 'content'):
-                            formatted_response.append(message.content)
-                    return "\n".join(formatted_response)
-
-            elif analysis["action_type"] == "kb_search":
-                # Use the LLM-generated search keywords
-                return self.snow_tools.find_kb_articles(analysis["search_keywords"])
-
-            else:  # conversation
-                # Generate conversational response using LLM
-                prompt = f"""
+            labels["tier"] = analysis.get("tier")
+        return analysis
+
+    @staticmethod
+    def conversation_prompt(user_input: str, analysis: Dict) -> str:
+        return f"""
                 Generate a friendly and professional response to this user message: {user_input}
                 Context: {analysis['conversation_context']}
                 Keep the response natural and helpful.
                 """
-                response = self.input_analyzer.llm.invoke([HumanMessage(content=prompt)])
-                return response.content
 
-        except Exception as e:
-            logging.error("Error processing request", exc_info=True)
-            return f"I encountered an error while processing your request: {str(e)}"
+    def invoke_chain(self, user_input: str, trace: RequestTrace = None, profile: bool = None) -> str:
+        """
+        Answer one chat turn. Pass a RequestTrace to get the timing breakdown of the turn, and
+        profile=True to profile it (profile_requests=true profiles every turn).
+        """
+        # Every node, ServiceNow read and LLM call below shares this request's time budget
+        with request_deadline(), request_trace(trace), profile_request(user_input, profile), \
+                measure(REQUEST_SECONDS, "request", action="none") as labels:
+            try:
+                # Fetch INC-shaped tokens while the LLM analyzes the input
+                lookups = self.speculate(user_input)
+                analysis = self.classify(user_input)
+                logging.info(f"Input routed by {analysis.get('tier')} tier: {analysis['action_type']}")
+                labels["action"] = analysis["action_type"] if analysis["confidence"] >= 0.7 else "unclear"
+                speculation = self.speculator.resolve(lookups, analysis)
+            
+                if analysis["confidence"] < 0.7:
+                    return "I'm not quite sure what you're asking for. Could you please rephrase your request?"
+
+                if analysis["action_type"] == "incident":
+
+                    incident_number = analysis['incident_number']
+                    precomputed = self.precomputed_response(incident_number)
+                    if precomputed:
+                        self.speculator.settle(speculation, precomputed)
+                        return precomputed
+
+                    # Engineers pasting the same INC at the same time share one workflow run
+                    response = self.single_flight.do(("pipeline", incident_number.upper()), self.run_incident_workflow,
+                                                     incident_number, self.speculator.related_kb(speculation))
+                    self.speculator.settle(speculation, response)
+                    return response
+
+                elif analysis["action_type"] == "kb_search":
+                    # Use the LLM-generated search keywords
+                    with stage_deadline("kb_search"):
+                        return self.snow_tools.find_kb_articles(analysis["search_keywords"])
+
+                else:  # conversation
+                    # Generate conversational response using LLM
+                    prompt = self.conversation_prompt(user_input, analysis)
+                    with stage_deadline("chat"):
+                        response = self.chat_llm.invoke([HumanMessage(content=prompt)])
+                    return response.content
+
+            except DeadlineExceeded:
+                labels["action"] = "timeout"
+                return self.OUT_OF_TIME
+            except Exception as e:
+                labels["action"] = "error"
+                logging.error("Error processing request", exc_info=True)
+                return f"I encountered an error while processing your request: {str(e)}"
     # def invoke_chain(self,user_input):
     #     try:
     #         #incident_number = "INC0000059"
@@ -421,4 +1093,4 @@ class WorkflowManager:
 #         logging.error("Workflow execution error", exc_info=True)
 #         print(f"Error executing workflow: {str(e)}")
 
-__all__ = ['WorkflowManager']
\ No newline at end of file
+__all__ = ['WorkflowManager', 'IncidentState', 'IncidentStatus']
\ No newline at end of file
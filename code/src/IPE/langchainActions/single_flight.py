@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from pipelineRuntime.deadline import DeadlineExceeded, remaining
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class _LeaderCancelled(Exception):
+    """Handed to the joiners of a call whose leader was cancelled, so one of them can run it again."""
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function,
+    callers arriving while it is in flight wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            # A joiner gives up at its own deadline, the leader keeps running for the others
+            if not call.event.wait(remaining()):
+                raise DeadlineExceeded("Deadline reached while waiting for a shared call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+                "coalesced_rate": self.coalesced / calls if calls else 0.0
+            }
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            # shield: a cancelled or timed out waiter must not cancel the shared call
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), remaining())
+            except _LeaderCancelled:
+                # Only the leader's caller went away; the first joiner to get here runs the call again
+                continue
+            except asyncio.TimeoutError:
+                if future.done():
+                    # The shared call itself timed out
+                    raise
+                raise DeadlineExceeded("Deadline reached while waiting for a shared call")
+
+        self.executions += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Cancelling the future would cancel every joiner with it
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> Dict:
+        calls = self.executions + self.coalesced
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+            "coalesced_rate": self.coalesced / calls if calls else 0.0
+        }
+
+__all__ = ['SingleFlight', 'AsyncSingleFlight']
@@ -0,0 +1,186 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from createModels.intent_router import INCIDENT_PATTERN
+
+class SpeculativeLookup:
+    """Incident fetch and short-description KB search started for one INC-shaped token."""
+
+    def __init__(self, incident_number: str):
+        self.incident_number = incident_number
+        self.started = time.perf_counter()
+        self.fetch_end = None
+        self.fetch_seconds = 0.0
+        self.kb_end = None
+        self.kb_seconds = 0.0
+        self.kb_result = None
+        self.related_kb = None  # kb_result as it was when classification finished
+        self.outcome = None  # "confirmed" | "discarded", set once classification is known
+        self.kb_accounted = False
+
+class Speculator:
+    """
+    Starts the ServiceNow fetch (and a KB search on the incident's short description) for every
+    INC-shaped token while the input is still being classified. The fetch goes through the tools'
+    single flight and incident cache, so a confirmed speculation turns the workflow's query step
+    into a cache hit or a join on the call already in flight. Speculations the classifier disagrees
+    with are discarded and counted as wasted work.
+    """
+
+    def __init__(self, snow_tools, workers: int = 4, max_candidates: int = 2, enabled: bool = True):
+        self.snow_tools = snow_tools
+        self.max_candidates = max_candidates
+        self.enabled = enabled
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculation")
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self.started = 0
+        self.confirmed = 0
+        self.discarded = 0
+        self.saved_seconds = 0.0
+        self.wasted_seconds = 0.0
+        self.kb_used = 0
+        self.kb_unused = 0
+
+    def candidates(self, user_input: str) -> List[str]:
+        numbers = []
+        for match in INCIDENT_PATTERN.findall(user_input or ""):
+            if match.upper() not in numbers:
+                numbers.append(match.upper())
+        return numbers[:self.max_candidates]
+
+    def _begin(self, user_input: str) -> Dict[str, SpeculativeLookup]:
+        lookups = {number: SpeculativeLookup(number) for number in self.candidates(user_input)}
+        with self._lock:
+            self.started += len(lookups)
+        return lookups
+
+    def start(self, user_input: str) -> Dict[str, SpeculativeLookup]:
+        lookups = self._begin(user_input) if self.enabled else {}
+        for lookup in lookups.values():
+            # The lookup runs under the request's deadline and trace
+            self.executor.submit(contextvars.copy_context().run, self._run, lookup)
+        return lookups
+
+    def astart(self, user_input: str) -> Dict[str, SpeculativeLookup]:
+        """start() for the async tools; the lookups run as tasks on the current loop."""
+        lookups = self._begin(user_input) if self.enabled else {}
+        for lookup in lookups.values():
+            task = asyncio.ensure_future(self._arun(lookup))
+            # The loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return lookups
+
+    def short_description(self, incident_number: str) -> Optional[str]:
+        # Peeked so the speculation's own reads do not show up in the cache hit rate
+        entry = self.snow_tools.incident_cache.peek(incident_number)
+        return entry.record.get('short_description') if entry is not None else None
+
+    def _finish_fetch(self, lookup: SpeculativeLookup):
+        with self._lock:
+            lookup.fetch_end = time.perf_counter()
+            lookup.fetch_seconds = lookup.fetch_end - lookup.started
+            if lookup.outcome == "discarded":
+                self.wasted_seconds += lookup.fetch_seconds
+
+    def _finish_kb(self, lookup: SpeculativeLookup, kb_started: float, result: str):
+        with self._lock:
+            lookup.kb_result = result
+            lookup.kb_end = time.perf_counter()
+            lookup.kb_seconds = lookup.kb_end - kb_started
+            # Classified before the search finished: its result can no longer be used
+            if lookup.outcome is not None and not lookup.kb_accounted:
+                lookup.kb_accounted = True
+                self.kb_unused += 1
+                self.wasted_seconds += lookup.kb_seconds
+
+    def _run(self, lookup: SpeculativeLookup):
+        try:
+            details = self.snow_tools.query_incident(lookup.incident_number)
+            self._finish_fetch(lookup)
+            short_description = self.short_description(lookup.incident_number)
+            if details.startswith("Incident details found") and short_description:
+                kb_started = time.perf_counter()
+                self._finish_kb(lookup, kb_started, self.snow_tools.search_kb_articles(short_description))
+        except Exception as e:
+            logging.warning(f"Speculative lookup for {lookup.incident_number} failed: {str(e)}")
+
+    async def _arun(self, lookup: SpeculativeLookup):
+        try:
+            details = await self.snow_tools.aquery_incident(lookup.incident_number)
+            self._finish_fetch(lookup)
+            short_description = self.short_description(lookup.incident_number)
+            if details.startswith("Incident details found") and short_description:
+                kb_started = time.perf_counter()
+                self._finish_kb(lookup, kb_started, await self.snow_tools.asearch_kb_articles(short_description))
+        except Exception as e:
+            logging.warning(f"Speculative lookup for {lookup.incident_number} failed: {str(e)}")
+
+    def resolve(self, lookups: Dict[str, SpeculativeLookup], analysis: Dict) -> Optional[SpeculativeLookup]:
+        """Match the speculations against the classification; returns the confirmed lookup, if any."""
+        if not lookups:
+            return None
+        now = time.perf_counter()
+        number = (analysis.get("incident_number") or "").upper() if analysis.get("action_type") == "incident" else None
+        confirmed = None
+        with self._lock:
+            for lookup in lookups.values():
+                if lookup.incident_number == number and analysis.get("confidence", 0) >= 0.7:
+                    lookup.outcome = "confirmed"
+                    lookup.related_kb = lookup.kb_result if lookup.kb_end is not None else None
+                    confirmed = lookup
+                    self.confirmed += 1
+                    # Fetch time that overlapped classification is time the workflow no longer waits for
+                    self.saved_seconds += min(lookup.fetch_end or now, now) - lookup.started
+                else:
+                    lookup.outcome = "discarded"
+                    self.discarded += 1
+                    if lookup.fetch_end is not None:
+                        self.wasted_seconds += lookup.fetch_seconds
+                if lookup.kb_end is not None and lookup is not confirmed:
+                    lookup.kb_accounted = True
+                    self.kb_unused += 1
+                    self.wasted_seconds += lookup.kb_seconds
+        if confirmed is not None:
+            logging.info(f"Speculative fetch of {confirmed.incident_number} confirmed by classification")
+        return confirmed
+
+    @staticmethod
+    def related_kb(lookup: Optional[SpeculativeLookup]) -> Optional[str]:
+        """The short-description KB result if it was ready when classification finished."""
+        return lookup.related_kb if lookup is not None else None
+
+    def settle(self, lookup: Optional[SpeculativeLookup], output: str):
+        """Record whether the workflow answer used the speculative KB result."""
+        if lookup is None or lookup.related_kb is None:
+            return
+        with self._lock:
+            if lookup.kb_accounted:
+                return
+            lookup.kb_accounted = True
+            if lookup.related_kb in (output or ""):
+                self.kb_used += 1
+            else:
+                self.kb_unused += 1
+                self.wasted_seconds += lookup.kb_seconds
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "started": self.started,
+                "confirmed": self.confirmed,
+                "discarded": self.discarded,
+                "hit_rate": self.confirmed / self.started if self.started else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "wasted_seconds": round(self.wasted_seconds, 3),
+                "kb_used": self.kb_used,
+                "kb_unused": self.kb_unused
+            }
+
+__all__ = ['Speculator', 'SpeculativeLookup']
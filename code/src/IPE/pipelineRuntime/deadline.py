@@ -0,0 +1,107 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Seconds each pipeline stage may take, overridable with deadline_budget_<stage>. A stage never
+# outlives the request deadline it runs under.
+STAGE_BUDGETS = {
+    "classify": 5.0,
+    "query": 6.0,
+    "analyze": 15.0,
+    "kb_search": 6.0,
+    "chat": 20.0
+}
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class Deadline:
+    """An absolute point in time a request, or one stage of it, has to finish by."""
+
+    def __init__(self, seconds: float, stage: str = "request", parent: "Deadline" = None):
+        self.stage = stage
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+        if parent is not None:
+            self.expires = min(self.expires, parent.expires)
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded(f"{self.stage} deadline of {self.seconds:.1f}s exceeded")
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("ipe_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request or stage, None when no deadline is set."""
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+def check_deadline():
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.check()
+
+def clamp_timeout(timeout):
+    """A float or (connect, read) timeout shortened to the time left; raises once nothing is left."""
+    left = remaining()
+    if left is None:
+        return timeout
+    check_deadline()
+    if isinstance(timeout, tuple):
+        return tuple(min(part, left) for part in timeout)
+    return min(timeout, left) if timeout else left
+
+def raise_if_expired(error: Exception):
+    """Re-raise an error caused by the deadline as DeadlineExceeded, so callers can tell the two apart."""
+    if isinstance(error, DeadlineExceeded):
+        raise error
+    deadline = _deadline.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(f"{deadline.stage} deadline of {deadline.seconds:.1f}s exceeded") from error
+
+@contextmanager
+def request_deadline(seconds: float = None):
+    """Bound everything the enclosed code calls, in this context and tasks or threads that copy it."""
+    seconds = float(os.getenv("request_deadline", "30")) if seconds is None else seconds
+    if seconds <= 0:
+        yield None
+        return
+    token = _deadline.set(Deadline(seconds))
+    try:
+        yield _deadline.get()
+    finally:
+        _deadline.reset(token)
+
+@contextmanager
+def stage_deadline(stage: str, seconds: float = None):
+    """The stage's budget, capped by the request deadline. Outside a request only the request is bounded."""
+    parent = _deadline.get()
+    if parent is None:
+        yield None
+        return
+    if seconds is None:
+        seconds = float(os.getenv(f"deadline_budget_{stage}", str(STAGE_BUDGETS.get(stage, 0))))
+    deadline = Deadline(seconds, stage, parent) if seconds > 0 else parent
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    except DeadlineExceeded:
+        logging.warning(f"Stage {stage} ran out of time after {seconds:.1f}s")
+        raise
+    finally:
+        _deadline.reset(token)
+
+__all__ = ['Deadline', 'DeadlineExceeded', 'STAGE_BUDGETS', 'check_deadline', 'clamp_timeout', 'current_deadline',
+           'raise_if_expired', 'remaining', 'request_deadline', 'stage_deadline']
@@ -0,0 +1,63 @@
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+class HedgePolicy:
+    """
+    Decides when a duplicate read is worth sending: once the first attempt has been running longer
+    than the recent percentile latency. Until min_samples latencies are known nothing is hedged.
+    """
+
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20, min_delay: float = 0.05,
+                 window: int = 200, enabled: bool = True):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.enabled = enabled
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "HedgePolicy":
+        return cls(
+            percentile=float(os.getenv(f"{prefix}_hedge_percentile", "0.95")),
+            min_samples=int(os.getenv(f"{prefix}_hedge_min_samples", "20")),
+            min_delay=float(os.getenv(f"{prefix}_hedge_min_delay", "0.05")),
+            enabled=os.getenv(f"{prefix}_hedge_enabled", "true").lower() == "true"
+        )
+
+    def record(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait for the first attempt before sending the hedge, None to not hedge."""
+        with self._lock:
+            if not self.enabled or len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return max(ordered[min(int(len(ordered) * self.percentile), len(ordered) - 1)], self.min_delay)
+
+    def launched(self):
+        with self._lock:
+            self.hedged += 1
+
+    def won(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict:
+        delay = self.delay()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "samples": len(self._latencies),
+                "hedge_after": round(delay, 3) if delay is not None else None,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins
+            }
+
+__all__ = ['HedgePolicy']
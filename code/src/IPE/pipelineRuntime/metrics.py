@@ -0,0 +1,272 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+
+def _label_text(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels.keys(), escaped)) + "}"
+
+def _format(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_label_text(dict(zip(self.labelnames, key)))} {_format(value)}")
+        return lines
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and three additions under a lock."""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in series.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format(bound)
+                lines.append(f"{self.name}_bucket{_label_text({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(labels)} {_format(total)}")
+            lines.append(f"{self.name}_count{_label_text(labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Metrics in the Prometheus text format. Histograms and counters are updated on the hot path;
+    collectors are called at scrape time to report values other components already keep, such as
+    cache hit counts and scheduler queue depth, so those cost nothing per request.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Tuple[str, str, str, Dict, float]]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, key: str, collect: Callable):
+        """collect() yields (name, type, help, labels, value); a later registration under key replaces it."""
+        with self._lock:
+            self._collectors[key] = collect
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        collected: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collect in collectors:
+            try:
+                for name, kind, help, labels, value in collect():
+                    collected.setdefault(name, (kind, help, []))[2].append(f"{name}{_label_text(labels)} {_format(value)}")
+            except Exception as e:
+                logging.warning(f"Metrics collector failed: {str(e)}")
+        for name, (kind, help, samples) in collected.items():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}"] + samples)
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram("ipe_request_seconds", "End-to-end chat turn latency", ("action",))
+CLASSIFY_SECONDS = REGISTRY.histogram("ipe_classify_seconds", "InputAnalyzer.analyze_input latency", ("tier", "status"))
+NODE_SECONDS = REGISTRY.histogram("ipe_graph_node_seconds", "Incident workflow node latency", ("node", "status"))
+SNOW_SECONDS = REGISTRY.histogram("ipe_snow_request_seconds", "ServiceNow get_details latency, retries and hedges included",
+                                  ("table", "status"))
+LLM_SECONDS = REGISTRY.histogram("ipe_llm_request_seconds", "LLM call latency per task and tier", ("task", "tier"))
+LLM_TOKENS = REGISTRY.histogram("ipe_llm_tokens", "Prompt and completion tokens per LLM call", ("task", "tier", "kind"),
+                                buckets=TOKEN_BUCKETS)
+ERRORS = REGISTRY.counter("ipe_errors_total", "Failed ServiceNow reads, LLM calls and workflow nodes", ("component",))
+
+class RequestTrace:
+    """The steps of one chat turn in the order they finished, for the per-request timing panel."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.steps: List[Tuple[str, float, float]] = []
+        # Summary of the request's profile, when it was profiled
+        self.profile: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def add(self, step: str, seconds: float):
+        with self._lock:
+            self.steps.append((step, time.perf_counter() - self.started - seconds, seconds))
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def breakdown(self) -> List[Dict]:
+        """One row per step: start offset and duration in milliseconds."""
+        with self._lock:
+            steps = sorted(self.steps, key=lambda step: step[1])
+        return [{"step": step, "start_ms": round(offset * 1000, 1), "ms": round(seconds * 1000, 1)}
+                for step, offset, seconds in steps]
+
+    def total_ms(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return round((end - self.started) * 1000, 1)
+
+_trace: ContextVar[Optional[RequestTrace]] = ContextVar("ipe_request_trace", default=None)
+
+@contextmanager
+def request_trace(trace: RequestTrace = None):
+    trace = trace or RequestTrace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _trace.reset(token)
+
+def current_trace() -> Optional[RequestTrace]:
+    return _trace.get()
+
+def record_step(step: str, seconds: float):
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(step, seconds)
+
+_tracer = None
+_tracer_checked = False
+
+def tracer():
+    """The OpenTelemetry tracer when otel_enabled=true and opentelemetry is installed, else None."""
+    global _tracer, _tracer_checked
+    if not _tracer_checked:
+        _tracer_checked = True
+        if os.getenv("otel_enabled", "false").lower() == "true":
+            try:
+                from opentelemetry import trace
+                _tracer = trace.get_tracer("ipe")
+            except Exception as e:
+                logging.warning(f"OpenTelemetry unavailable, spans disabled: {str(e)}")
+    return _tracer
+
+@contextmanager
+def measure(histogram: Histogram, step: str, **labels):
+    """
+    Time the enclosed block into histogram, the current request's breakdown and, when enabled, an
+    OpenTelemetry span. Yields the label dict so labels known only at the end can still be set.
+    A block that raises is exported with status "error" (unless the caller set a status) and an
+    error span carrying the exception; the exception is re-raised.
+    """
+    otel = tracer()
+    span = otel.start_as_current_span(step, attributes={k: str(v) for k, v in labels.items()}) if otel else None
+    if span is not None:
+        span.__enter__()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield labels
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if "status" in histogram.labelnames and not labels.get("status"):
+            labels["status"] = "error" if error is not None else "ok"
+        histogram.observe(elapsed, **labels)
+        record_step(step, elapsed)
+        if span is not None and error is not None:
+            # The span records the exception and sets its own status to ERROR
+            span.__exit__(type(error), error, error.__traceback__)
+        elif span is not None:
+            span.__exit__(None, None, None)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int = None, host: str = None) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on metrics_port (0 disables it); idempotent, so every warm_up may call it."""
+    global _server
+    port = int(os.getenv("metrics_port", "0")) if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host or os.getenv("metrics_host", "127.0.0.1"), port), _MetricsHandler)
+            except OSError as e:
+                logging.error(f"Metrics endpoint could not bind port {port}: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            logging.info(f"Serving Prometheus metrics on port {port}")
+        return _server
+
+__all__ = ['CLASSIFY_SECONDS', 'Counter', 'ERRORS', 'Histogram', 'LLM_SECONDS', 'LLM_TOKENS', 'MetricsRegistry',
+           'NODE_SECONDS', 'REGISTRY', 'REQUEST_SECONDS', 'RequestTrace', 'SNOW_SECONDS', 'current_trace', 'measure',
+           'record_step', 'request_trace', 'start_metrics_server', 'tracer']
@@ -0,0 +1,243 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+from pipelineRuntime.metrics import current_trace
+
+PROFILE_MODES = ("sampling", "cprofile", "both")
+
+class StackSampler:
+    """
+    Samples the Python stacks of registered threads every interval seconds and counts them in the
+    folded format flamegraph.pl, speedscope and inferno read. Each stack is prefixed with the
+    sections (request, graph node) the thread was in, so node boundaries show up in the graph.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        # thread ident -> labels of the sections it is in, outermost first
+        self._threads: Dict[int, List[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enter(self, label: str):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads.setdefault(ident, []).append(label)
+
+    def exit(self):
+        ident = threading.get_ident()
+        with self._lock:
+            labels = self._threads.get(ident)
+            if labels:
+                labels.pop()
+            if not labels:
+                self._threads.pop(ident, None)
+
+    @staticmethod
+    def frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            threads = [(ident, list(labels)) for ident, labels in self._threads.items()]
+        for ident, labels in threads:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(self.frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(labels + stack[::-1])] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hotspots(self, top: int = 25) -> List[Dict]:
+        """Functions with the most samples on top of the stack (self) and anywhere in it (total)."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = [frame for frame in stack.split(";") if " (" in frame]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples = sum(self.stacks.values()) or 1
+        return [{"function": function, "self_pct": round(100 * count / samples, 1),
+                 "total_pct": round(100 * total[function] / samples, 1)}
+                for function, count in own.most_common(top)]
+
+class ProfileSession:
+    """One profiled request: the sampler and/or cProfile, the sections it went through, and its output files."""
+
+    def __init__(self, label: str, mode: str = "sampling", interval: float = 0.005, output_dir: str = None,
+                 top: int = 25):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.label = label
+        self.mode = mode
+        self.top = top
+        self.output_dir = os.path.expanduser(output_dir or os.getenv("profile_dir", "~/.cache/ipe/profiles"))
+        self.sampler = StackSampler(interval) if mode in ("sampling", "both") else None
+        self.profiler = None
+        self.sections: List[tuple] = []
+        self.summary: Optional[Dict] = None
+        self._sections_lock = threading.Lock()
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.sampler is not None:
+            self.sampler.enter("request")
+            self.sampler.start()
+        if self.mode in ("cprofile", "both"):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self.profiler = profiler
+            except ValueError as e:
+                # Only one profiler per thread, e.g. two profiled requests on the shared event loop
+                logging.warning(f"cProfile unavailable for this request: {str(e)}")
+
+    def stop(self) -> Dict:
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler.exit()
+        seconds = time.perf_counter() - self._started
+        try:
+            self.summary = self.write(seconds)
+        except OSError as e:
+            logging.error(f"Could not write profile for {self.label}: {str(e)}")
+            self.summary = {"label": self.label, "seconds": round(seconds, 3), "files": {}, "error": str(e)}
+        return self.summary
+
+    def section_started(self, label: str):
+        if self.sampler is not None:
+            self.sampler.enter(label)
+        return time.perf_counter()
+
+    def section_finished(self, label: str, started: float):
+        if self.sampler is not None:
+            self.sampler.exit()
+        with self._sections_lock:
+            self.sections.append((label, started - self._started, time.perf_counter() - started))
+
+    def cprofile_top(self) -> str:
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(self.top)
+        return stream.getvalue()
+
+    def write(self, seconds: float) -> Dict:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = os.path.join(self.output_dir, f"{datetime.now():%Y%m%d-%H%M%S}_{re.sub(r'[^A-Za-z0-9_-]+', '_', self.label)[:40]}")
+        files = {}
+        hotspots = []
+        lines = [f"Profile of {self.label!r}: {seconds * 1000:.0f} ms, mode {self.mode}", "", "Sections:"]
+        for label, offset, duration in sorted(self.sections, key=lambda section: section[1]):
+            lines.append(f"  {label:<20} start {offset * 1000:>9.1f} ms  took {duration * 1000:>9.1f} ms")
+        if self.sampler is not None:
+            files["folded"] = stem + ".folded"
+            with open(files["folded"], "w") as handle:
+                handle.write(self.sampler.folded())
+            hotspots = self.sampler.hotspots(self.top)
+            lines += ["", f"Top {self.top} by samples ({self.sampler.samples} samples every "
+                          f"{self.sampler.interval * 1000:.0f} ms), self% / total%:"]
+            lines += [f"  {spot['self_pct']:>5.1f}  {spot['total_pct']:>5.1f}  {spot['function']}" for spot in hotspots]
+        if self.profiler is not None:
+            files["pstats"] = stem + ".prof"
+            self.profiler.dump_stats(files["pstats"])
+            lines += ["", f"cProfile top {self.top} by cumulative time:", self.cprofile_top()]
+        files["summary"] = stem + ".txt"
+        with open(files["summary"], "w") as handle:
+            handle.write("\n".join(lines) + "\n")
+        logging.info(f"Profile of {self.label} written to {files['summary']}")
+        return {
+            "label": self.label,
+            "seconds": round(seconds, 3),
+            "files": files,
+            "sections": [{"section": label, "start_ms": round(offset * 1000, 1), "ms": round(duration * 1000, 1)}
+                         for label, offset, duration in sorted(self.sections, key=lambda section: section[1])],
+            "hotspots": hotspots
+        }
+
+_session: ContextVar[Optional[ProfileSession]] = ContextVar("ipe_profile_session", default=None)
+
+def current_session() -> Optional[ProfileSession]:
+    return _session.get()
+
+def profiling_requested(enabled: bool = None) -> bool:
+    """An explicit per-request choice wins; otherwise profile_requests=true profiles every request."""
+    if enabled is not None:
+        return enabled
+    return os.getenv("profile_requests", "false").lower() == "true"
+
+@contextmanager
+def profile_request(label: str, enabled: bool = None, mode: str = None):
+    """Profile the enclosed request when enabled; yields the session, or None when not profiling."""
+    if not profiling_requested(enabled) or _session.get() is not None:
+        yield None
+        return
+    session = ProfileSession(
+        label,
+        mode=mode or os.getenv("profile_mode", "sampling").lower(),
+        interval=float(os.getenv("profile_interval", "0.005")),
+        top=int(os.getenv("profile_top", "25"))
+    )
+    token = _session.set(session)
+    session.start()
+    try:
+        yield session
+    finally:
+        _session.reset(token)
+        summary = session.stop()
+        trace = current_trace()
+        if trace is not None:
+            trace.profile = summary
+
+@contextmanager
+def profile_section(label: str):
+    """Mark a section, such as a graph node, in the current request's profile; free when not profiling."""
+    session = _session.get()
+    if session is None:
+        yield
+        return
+    started = session.section_started(label)
+    try:
+        yield
+    finally:
+        session.section_finished(label, started)
+
+__all__ = ['PROFILE_MODES', 'ProfileSession', 'StackSampler', 'current_session', 'profile_request',
+           'profile_section', 'profiling_requested']
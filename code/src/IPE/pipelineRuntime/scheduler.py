@@ -0,0 +1,360 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Lower value is served first. Interactive chat preempts background pre-analysis, which preempts bulk triage.
+PRIORITIES = {"interactive": 0, "background": 1, "bulk": 2}
+
+_priority: ContextVar[str] = ContextVar("ipe_request_priority", default="interactive")
+
+# Per-upstream defaults, each overridable with <upstream>_rpm, _tpm, _max_concurrency, _min_concurrency,
+# _latency_target. A rate of 0 means unlimited.
+UPSTREAM_DEFAULTS = {
+    "snow": {"rpm": 1200, "tpm": 0, "max_concurrency": 20, "min_concurrency": 2, "latency_target": 2.0},
+    "groq": {"rpm": 300, "tpm": 300000, "max_concurrency": 8, "min_concurrency": 1, "latency_target": 0},
+    "fake": {"rpm": 0, "tpm": 0, "max_concurrency": 64, "min_concurrency": 1, "latency_target": 0}
+}
+
+def current_priority() -> str:
+    return _priority.get()
+
+@contextmanager
+def request_priority(name: str):
+    """Run the enclosed calls (and tasks created inside it) in the given priority class."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority class: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class QueueTimeout(TimeoutError):
+    pass
+
+class TokenBucket:
+    """Refills at per_minute / 60 units per second up to burst. A take larger than the level leaves a debt."""
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; requests larger than the burst only wait for a full bucket."""
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+class Permit:
+    """A granted slot. Leaving the with block releases it and feeds the outcome back to the limiter."""
+
+    def __init__(self, scheduler: "UpstreamScheduler", priority: str, tokens: float, waited: float):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.tokens = tokens
+        self.waited = waited
+        self.started = time.monotonic()
+        self.throttle_count = 0
+        self.retry_after = None
+        self.error = None
+        self.released = False
+
+    def throttled(self, retry_after: float = None):
+        """The upstream answered 429 (possibly on a retry inside this permit)."""
+        self.throttle_count += 1
+        if retry_after:
+            self.retry_after = max(self.retry_after or 0.0, retry_after)
+
+    def failed(self, error: Exception):
+        """The call failed but the caller handles the exception itself (e.g. to retry)."""
+        self.error = error
+
+    def charge(self, requests: int = 0, tokens: float = None):
+        """Account for extra attempts and for the real token count once the response reports it."""
+        extra_tokens = 0.0
+        if tokens is not None:
+            extra_tokens = tokens - self.tokens
+            self.tokens = tokens
+        self.scheduler.charge(requests, extra_tokens)
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A consumer closing a stream or a cancelled hedge is not an upstream failure
+        cancelled = exc_type is not None and issubclass(exc_type, (GeneratorExit, asyncio.CancelledError))
+        self.scheduler.release(self, error=exc if exc_type is not None and not cancelled else None)
+        return False
+
+class _Waiter:
+    def __init__(self, priority: str, tokens: float, loop: asyncio.AbstractEventLoop = None):
+        self.priority = priority
+        self.tokens = tokens
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else None
+        self.enqueued = time.monotonic()
+
+    def wake(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.event.set)
+
+class UpstreamScheduler:
+    """
+    Client-side admission control for one upstream (ServiceNow, Groq). A call waits until it is at the
+    head of the priority queue, a concurrency slot is free and the request and token buckets allow it.
+    The concurrency limit is AIMD: +1 per limit's worth of successful calls, halved on a 429 (and cut
+    by 10% when latency exceeds latency_target). Non-interactive work may not use the last
+    interactive_reserve share of the slots, so chat traffic never queues behind a bulk run.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 8, min_concurrency: int = 1, latency_target: float = 0,
+                 interactive_reserve: float = 0.25, enabled: bool = True):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.latency_target = latency_target
+        self.interactive_reserve = interactive_reserve
+        self.enabled = enabled
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self.granted = {name: 0 for name in PRIORITIES}
+        self.wait_seconds = {name: 0.0 for name in PRIORITIES}
+        self.recent_waits = {name: deque(maxlen=1000) for name in PRIORITIES}
+        self.throttled = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "UpstreamScheduler":
+        defaults = UPSTREAM_DEFAULTS.get(name, UPSTREAM_DEFAULTS["fake"])
+        setting = lambda key: float(os.getenv(f"{name}_{key}", str(defaults[key])))
+        return cls(
+            name=name,
+            requests_per_minute=setting("rpm"),
+            tokens_per_minute=setting("tpm"),
+            max_concurrency=int(setting("max_concurrency")),
+            min_concurrency=int(setting("min_concurrency")),
+            latency_target=setting("latency_target"),
+            interactive_reserve=float(os.getenv("rate_limit_interactive_reserve", "0.25")),
+            enabled=os.getenv("rate_limit_enabled", "true").lower() == "true"
+        )
+
+    def _slots(self, priority: str) -> int:
+        limit = max(int(self.limit), self.min_concurrency)
+        if priority == "interactive":
+            return limit
+        return max(limit - int(limit * self.interactive_reserve), 1)
+
+    def _try_grant(self, entry, now: float) -> Optional[float]:
+        """Called under the lock. Returns None when granted, else how long the head should wait."""
+        waiter = entry[2]
+        if self._queue[0] is not entry or self.in_flight >= self._slots(waiter.priority):
+            return 0.5
+        wait = self.paused_until - now
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(waiter.tokens, now))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._queue)
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(waiter.tokens)
+        self.in_flight += 1
+        return None
+
+    def _granted(self, waiter: _Waiter, now: float) -> Permit:
+        waited = now - waiter.enqueued
+        self.granted[waiter.priority] += 1
+        self.wait_seconds[waiter.priority] += waited
+        self.recent_waits[waiter.priority].append(waited)
+        # The next waiter may be able to go too
+        self._notify()
+        return Permit(self, waiter.priority, waiter.tokens, waited)
+
+    def _abandon(self, entry):
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        self.timeouts += 1
+        self._notify()
+
+    def _notify(self):
+        self._cond.notify_all()
+        for _, _, waiter in self._queue:
+            waiter.wake()
+
+    def acquire(self, tokens: float = 1, priority: str = None, timeout: float = None) -> Permit:
+        """Block until the call may start. Raises QueueTimeout if that takes longer than timeout."""
+        priority = priority or current_priority()
+        waiter = _Waiter(priority, tokens)
+        if not self.enabled:
+            return Permit(self, priority, tokens, 0.0)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            entry = (PRIORITIES[priority], next(self._seq), waiter)
+            heapq.heappush(self._queue, entry)
+            while True:
+                now = time.monotonic()
+                wait = self._try_grant(entry, now)
+                if wait is None:
+                    return self._granted(waiter, now)
+                if deadline is not None:
+                    if now >= deadline:
+                        self._abandon(entry)
+                        raise QueueTimeout(f"{self.name}: no {priority} slot within {timeout}s")
+                    wait = min(wait, deadline - now)
+                self._cond.wait(wait)
+
+    async def aacquire(self, tokens: float = 1, priority: str = None, timeout: float = None) -> Permit:
+        """acquire() for coroutines; waits on an asyncio.Event instead of blocking the loop."""
+        priority = priority or current_priority()
+        waiter = _Waiter(priority, tokens, loop=asyncio.get_running_loop())
+        if not self.enabled:
+            return Permit(self, priority, tokens, 0.0)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            entry = (PRIORITIES[priority], next(self._seq), waiter)
+            heapq.heappush(self._queue, entry)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._try_grant(entry, now)
+                    if wait is None:
+                        return self._granted(waiter, now)
+                    if deadline is not None:
+                        if now >= deadline:
+                            self._abandon(entry)
+                            raise QueueTimeout(f"{self.name}: no {priority} slot within {timeout}s")
+                        wait = min(wait, deadline - now)
+                    waiter.event.clear()
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._cond:
+                if entry in self._queue:
+                    self._abandon(entry)
+            raise
+
+    def charge(self, requests: int = 0, tokens: float = 0.0):
+        if not self.enabled:
+            return
+        with self._cond:
+            if requests and self.requests is not None:
+                self.requests.take(requests)
+            if tokens and self.tokens is not None:
+                self.tokens.take(tokens)
+
+    def release(self, permit: Permit, error: Exception = None):
+        if permit.released or not self.enabled:
+            return
+        permit.released = True
+        error = error or permit.error
+        now = time.monotonic()
+        latency = now - permit.started
+        with self._cond:
+            self.in_flight -= 1
+            if error is not None and (getattr(error, "status_code", None) == 429 or "ratelimit" in type(error).__name__.lower()):
+                permit.throttled()
+            if permit.throttle_count:
+                self.throttled += permit.throttle_count
+                self._decrease(now, 0.5)
+                # Everyone holds off for Retry-After (or a second), not just the caller that was told
+                self.paused_until = max(self.paused_until, now + (permit.retry_after or 1.0))
+            elif error is not None:
+                self.errors += 1
+            elif self.latency_target and latency > self.latency_target:
+                self._decrease(now, 0.9)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            self._notify()
+
+    def _decrease(self, now: float, factor: float):
+        # One cut per second: a burst of 429s from the same window is a single congestion signal
+        if now - self.last_decrease < 1.0:
+            return
+        self.last_decrease = now
+        previous = int(self.limit)
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+        if int(self.limit) != previous:
+            logging.warning(f"{self.name} concurrency limit lowered to {int(self.limit)}")
+
+    def stats(self) -> Dict:
+        with self._cond:
+            now = time.monotonic()
+            queued = {name: 0 for name in PRIORITIES}
+            oldest = {name: 0.0 for name in PRIORITIES}
+            for _, _, waiter in self._queue:
+                queued[waiter.priority] += 1
+                oldest[waiter.priority] = max(oldest[waiter.priority], now - waiter.enqueued)
+            classes = {}
+            for name in PRIORITIES:
+                waits = sorted(self.recent_waits[name])
+                classes[name] = {
+                    "queued": queued[name],
+                    "oldest_wait": round(oldest[name], 3),
+                    "granted": self.granted[name],
+                    "avg_wait": round(self.wait_seconds[name] / self.granted[name], 4) if self.granted[name] else 0.0,
+                    "p95_wait": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0
+                }
+            return {
+                "enabled": self.enabled,
+                "limit": int(max(self.limit, self.min_concurrency)),
+                "in_flight": self.in_flight,
+                "queue_depth": len(self._queue),
+                "paused_for": round(max(self.paused_until - now, 0.0), 3),
+                "requests_available": round(self.requests.level, 1) if self.requests is not None else None,
+                "tokens_available": round(self.tokens.level, 1) if self.tokens is not None else None,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "classes": classes
+            }
+
+_schedulers: Dict[str, UpstreamScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+def scheduler(name: str) -> UpstreamScheduler:
+    """The process-wide scheduler of an upstream, so every caller shares its limits."""
+    with _schedulers_lock:
+        instance = _schedulers.get(name)
+        if instance is None:
+            instance = _schedulers[name] = UpstreamScheduler.from_env(name)
+        return instance
+
+def scheduler_stats() -> Dict:
+    with _schedulers_lock:
+        instances = dict(_schedulers)
+    return {name: instance.stats() for name, instance in instances.items()}
+
+__all__ = ['PRIORITIES', 'Permit', 'QueueTimeout', 'TokenBucket', 'UpstreamScheduler', 'current_priority',
+           'request_priority', 'scheduler', 'scheduler_stats']
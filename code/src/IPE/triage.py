@@ -0,0 +1,49 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from langchainActions.bulk_triage import BulkTriage
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Headless bulk triage: query, analyze and search KB articles for many incidents, "
+                    "writing one JSON line per incident as it completes."
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("input", nargs="?", help="file with incident numbers, '-' for stdin")
+    source.add_argument("--query", help="ServiceNow encoded query selecting the incidents, e.g. active=true^state=1")
+    parser.add_argument("--limit", type=int, default=None, help="maximum incidents to take from --query")
+    parser.add_argument("--workers", type=int, default=8, help="incidents analyzed concurrently")
+    parser.add_argument("--chunk-size", type=int, default=100, help="incidents fetched per numberIN request")
+    parser.add_argument("--no-kb", action="store_true", help="skip the KB article search")
+    parser.add_argument("--output", "-o", default="-", help="JSONL output file, '-' for stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    triage = BulkTriage(workers=args.workers, chunk_size=args.chunk_size, search_kb=not args.no_kb)
+    numbers = None
+    if args.input:
+        stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+        with stream:
+            numbers = triage.parse_numbers(stream)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    started = time.perf_counter()
+    counts = {}
+    try:
+        for result in triage.run(numbers=numbers, query=args.query, limit=args.limit):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    print(f"Triaged {sum(counts.values())} incidents in {elapsed:.1f}s: {counts}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+INCIDENT_TABLE = "incident"
+KB_TABLE = "kb_template_known_error_article"
+
+# (system, symptom, cause, workaround) used to build incidents and the known errors that match them
+TOPICS = [
+    ("VPN", "connection drops every few minutes", "idle timeout on the concentrator", "raise the client keepalive"),
+    ("File share", "access denied for team folder", "stale ACL after group change", "re-apply the folder ACL"),
+    ("Email", "not syncing on mobile", "expired device certificate", "re-enrol the device"),
+    ("Printer", "offline on floor three", "print spooler hung", "restart the spooler service"),
+    ("Password", "reset link expired", "token lifetime too short", "issue a new reset token"),
+    ("Database", "queries timing out", "connection pool exhausted", "increase the pool size"),
+    ("SSO", "login loop in browser", "clock skew on the IdP", "resync the IdP clock"),
+    ("Laptop", "docking station not detected", "outdated firmware", "update the dock firmware"),
+    ("Teams", "calls drop after joining", "UDP ports blocked", "open the media port range"),
+    ("SAP", "report export fails", "spool size limit", "raise the spool limit")
+]
+
+def build_dataset(incidents: int = 500, kb_articles: int = 200, seed: int = 7) -> Dict[str, List[Dict]]:
+    """Deterministic incident and known error records; every incident has matching KB articles."""
+    rng = random.Random(seed)
+    records = {INCIDENT_TABLE: [], KB_TABLE: []}
+    for index in range(incidents):
+        system, symptom, _, _ = TOPICS[index % len(TOPICS)]
+        records[INCIDENT_TABLE].append({
+            "sys_id": f"inc{index:08x}",
+            "number": f"INC{index + 1:07d}",
+            "short_description": f"{system} {symptom}",
+            "description": f"User reports that {system.lower()} {symptom}. Started {rng.randint(1, 48)} hours ago.",
+            "cmdb_ci": f"{system.lower().replace(' ', '-')}-{rng.randint(1, 20):02d}",
+            "work_notes": rng.choice(["", "Asked user for screenshots", "Escalated to L2", "Checked event logs"]),
+            "active": "true",
+            "sys_updated_on": f"2024-01-{index % 28 + 1:02d} {index % 24:02d}:00:00"
+        })
+    for index in range(kb_articles):
+        system, symptom, cause, workaround = TOPICS[index % len(TOPICS)]
+        records[KB_TABLE].append({
+            "sys_id": f"kb{index:08x}",
+            "number": f"KB{index + 1:07d}",
+            "short_description": f"{system} {symptom}" if index < len(TOPICS) else f"{system} {rng.choice(symptom.split())} issue {index}",
+            "kb_cause": cause,
+            "kb_workaround": workaround,
+            "sys_updated_on": f"2024-01-{index % 28 + 1:02d} {index % 24:02d}:00:00"
+        })
+    return records
+
+def _matches(record: Dict, condition: str) -> bool:
+    if "LIKE" in condition:
+        field, value = condition.split("LIKE", 1)
+        return value.lower() in str(record.get(field, "")).lower()
+    if condition.startswith("number") and condition[6:8] == "IN":
+        return record.get("number") in condition[8:].split(",")
+    if "=" in condition:
+        field, value = condition.split("=", 1)
+        return str(record.get(field, "")) == value
+    return True
+
+def run_query(records: List[Dict], query: str) -> List[Dict]:
+    """The subset of the encoded query syntax the pipeline sends: =, IN, LIKE, ^, ^OR and ORDERBY."""
+    order_by = None
+    groups = [[]]
+    for term in filter(None, (query or "").split("^")):
+        if term.startswith("ORDERBY"):
+            order_by = term[len("ORDERBY"):]
+        elif term.startswith("OR") and groups[-1]:
+            groups[-1].append(term[2:])
+        else:
+            groups.append([term])
+    groups = [group for group in groups if group]
+    matched = [record for record in records if all(any(_matches(record, c) for c in group) for group in groups)]
+    if order_by:
+        matched.sort(key=lambda record: str(record.get(order_by, "")))
+    return matched
+
+class FakeServiceNow:
+    """
+    Local stand-in for the ServiceNow table API. Every response is delayed by latency seconds plus
+    up to jitter seconds; calls are counted per table so a run can report its upstream traffic.
+    """
+
+    def __init__(self, incidents: int = 500, kb_articles: int = 200, latency: float = 0.05, jitter: float = 0.02,
+                 seed: int = 7, host: str = "127.0.0.1", port: int = 0):
+        self.records = build_dataset(incidents, kb_articles, seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/now/table"
+
+    def url(self, table: str) -> str:
+        return f"{self.base_url}/{table}"
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(self.latency + self._rng.uniform(-self.jitter, self.jitter), 0.0)
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def call_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.calls)
+
+    def respond(self, table: str, params: Dict[str, str]) -> Dict:
+        matched = run_query(self.records[table], params.get("sysparm_query", ""))
+        offset = int(params.get("sysparm_offset", "0"))
+        limit = int(params.get("sysparm_limit", "10000"))
+        page = matched[offset:offset + limit]
+        fields = [field for field in params.get("sysparm_fields", "").split(",") if field]
+        if fields:
+            page = [{field: record.get(field, "") for field in fields} for record in page]
+        return {"result": page}
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                table = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+                with service._lock:
+                    service.calls[table] += 1
+                time.sleep(service.delay())
+                if table not in service.records:
+                    self.reply(404, {"error": {"message": f"Invalid table {table}"}})
+                    return
+                params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                self.reply(200, service.respond(table, params))
+
+            def reply(self, status: int, payload: Dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The losing copy of a hedged read is cancelled before it is answered
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeServiceNow":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-servicenow", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+__all__ = ['FakeServiceNow', 'INCIDENT_TABLE', 'KB_TABLE', 'TOPICS', 'build_dataset', 'run_query']
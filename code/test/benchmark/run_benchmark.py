@@ -0,0 +1,293 @@
+"""
+Offline benchmark of the chat pipeline: a local fake ServiceNow, the fake chat model and
+WorkflowManager.invoke_chain driven by a fixed number of concurrent users.
+
+    python code/test/benchmark/run_benchmark.py --requests 200 --concurrency 8
+    python code/test/benchmark/run_benchmark.py --compare latest
+
+Each run is saved under results/ as JSON; --compare reports the change against an earlier run
+and exits with status 1 when p95 latency or throughput regressed by more than --max-regression.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from fake_servicenow import INCIDENT_TABLE, KB_TABLE, TOPICS, FakeServiceNow
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+IPE_DIR = BENCHMARK_DIR.parent.parent / "src" / "IPE"
+RESULTS_DIR = BENCHMARK_DIR / "results"
+
+CHAT_INPUTS = ["hello", "thanks for the help", "what can you do", "good morning"]
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark WorkflowManager.invoke_chain against local stand-ins")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests")
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent users")
+    parser.add_argument("--mix", default="incident=0.7,kb=0.2,chat=0.1", help="share of each request kind")
+    parser.add_argument("--incidents", type=int, default=500, help="incidents in the fake ServiceNow")
+    parser.add_argument("--kb-articles", type=int, default=200, help="known error articles in the fake ServiceNow")
+    parser.add_argument("--snow-latency", type=float, default=0.05, help="seconds per ServiceNow response")
+    parser.add_argument("--snow-jitter", type=float, default=0.02, help="uniform +/- jitter on that latency")
+    parser.add_argument("--tokens-per-second", type=float, default=None,
+                        help="fake model token rate for every tier (default: the tier's own rate)")
+    parser.add_argument("--first-token-latency", type=float, default=None, help="fake model time to first token")
+    parser.add_argument("--workflow", choices=["sync", "async"], default="sync")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--label", default="", help="free text stored with the result, e.g. the change under test")
+    parser.add_argument("--output", default=str(RESULTS_DIR), help="directory the result JSON is written to")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare with, or 'latest'")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed relative p95/throughput regression before exiting with status 1")
+    return parser.parse_args(argv)
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    shares = {}
+    for part in mix.split(","):
+        kind, _, share = part.partition("=")
+        if kind.strip() not in ("incident", "kb", "chat"):
+            raise ValueError(f"Unknown request kind in --mix: {kind}")
+        shares[kind.strip()] = float(share)
+    total = sum(shares.values())
+    return {kind: share / total for kind, share in shares.items()}
+
+def configure_environment(args: argparse.Namespace, snow: FakeServiceNow, state_dir: str):
+    """Point the pipeline at the stand-ins; persistent caches go to a per-run directory."""
+    os.environ.update({
+        "incident_url": snow.url(INCIDENT_TABLE),
+        "kb_url": snow.url(KB_TABLE),
+        "llm_backend": "fake",
+        "async_workflow": "true" if args.workflow == "async" else "false",
+        "incident_watcher_enabled": "false",
+        "kb_index_path": os.path.join(state_dir, "kb_index.json.gz"),
+        "kb_semantic_dir": os.path.join(state_dir, "kb_semantic"),
+        "analysis_cache_dir": os.path.join(state_dir, "analysis_cache"),
+        "result_store_path": os.path.join(state_dir, "results.db"),
+        "metrics_port": "0"
+    })
+    os.environ.setdefault("groq_api_key", "benchmark")
+    for tier in ("fast", "large"):
+        if args.tokens_per_second is not None:
+            os.environ[f"fake_{tier}_tokens_per_second"] = str(args.tokens_per_second)
+        if args.first_token_latency is not None:
+            os.environ[f"fake_{tier}_first_token_latency"] = str(args.first_token_latency)
+
+def build_workload(args: argparse.Namespace, count: int, rng: random.Random) -> List[tuple]:
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    workload = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "incident":
+            text = f"INC{rng.randint(1, args.incidents):07d}"
+        elif kind == "kb":
+            system, symptom, _, _ = rng.choice(TOPICS)
+            text = f"search the knowledge base for {system.lower()} {symptom.split()[0]}"
+        else:
+            text = rng.choice(CHAT_INPUTS)
+        workload.append((kind, text))
+    return workload
+
+def outcome(response: str, manager) -> str:
+    if response == manager.OUT_OF_TIME:
+        return "timeout"
+    if not response or response.startswith(("I encountered an error", "Error")) or "Error processing incident" in response:
+        return "error"
+    # A stage that ran out of time still answers with what the earlier stages found
+    if any(message in response for message in manager.TIMEOUT_MESSAGES.values()):
+        return "partial"
+    return "ok"
+
+def percentile(values: List[float], share: float) -> float:
+    """Linear interpolation between closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * share
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(latencies: List[float]) -> Dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0
+    }
+
+def llm_counters(router) -> Dict:
+    stats = router.stats()
+    return {
+        "task_calls": stats["task_calls"],
+        "tier_calls": {name: tier["calls"] for name, tier in stats["tiers"].items()},
+        "tokens": {name: tier["tokens"] for name, tier in stats["tiers"].items()},
+        "fallbacks": stats["fallbacks"]
+    }
+
+def counter_delta(after: Dict, before: Dict) -> Dict:
+    delta = {}
+    for key, value in after.items():
+        if isinstance(value, dict):
+            delta[key] = counter_delta(value, before.get(key, {}))
+        else:
+            delta[key] = value - before.get(key, 0)
+    return delta
+
+def run_requests(manager, workload: List[tuple], concurrency: int) -> List[Dict]:
+    samples = []
+    lock = threading.Lock()
+
+    def send(item):
+        kind, text = item
+        started = time.perf_counter()
+        try:
+            response = manager.invoke_chain(text)
+            result = outcome(response, manager)
+        except Exception as e:
+            logging.error(f"Benchmark request failed: {str(e)}")
+            result = "error"
+        sample = {"kind": kind, "seconds": time.perf_counter() - started, "outcome": result}
+        with lock:
+            samples.append(sample)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-user") as pool:
+        list(pool.map(send, workload))
+    return samples
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def run(args: argparse.Namespace) -> Dict:
+    rng = random.Random(args.seed)
+    snow = FakeServiceNow(incidents=args.incidents, kb_articles=args.kb_articles, latency=args.snow_latency,
+                          jitter=args.snow_jitter, seed=args.seed).start()
+    with tempfile.TemporaryDirectory(prefix="ipe-bench-") as state_dir:
+        configure_environment(args, snow, state_dir)
+        sys.path.insert(0, str(IPE_DIR))
+        # Imported after the environment is set: the pipeline reads its configuration at construction
+        from createModels.model_router import ModelRouter
+        from langchainActions.servicenow_tools import WorkflowManager
+        from langchainActions.async_servicenow_tools import AsyncWorkflowManager
+
+        manager = (AsyncWorkflowManager if args.workflow == "async" else WorkflowManager)().warm_up()
+        router = ModelRouter.shared()
+        if args.warmup:
+            run_requests(manager, build_workload(args, args.warmup, rng), args.concurrency)
+
+        snow.reset_counts()
+        llm_before = llm_counters(router)
+        workload = build_workload(args, args.requests, rng)
+        started = time.perf_counter()
+        samples = run_requests(manager, workload, args.concurrency)
+        wall = time.perf_counter() - started
+        llm_after = llm_counters(router)
+        cache_stats = manager.snow_tools.cache_stats()
+    snow.stop()
+
+    latencies = [sample["seconds"] for sample in samples]
+    outcomes = {}
+    for sample in samples:
+        outcomes[sample["outcome"]] = outcomes.get(sample["outcome"], 0) + 1
+    snow_calls = snow.call_counts()
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "latency": latency_summary(latencies),
+        "latency_by_kind": {kind: latency_summary([s["seconds"] for s in samples if s["kind"] == kind])
+                            for kind in sorted({s["kind"] for s in samples})},
+        "outcomes": outcomes,
+        "upstream": {
+            "servicenow": {**snow_calls, "total": sum(snow_calls.values())},
+            "servicenow_per_request": round(sum(snow_calls.values()) / len(samples), 3) if samples else 0.0,
+            "llm": counter_delta(llm_after, llm_before)
+        },
+        "caches": cache_stats
+    }
+
+def save(result: Dict, directory: str) -> Path:
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    stamp = result["timestamp"].replace(":", "").replace("-", "").replace("+0000", "Z")
+    target = path / f"{stamp}_{result['commit']}.json"
+    target.write_text(json.dumps(result, indent=2))
+    return target
+
+def latest_result(directory: str, exclude: Path = None) -> Path:
+    candidates = sorted(p for p in Path(directory).glob("*.json") if p != exclude)
+    return candidates[-1] if candidates else None
+
+def compare(result: Dict, baseline: Dict, max_regression: float) -> bool:
+    """Print the change against the baseline; False when p95 or throughput regressed beyond the limit."""
+    rows = [
+        ("p50_ms", baseline["latency"]["p50_ms"], result["latency"]["p50_ms"], False),
+        ("p95_ms", baseline["latency"]["p95_ms"], result["latency"]["p95_ms"], True),
+        ("p99_ms", baseline["latency"]["p99_ms"], result["latency"]["p99_ms"], False),
+        ("throughput_rps", baseline["throughput_rps"], result["throughput_rps"], True),
+        ("servicenow_calls", baseline["upstream"]["servicenow"]["total"], result["upstream"]["servicenow"]["total"], False)
+    ]
+    passed = True
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}) {baseline.get('label', '')}")
+    for name, before, after, gated in rows:
+        change = (after - before) / before if before else 0.0
+        worse = change < -max_regression if name == "throughput_rps" else change > max_regression
+        flag = "  REGRESSION" if gated and worse else ""
+        passed = passed and not (gated and worse)
+        print(f"  {name:<18} {before:>10} -> {after:>10}  ({change:+.1%}){flag}")
+    return passed
+
+def report(result: Dict):
+    latency = result["latency"]
+    print(f"{result['config']['requests']} requests, concurrency {result['config']['concurrency']}, "
+          f"{result['config']['workflow']} workflow, commit {result['commit']}")
+    print(f"  latency   p50 {latency['p50_ms']} ms  p95 {latency['p95_ms']} ms  p99 {latency['p99_ms']} ms  "
+          f"max {latency['max_ms']} ms")
+    print(f"  throughput {result['throughput_rps']} req/s over {result['wall_seconds']} s")
+    for kind, summary in result["latency_by_kind"].items():
+        print(f"  {kind:<9} n={summary['count']:<5} p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms")
+    print(f"  outcomes  {result['outcomes']}")
+    print(f"  ServiceNow calls {result['upstream']['servicenow']}")
+    print(f"  LLM calls {result['upstream']['llm']['task_calls']}  tokens {result['upstream']['llm']['tokens']}")
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    result = run(args)
+    report(result)
+    path = save(result, args.output)
+    print(f"Saved {path}")
+    if args.compare:
+        baseline_path = latest_result(args.output, exclude=path) if args.compare == "latest" else Path(args.compare)
+        if baseline_path is None:
+            print("No earlier result to compare with")
+            return 0
+        baseline = json.loads(Path(baseline_path).read_text())
+        return 0 if compare(result, baseline, args.max_regression) else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+TEST_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(TEST_DIR.parent / "src" / "IPE"))
+sys.path.insert(0, str(TEST_DIR / "benchmark"))
+
+# The pipeline reads its configuration when it is constructed, so this has to be in place before the first import.
+# Everything runs offline: the fake LLM backend and a ServiceNow stub behind the HTTP sessions.
+SNOW_BASE = "https://snow.test/api/now/table"
+os.environ.update({
+    "groq_api_key": "test",
+    "llm_backend": "fake",
+    "incident_url": f"{SNOW_BASE}/incident",
+    "kb_url": f"{SNOW_BASE}/kb_template_known_error_article",
+    "kb_index_enabled": "false",
+    "result_store_enabled": "false",
+    "speculation_enabled": "false",
+    "incident_watcher_enabled": "false",
+    "metrics_port": "0",
+    "snow_max_retries": "0",
+    "snow_hedge_enabled": "false",
+    "fake_fast_tokens_per_second": "20000",
+    "fake_fast_first_token_latency": "0",
+    "fake_large_tokens_per_second": "20000",
+    "fake_large_first_token_latency": "0"
+})
+
+from fake_servicenow import INCIDENT_TABLE, KB_TABLE, build_dataset, run_query
+
+class ServiceNowStub:
+    """
+    The table API answered in process from the benchmark dataset, installed in place of the HTTP
+    session of a ServiceNowAPI (requests) or AsyncServiceNowAPI (httpx), or served over local HTTP
+    by serve() so the session's own retries and connection pool are exercised. Every answer takes
+    latency seconds; set down to answer 503, or queue (status, Retry-After) pairs on failures to
+    answer the next calls with them.
+    """
+
+    def __init__(self, incidents: int = 20, kb_articles: int = 20):
+        self.records = build_dataset(incidents, kb_articles)
+        self.latency = 0.0
+        self.down = False
+        self.failures = deque()
+        self.calls = Counter()
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def incident(self, number: str) -> Dict:
+        return next(record for record in self.records[INCIDENT_TABLE] if record["number"] == number)
+
+    def respond(self, url: str) -> Tuple[int, Dict, Dict]:
+        parts = urlsplit(url)
+        table = parts.path.rstrip("/").rsplit("/", 1)[-1]
+        params = dict(parse_qsl(parts.query))
+        with self._lock:
+            self.calls[table] += 1
+            self.queries.append((table, params.get("sysparm_query", "")))
+        if self.down:
+            return 503, {"error": {"message": "Service unavailable"}}, {}
+        with self._lock:
+            failure = self.failures.popleft() if self.failures else None
+        if failure is not None:
+            status, retry_after = failure
+            return status, {"error": {"message": "Try again later"}}, {"Retry-After": retry_after} if retry_after else {}
+        if table not in self.records:
+            return 404, {"error": {"message": f"Invalid table {table}"}}, {}
+        matched = run_query(self.records[table], params.get("sysparm_query", ""))
+        offset = int(params.get("sysparm_offset", "0"))
+        page = matched[offset:offset + int(params.get("sysparm_limit", "10000"))]
+        fields = [field for field in params.get("sysparm_fields", "").split(",") if field]
+        if fields:
+            page = [{field: record.get(field, "") for field in fields} for record in page]
+        return 200, {"result": page}, {}
+
+    def install(self, api):
+        """Route every read of api to this stub."""
+        if hasattr(api, "_client"):
+            async def handle(request: httpx.Request) -> httpx.Response:
+                read_timeout = request.extensions.get("timeout", {}).get("read")
+                if read_timeout is not None and self.latency > read_timeout:
+                    await asyncio.sleep(read_timeout)
+                    raise httpx.ReadTimeout(f"Read timed out after {read_timeout:.2f}s", request=request)
+                await asyncio.sleep(self.latency)
+                status, body, headers = self.respond(str(request.url))
+                return httpx.Response(status, json=body, headers=headers)
+            api._client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        else:
+            adapter = _StubAdapter(self)
+            api.session.mount("https://", adapter)
+            api.session.mount("http://", adapter)
+        return api
+
+    def serve(self) -> ThreadingHTTPServer:
+        """Answer on a local port; the base URL is http://127.0.0.1:<server_port>/api/now/table."""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so the client's connection pool is reused
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(stub.latency)
+                status, body, headers = stub.respond(self.path)
+                content = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, args=(0.05,), name="snow-stub", daemon=True).start()
+        return server
+
+class _StubAdapter(BaseAdapter):
+    def __init__(self, stub: ServiceNowStub):
+        super().__init__()
+        self.stub = stub
+
+    def send(self, request, timeout=None, **kwargs):
+        # A slow answer is cut off at the read timeout, as a real connection would be
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read_timeout is not None and self.stub.latency > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(f"Read timed out after {read_timeout:.2f}s", request=request)
+        time.sleep(self.stub.latency)
+        status, body, headers = self.stub.respond(request.url)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.headers.update(headers)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def snow() -> ServiceNowStub:
+    return ServiceNowStub()
+
+@pytest.fixture
+def snow_url(snow):
+    """Base table API URL of the stub served over local HTTP."""
+    server = snow.serve()
+    yield f"http://127.0.0.1:{server.server_port}/api/now/table"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def workflow(snow):
+    from langchainActions.servicenow_tools import WorkflowManager
+    manager = WorkflowManager()
+    snow.install(manager.snow_tools.snow_api)
+    yield manager
+    if manager.watcher is not None:
+        manager.watcher.stop()
+
+@pytest.fixture
+def async_workflow(snow):
+    from langchainActions.async_servicenow_tools import AsyncWorkflowManager
+    manager = AsyncWorkflowManager()
+    snow.install(manager.snow_tools.snow_api)
+    yield manager
+    if manager.watcher is not None:
+        manager.watcher.stop()
+
+@pytest.fixture
+def slow_llm():
+    """slow_llm(tier, first_token_latency) makes the fake model of a tier that slow for one test."""
+    from createModels.model_router import ModelRouter
+    router = ModelRouter.shared()
+    saved = {name: tier.fake_first_token_latency for name, tier in router.tiers.items()}
+
+    def slow(tier: str, first_token_latency: float):
+        router.tiers[tier].fake_first_token_latency = first_token_latency
+        router._fake_clients.clear()
+
+    yield slow
+    for name, latency in saved.items():
+        router.tiers[name].fake_first_token_latency = latency
+        # A timed out call may have degraded the tier for the next test
+        router.tiers[name].degraded_until = 0.0
+    router._fake_clients.clear()
@@ -0,0 +1,67 @@
+from langchainActions.analysis_cache import AnalysisCache, DiskAnalysisBackend, MemoryAnalysisBackend
+from pipelineRuntime.deadline import request_deadline
+
+DETAILS = "Incident details found: Short Description: VPN drops\nDescription: every few minutes"
+
+def test_key_ignores_whitespace_but_not_model_or_temperature():
+    cache = AnalysisCache(model_name="large", temperature=0.0)
+    assert cache.make_key(DETAILS) == cache.make_key(DETAILS.replace("\n", "   ") + "  ")
+    assert cache.make_key(DETAILS) != AnalysisCache(model_name="fast").make_key(DETAILS)
+    assert cache.make_key(DETAILS) != AnalysisCache(model_name="large", temperature=0.5, cache_sampled=True).make_key(DETAILS)
+
+def test_sampled_answers_are_not_cached_unless_asked():
+    cache = AnalysisCache(model_name="large", temperature=0.7)
+    cache.put(DETAILS, "analysis")
+    assert cache.get(DETAILS) is None
+    assert cache.stats()["bypassed"] == 1
+    deterministic = AnalysisCache(model_name="large", temperature=0.7, deterministic=True)
+    deterministic.put(DETAILS, "analysis")
+    assert deterministic.get(DETAILS) == "analysis"
+
+def test_memory_backend_is_bounded():
+    backend = MemoryAnalysisBackend(max_entries=2)
+    for key in "abc":
+        backend.set(key, key)
+    assert backend.get("a") is None and len(backend) == 2
+
+def test_disk_backend_round_trip(tmp_path):
+    cache = AnalysisCache(backend=DiskAnalysisBackend(str(tmp_path)), model_name="large")
+    cache.put(DETAILS, "analysis")
+    reopened = AnalysisCache(backend=DiskAnalysisBackend(str(tmp_path)), model_name="large")
+    assert reopened.get(DETAILS) == "analysis"
+
+def test_repeated_analysis_is_served_from_the_cache(workflow):
+    tools = workflow.snow_tools
+    tools.analysis_cache = AnalysisCache(model_name=tools.analysis_cache.model_name, deterministic=True)
+    tools.analysis_llm = tools.analyzer.llm.bind(temperature=0)
+    calls = tools.analyzer.llm.router.task_calls.get("analyze", 0)
+    first = tools.analyze_incident(DETAILS)
+    second = tools.analyze_incident(DETAILS)
+    assert first == second and first.startswith("Analysis complete")
+    assert tools.analyzer.llm.router.task_calls["analyze"] == calls + 1
+    assert tools.analysis_cache.stats()["hits"] == 1
+
+def test_fallback_tier_answers_are_not_cached(workflow, slow_llm):
+    tools = workflow.snow_tools
+    tools.analysis_cache = AnalysisCache(model_name=tools.analysis_cache.model_name, deterministic=True)
+    tools.analysis_llm = tools.analyzer.llm.bind(temperature=0)
+    router = tools.analyzer.llm.router
+    primary = router.tiers[router.profiles[tools.analyzer.llm.task]]
+    saved_timeout = primary.timeout
+    slow_llm(primary.name, 1.0)
+    primary.timeout = 0.05
+    try:
+        with request_deadline(5):
+            assert tools.analyze_incident(DETAILS).startswith("Analysis complete")
+    finally:
+        primary.timeout = saved_timeout
+    assert router.fallbacks >= 1
+    assert tools.analysis_cache.get(DETAILS) is None
+
+def test_default_config_caches_analyses(workflow):
+    tools = workflow.snow_tools
+    assert tools.analysis_cache.deterministic and tools.analysis_cache.enabled
+    calls = tools.analyzer.llm.router.task_calls.get("analyze", 0)
+    assert tools.analyze_incident(DETAILS) == tools.analyze_incident(DETAILS)
+    assert tools.analyzer.llm.router.task_calls["analyze"] == calls + 1
+    assert tools.analysis_cache.stats()["hits"] == 1
@@ -0,0 +1,42 @@
+import pytest
+
+from langchainActions.bulk_triage import BulkTriage
+
+@pytest.fixture(params=["sync", "async"])
+def manager(request, workflow, async_workflow):
+    return workflow if request.param == "sync" else async_workflow
+
+def test_numbers_are_parsed_and_deduplicated():
+    lines = ["INC0000001, inc0000002", "see INC0000001", "nothing here"]
+    assert BulkTriage.parse_numbers(lines) == ["INC0000001", "INC0000002"]
+
+def test_chunks_are_fetched_in_one_request_each(manager, snow):
+    triage = BulkTriage(snow_tools=manager.snow_tools, workers=4, chunk_size=3)
+    numbers = [f"INC{index:07d}" for index in range(1, 8)] + ["INC0009999"]
+    results = {result["incident_number"]: result for result in triage.run(numbers=numbers)}
+    assert len(results) == 8
+    assert results["INC0009999"]["status"] == "not_found"
+    assert all(results[number]["status"] == "ok" and results[number]["kb_articles"] for number in numbers[:-1])
+    assert snow.calls["incident"] == 3
+    # The chunk primed the incident cache, so the chat path does not refetch
+    manager.invoke_chain("INC0000001")
+    assert snow.calls["incident"] == 3
+
+def test_query_pages_through_the_matches(manager, snow):
+    triage = BulkTriage(snow_tools=manager.snow_tools, chunk_size=4, search_kb=False)
+    results = list(triage.run(query="active=true", limit=10))
+    assert len(results) == 10
+    assert all(result["status"] == "ok" and "kb_articles" not in result for result in results)
+
+def test_a_failed_chunk_is_reported_as_errors_not_missing_incidents(manager, snow):
+    snow.down = True
+    triage = BulkTriage(snow_tools=manager.snow_tools, chunk_size=2)
+    results = list(triage.run(numbers=["INC0000001", "INC0000002", "INC0000003"]))
+    assert sorted(result["incident_number"] for result in results) == ["INC0000001", "INC0000002", "INC0000003"]
+    assert all(result["status"] == "error" and "failed" in result["error"] for result in results)
+
+def test_a_failed_page_ends_the_query_with_an_error(manager, snow):
+    snow.down = True
+    results = list(BulkTriage(snow_tools=manager.snow_tools).run(query="active=true"))
+    assert results == [{"status": "error", "error": results[0]["error"]}]
+    assert "Fetching incidents failed" in results[0]["error"]
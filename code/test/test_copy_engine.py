@@ -0,0 +1,119 @@
+import errno
+import os
+
+import pytest
+
+from Other_actions.copy_engine import CopyEngine, CopyVerificationError
+
+CHUNK = 4096
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(os.urandom(CHUNK * 10 + 123))
+    return path
+
+@pytest.fixture
+def engine():
+    return CopyEngine(chunk_size=CHUNK, checkpoint_bytes=CHUNK * 2, progress_interval=0)
+
+def fail_after(monkeypatch, calls: int):
+    """Make the engine raise EIO on the transfer after calls successful ones."""
+    original = CopyEngine._transfer
+    count = {"calls": 0}
+
+    def transfer(self, *args):
+        count["calls"] += 1
+        if count["calls"] > calls:
+            raise OSError(errno.EIO, "injected failure")
+        return original(self, *args)
+
+    monkeypatch.setattr(CopyEngine, "_transfer", transfer)
+
+@pytest.mark.parametrize("zero_copy", [True, False])
+def test_copy_is_identical_and_verified(tmp_path, source, zero_copy):
+    engine = CopyEngine(chunk_size=CHUNK, checkpoint_bytes=CHUNK * 2, zero_copy=zero_copy)
+    destination = tmp_path / "out" / "copy.bin"
+    result = engine.copy(source, destination)
+    assert destination.read_bytes() == source.read_bytes()
+    assert result["verified"] and result["checksum"] == f"sha256:{engine.digest(source)}"
+    assert os.stat(destination).st_mtime_ns == os.stat(source).st_mtime_ns
+    assert not CopyEngine.partial_paths(destination)[0].exists()
+    if not zero_copy:
+        assert result["method"] == "chunked"
+
+def test_interrupted_copy_resumes_from_the_last_checkpoint(tmp_path, source, engine, monkeypatch):
+    destination = tmp_path / "copy.bin"
+    fail_after(monkeypatch, 5)
+    with pytest.raises(OSError):
+        engine.copy(source, destination)
+    partial, state_path = CopyEngine.partial_paths(destination)
+    assert partial.exists() and state_path.exists() and not destination.exists()
+
+    monkeypatch.undo()
+    result = engine.copy(source, destination)
+    assert result["resumed_from"] == CHUNK * 4
+    assert destination.read_bytes() == source.read_bytes()
+    assert not partial.exists() and not state_path.exists()
+
+def test_a_corrupted_partial_resumes_from_the_last_good_checkpoint(tmp_path, source, engine, monkeypatch):
+    destination = tmp_path / "copy.bin"
+    fail_after(monkeypatch, 7)
+    with pytest.raises(OSError):
+        engine.copy(source, destination)
+    monkeypatch.undo()
+    partial, _ = CopyEngine.partial_paths(destination)
+    with open(partial, "r+b") as handle:
+        handle.seek(CHUNK * 3)
+        handle.write(b"\0" * 16)
+    result = engine.copy(source, destination)
+    assert result["resumed_from"] == CHUNK * 2
+    assert destination.read_bytes() == source.read_bytes()
+
+def test_a_changed_source_starts_over(tmp_path, source, engine, monkeypatch):
+    destination = tmp_path / "copy.bin"
+    fail_after(monkeypatch, 5)
+    with pytest.raises(OSError):
+        engine.copy(source, destination)
+    monkeypatch.undo()
+    source.write_bytes(os.urandom(CHUNK * 6))
+    result = engine.copy(source, destination)
+    assert result["resumed_from"] == 0
+    assert destination.read_bytes() == source.read_bytes()
+
+def test_a_checksum_mismatch_discards_the_partial(tmp_path, source, engine, monkeypatch):
+    destination = tmp_path / "copy.bin"
+    monkeypatch.setattr(CopyEngine, "digest", lambda self, path: "0" * 64)
+    with pytest.raises(CopyVerificationError):
+        engine.copy(source, destination)
+    partial, state_path = CopyEngine.partial_paths(destination)
+    assert not destination.exists() and not partial.exists() and not state_path.exists()
+
+def test_checksummed_copies_hash_the_data_as_they_copy_it(tmp_path, source, monkeypatch):
+    engine = CopyEngine(chunk_size=CHUNK)
+    reads = []
+    original = CopyEngine.digest
+    monkeypatch.setattr(CopyEngine, "digest", lambda self, path: reads.append(path) or original(self, path))
+    result = engine.copy(source, tmp_path / "copy.bin")
+    # The copy loop hashed the source; only the written file is read again, to verify it
+    assert result["method"] == "chunked"
+    assert [path.name for path in reads] == [".copy.bin.partial"]
+
+def test_unchecksummed_copies_use_the_kernel(tmp_path, source):
+    engine = CopyEngine(chunk_size=CHUNK, checksum="none")
+    result = engine.copy(source, tmp_path / "copy.bin")
+    assert result["method"] in ("copy_file_range", "sendfile") and result["checksum"] is None
+    assert (tmp_path / "copy.bin").read_bytes() == source.read_bytes()
+
+def test_sendfile_is_linux_only(monkeypatch):
+    import sys
+    monkeypatch.delattr("os.copy_file_range", raising=False)
+    monkeypatch.setattr(sys, "platform", "darwin")
+    assert CopyEngine(checksum="none")._methods() == ["chunked"]
+
+def test_not_a_socket_falls_back_to_the_read_write_loop(tmp_path, source, monkeypatch):
+    monkeypatch.delattr("os.copy_file_range", raising=False)
+    monkeypatch.setattr("os.sendfile", lambda *args: (_ for _ in ()).throw(OSError(errno.ENOTSOCK, "not a socket")))
+    result = CopyEngine(chunk_size=CHUNK, checksum="none").copy(source, tmp_path / "copy.bin")
+    assert result["method"] == "chunked"
+    assert (tmp_path / "copy.bin").read_bytes() == source.read_bytes()
@@ -0,0 +1,44 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from createModels.create_model import LLMModel
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """An empty client registry for each test."""
+    monkeypatch.setattr(LLMModel, "_clients", {})
+    monkeypatch.setattr(LLMModel, "_stats", {"created": 0, "reused": 0})
+
+def test_one_profile_shares_one_client_across_threads():
+    barrier = threading.Barrier(8)
+
+    def get(_):
+        barrier.wait()
+        return LLMModel.get_client("llama3-70b-8192", temperature=0, max_tokens=1024, timeout=30.0, max_retries=1)
+
+    with ThreadPoolExecutor(8) as pool:
+        clients = list(pool.map(get, range(8)))
+    assert all(client is clients[0] for client in clients)
+    stats = LLMModel.registry_stats()
+    assert stats["created"] == 1 and stats["reused"] == 7
+    assert stats["profiles"] == [["llama3-70b-8192", 0.0, 1024, 30.0, 1]]
+
+@pytest.mark.parametrize("other", [
+    {"model_name": "llama-3.1-8b-instant"},
+    {"temperature": 0.7},
+    {"max_tokens": 512},
+    {"timeout": 5.0},
+    {"max_retries": 2}
+])
+def test_each_part_of_the_profile_gives_its_own_client(other):
+    profile = {"model_name": "llama3-70b-8192", "temperature": 0.0, "max_tokens": 1024, "timeout": 30.0, "max_retries": 1}
+    base = LLMModel.get_client(**profile)
+    assert LLMModel.get_client(**{**profile, **other}) is not base
+    assert LLMModel.registry_stats()["created"] == 2
+
+def test_clients_share_one_connection_pool():
+    first = LLMModel.get_client("llama3-70b-8192", temperature=0)
+    second = LLMModel.get_client("llama-3.1-8b-instant", temperature=0)
+    assert first.http_client is second.http_client
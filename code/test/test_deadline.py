@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from run_benchmark import outcome
+
+from pipelineRuntime.deadline import (DeadlineExceeded, clamp_timeout, raise_if_expired, remaining, request_deadline,
+                                      stage_deadline)
+
+def test_no_deadline_outside_a_request():
+    assert remaining() is None
+    with stage_deadline("query") as deadline:
+        assert deadline is None and remaining() is None
+    assert clamp_timeout((3.05, 15)) == (3.05, 15)
+
+def test_stage_budget_is_capped_by_the_request():
+    with request_deadline(1.0):
+        with stage_deadline("analyze", 10.0):
+            assert remaining() <= 1.0
+        with stage_deadline("query", 0.2):
+            assert remaining() <= 0.2
+            assert clamp_timeout((3.05, 15)) == pytest.approx((0.2, 0.2), abs=0.01)
+        assert remaining() > 0.5
+
+def test_errors_after_the_deadline_become_deadline_exceeded():
+    with request_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            raise_if_expired(ConnectionError("read timed out"))
+        with pytest.raises(DeadlineExceeded):
+            clamp_timeout(5.0)
+    # Within the deadline an error is left to the caller
+    raise_if_expired(ConnectionError("refused"))
+
+def test_request_deadline_zero_disables_it():
+    with request_deadline(0) as deadline:
+        assert deadline is None and remaining() is None
+
+@pytest.fixture(params=["sync", "async"])
+def manager(request, workflow, async_workflow):
+    return workflow if request.param == "sync" else async_workflow
+
+def test_slow_analysis_gives_a_partial_answer(manager, slow_llm, monkeypatch):
+    monkeypatch.setenv("deadline_budget_analyze", "0.2")
+    slow_llm("large", 1.0)
+    started = time.monotonic()
+    response = manager.invoke_chain("INC0000005")
+    assert time.monotonic() - started < 1.0
+    assert "Incident details found" in response
+    assert response.endswith(manager.TIMEOUT_MESSAGES["analyze"])
+
+def test_servicenow_slower_than_the_request_deadline(manager, snow, monkeypatch):
+    monkeypatch.setenv("request_deadline", "0.3")
+    snow.latency = 1.0
+    started = time.monotonic()
+    response = manager.invoke_chain("INC0000006")
+    assert time.monotonic() - started < 0.9
+    assert response.endswith(manager.TIMEOUT_MESSAGES["query"])
+    # A partial answer is not an error for bulk triage or the benchmark
+    assert not response.startswith("Error")
+    assert outcome(response, manager) == "partial"
+
+def test_classification_out_of_time_is_not_answered_as_chat(manager, slow_llm, monkeypatch):
+    # Two incident numbers keep the rule tier out, so the LLM classifies
+    monkeypatch.setenv("deadline_budget_classify", "0.05")
+    for tier in ("fast", "large"):
+        slow_llm(tier, 0.5)
+    response = manager.invoke_chain("please look at INC0000001 and INC0000002")
+    assert response == manager.OUT_OF_TIME
+    assert "".join(manager.stream_chain("please look at INC0000001 and INC0000002")) == manager.OUT_OF_TIME
+
+def test_query_out_of_time_is_partial_and_keeps_the_speculative_kb(workflow, snow, monkeypatch):
+    from langchainActions.servicenow_tools import IncidentStatus
+    monkeypatch.setenv("deadline_budget_query", "0.1")
+    snow.latency = 0.5
+    related_kb = "KB articles found:\nKB0000001 - VPN connection drops every few minutes"
+    with request_deadline():
+        state = workflow.get_chain().invoke(workflow.initial_state("INC0000011", related_kb))
+    assert state["status"] == IncidentStatus.PARTIAL
+    assert state["details"] == workflow.TIMEOUT_MESSAGES["query"]
+    assert state["kb_articles"] == [related_kb]
@@ -0,0 +1,69 @@
+import pytest
+
+from Other_actions.copy_engine import CopyEngine
+from Other_actions.file_action import FileCopyTool
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "reports"
+    (root / "2024" / "q1").mkdir(parents=True)
+    (root / "a.txt").write_text("alpha")
+    (root / "b.csv").write_text("1,2,3")
+    (root / "2024" / "q1" / "c.txt").write_text("charlie")
+    # Leftovers of an interrupted copy are never copied as files
+    (root / ".d.txt.partial").write_text("half")
+    return root
+
+@pytest.fixture
+def tool():
+    return FileCopyTool(engine=CopyEngine(chunk_size=4096), workers=2)
+
+def test_folder_copy_keeps_the_layout(tmp_path, tree, tool):
+    result = tool.copy_many(str(tree), str(tmp_path / "backup"))
+    assert result["status"] == "success" and result["copied"] == 3
+    assert (tmp_path / "backup" / "2024" / "q1" / "c.txt").read_text() == "charlie"
+    assert not (tmp_path / "backup" / ".d.txt.partial").exists()
+
+def test_glob_copy(tmp_path, tree, tool):
+    result = tool.copy_many(str(tree / "**" / "*.txt"), str(tmp_path / "texts"))
+    assert result["copied"] == 2
+    assert sorted(p.name for p in (tmp_path / "texts").rglob("*") if p.is_file()) == ["a.txt", "c.txt"]
+
+def test_existing_names_with_glob_characters_are_taken_literally(tmp_path, tool):
+    report = tmp_path / "report[1].txt"
+    report.write_text("first")
+    (tmp_path / "report1.txt").write_text("not me")
+    assert not tool.is_batch(str(report))
+    assert tool.copy_file(str(report), str(tmp_path / "copy.txt"))["status"] == "success"
+    assert (tmp_path / "copy.txt").read_text() == "first"
+    # A folder with brackets in its name is copied as a folder
+    folder = tmp_path / "logs[old]"
+    folder.mkdir()
+    (folder / "app.log").write_text("log")
+    assert tool.copy_many(str(folder), str(tmp_path / "backup"))["copied"] == 1
+    assert (tmp_path / "backup" / "app.log").read_text() == "log"
+    # A pattern that names no existing path is still a glob
+    assert tool.is_batch(str(tmp_path / "report[0-9].txt"))
+
+def test_a_rerun_skips_unchanged_files(tmp_path, tree, tool):
+    tool.copy_many(str(tree), str(tmp_path / "backup"))
+    (tree / "a.txt").write_text("alpha, edited")
+    result = tool.copy_many(str(tree), str(tmp_path / "backup"))
+    assert (result["copied"], result["skipped"]) == (1, 2)
+    assert (tmp_path / "backup" / "a.txt").read_text() == "alpha, edited"
+
+def test_batch_progress_reaches_the_total(tmp_path, tree, tool):
+    updates = []
+    tool.copy_many(str(tree), str(tmp_path / "backup"), progress=updates.append)
+    assert updates[-1].files_done == 3 and updates[-1].fraction == 1.0
+
+def test_no_matches(tmp_path, tool):
+    result = tool.copy_many(str(tmp_path / "*.missing"), str(tmp_path / "out"))
+    assert result["status"] == "failed" and "No files found" in result["message"]
+
+def test_single_file_into_a_folder(tmp_path, tree, tool):
+    (tmp_path / "out").mkdir()
+    result = tool.copy_file(str(tree / "a.txt"), str(tmp_path / "out"))
+    assert result["status"] == "success"
+    assert (tmp_path / "out" / "a.txt").read_text() == "alpha"
+    assert tool.copy_file(str(tree / "missing.txt"), str(tmp_path / "out"))["status"] == "failed"
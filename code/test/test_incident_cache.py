@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from langchainActions.incident_cache import IncidentCache
+
+RECORD = {"number": "INC0000001", "short_description": "VPN drops", "sys_updated_on": "2024-01-01 00:00:00"}
+
+def expire(cache: IncidentCache, number: str):
+    cache._entries[number].fetched_at = float("-inf")
+
+def test_fresh_stale_and_miss():
+    cache = IncidentCache(ttl_seconds=60)
+    assert cache.lookup("INC0000001") == (None, None)
+    cache.put("inc0000001 ", RECORD)
+    entry, state = cache.lookup("INC0000001")
+    assert state == IncidentCache.FRESH and entry.record is RECORD
+    expire(cache, "INC0000001")
+    assert cache.lookup("INC0000001")[1] == IncidentCache.STALE
+
+def test_revalidate_keeps_an_unchanged_record():
+    cache = IncidentCache()
+    cache.put("INC0000001", RECORD)
+    expire(cache, "INC0000001")
+    assert cache.revalidate("INC0000001", RECORD["sys_updated_on"]) is RECORD
+    assert cache.lookup("INC0000001")[1] == IncidentCache.FRESH
+    assert cache.revalidate("INC0000001", "2024-02-01 00:00:00") is None
+    assert cache.stats()["revalidated"] == 1 and cache.stats()["refetched"] == 1
+
+def test_lru_eviction():
+    cache = IncidentCache(max_entries=2)
+    for number in ("INC0000001", "INC0000002"):
+        cache.put(number, dict(RECORD, number=number))
+    cache.lookup("INC0000001")
+    cache.put("INC0000003", dict(RECORD, number="INC0000003"))
+    assert cache.lookup("INC0000002") == (None, None)
+    assert cache.lookup("INC0000001")[0] is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_stale_entry_is_revalidated_with_a_sys_updated_on_probe(workflow, snow):
+    tools = workflow.snow_tools
+    assert tools.fetch_incident_record("INC0000001")["short_description"] == "VPN connection drops every few minutes"
+    assert tools.fetch_incident_record("INC0000001")["short_description"] == "VPN connection drops every few minutes"
+    assert snow.calls["incident"] == 1
+
+    expire(tools.incident_cache, "INC0000001")
+    tools.fetch_incident_record("INC0000001")
+    # Unchanged: only the probe went out
+    assert snow.calls["incident"] == 2
+    assert tools.incident_cache.stats()["revalidated"] == 1
+
+    snow.incident("INC0000001")["sys_updated_on"] = "2024-03-01 00:00:00"
+    snow.incident("INC0000001")["short_description"] = "VPN fixed, reopened"
+    expire(tools.incident_cache, "INC0000001")
+    assert tools.fetch_incident_record("INC0000001")["short_description"] == "VPN fixed, reopened"
+    # Changed: probe and full refetch
+    assert snow.calls["incident"] == 4
+
+@pytest.fixture(params=["sync", "async"])
+def fetch(request, workflow, async_workflow):
+    """fetch(number) through the sync or the async tools' fetch_incident_record."""
+    if request.param == "sync":
+        return workflow.snow_tools, workflow.snow_tools.fetch_incident_record
+    tools = async_workflow.snow_tools
+    return tools, lambda number: tools.loop.run(tools.afetch_incident_record(number))
+
+def test_a_deleted_incident_is_dropped_from_the_cache(fetch, snow):
+    tools, fetch_record = fetch
+    assert fetch_record("INC0000002")
+    snow.records["incident"].remove(snow.incident("INC0000002"))
+    expire(tools.incident_cache, "INC0000002")
+    assert fetch_record("INC0000002") is None
+    assert tools.incident_cache.lookup("INC0000002") == (None, None)
+
+def test_an_unreachable_servicenow_is_bridged_for_the_grace_period_only(fetch, snow):
+    tools, fetch_record = fetch
+    assert fetch_record("INC0000003")
+    snow.down = True
+    # Stale, but within the grace period
+    tools.incident_cache._entries["INC0000003"].fetched_at = time.monotonic() - tools.incident_cache.ttl_seconds - 1
+    assert fetch_record("INC0000003")["short_description"] == snow.incident("INC0000003")["short_description"]
+    expire(tools.incident_cache, "INC0000003")
+    assert fetch_record("INC0000003") is None
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from langchainActions.incident_watcher import IncidentWatcher
+from langchainActions.precomputed_store import PrecomputedStore
+
+@pytest.fixture(params=["sync", "async"])
+def manager(request, workflow, async_workflow):
+    return workflow if request.param == "sync" else async_workflow
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_watcher_precomputes_and_the_chat_serves_it(manager, snow, tmp_path, monkeypatch):
+    monkeypatch.setenv("incident_watcher_state", str(tmp_path / "watcher.json"))
+    monkeypatch.setenv("incident_watcher_interval", "60")
+    watcher = manager.start_watcher()
+    wait_for(lambda: watcher.stats()["processed"] == len(snow.records["incident"]))
+    calls = snow.calls["incident"]
+    response = manager.invoke_chain("INC0000008")
+    assert "Analysis complete:" in response
+    assert snow.calls["incident"] == calls
+    assert manager.precomputed.stats()["hits"] == 1
+
+def test_watermark_survives_a_restart(manager, snow, tmp_path):
+    state = str(tmp_path / "watcher.json")
+    watcher = IncidentWatcher(manager.snow_tools, PrecomputedStore(), query="active=true", state_path=state)
+    assert watcher.poll_once() == len(snow.records["incident"])
+    while not watcher.work.empty():
+        watcher.process(*watcher.work.get())
+    watcher.save_watermark()
+    latest = max(record["sys_updated_on"] for record in snow.records["incident"])
+    assert IncidentWatcher(manager.snow_tools, PrecomputedStore(), state_path=state).watermark == latest
+
+def test_unchanged_incidents_are_not_queued_twice(manager, snow):
+    store = PrecomputedStore()
+    watcher = IncidentWatcher(manager.snow_tools, store, query="active=true")
+    watcher.poll_once()
+    while not watcher.work.empty():
+        watcher.process(*watcher.work.get())
+    watcher.watermark = ""
+    assert watcher.poll_once() == 0
+
+def test_an_incident_updated_after_precompute_is_analyzed_again(manager, snow):
+    watcher = IncidentWatcher(manager.snow_tools, manager.precomputed, query="active=true")
+    watcher.poll_once()
+    while not watcher.work.empty():
+        watcher.process(*watcher.work.get())
+    record = snow.incident("INC0000009")
+    record["short_description"] = "Payroll export fails with a timeout"
+    record["sys_updated_on"] = "2024-02-01 09:00:00"
+    # The chat learns of the change from the incident cache's sys_updated_on probe
+    manager.snow_tools.incident_cache.ttl_seconds = 0
+    response = manager.invoke_chain("INC0000009")
+    assert "Payroll export fails with a timeout" in response
+    assert manager.precomputed.stats()["invalidated"] == 1
+    assert manager.precomputed.get("INC0000009") is None
+    # Unchanged incidents are still served from the store
+    manager.invoke_chain("INC0000010")
+    assert manager.precomputed.stats()["hits"] == 2
+
+def test_a_failed_incident_holds_the_watermark_until_a_retry_succeeds(workflow, snow, monkeypatch):
+    watcher = IncidentWatcher(workflow.snow_tools, PrecomputedStore(), query="active=true", retry_backoff=0)
+    failing = snow.incident("INC0000003")
+    triage = watcher.triage.triage_record
+
+    def flaky(incident_number, record):
+        if incident_number == "INC0000003":
+            return {"incident_number": incident_number, "status": "error", "error": "LLM unavailable"}
+        return triage(incident_number, record)
+
+    monkeypatch.setattr(watcher.triage, "triage_record", flaky)
+    watcher.poll_once()
+    while not watcher.work.empty():
+        watcher.process(*watcher.work.get())
+    watcher.save_watermark()
+    assert watcher.watermark == failing["sys_updated_on"]
+    assert watcher.stats()["failed"] == 1 and watcher.stats()["retrying"] == 1
+    # Polling again does not queue it twice while it waits for its retry
+    watcher.watermark = ""
+    assert watcher.poll_once() == 0
+
+    monkeypatch.setattr(watcher.triage, "triage_record", triage)
+    assert watcher.requeue_retries() == 1
+    watcher.process(*watcher.work.get())
+    watcher.save_watermark()
+    assert watcher.store.has_version("INC0000003", failing["sys_updated_on"])
+    assert watcher.watermark == max(record["sys_updated_on"] for record in snow.records["incident"])
+    assert watcher.stats()["retrying"] == 0
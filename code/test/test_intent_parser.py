@@ -0,0 +1,57 @@
+import pytest
+
+from createModels.intent_parser import IncrementalIntentParser, IntentParseError, parse_intent
+
+INCIDENT_JSON = ('{"action_type": "incident", "incident_number": "INC0000123", "search_keywords": null, '
+                 '"conversation_context": null, "confidence": 0.95}')
+
+def test_strict_json():
+    assert parse_intent(INCIDENT_JSON)["incident_number"] == "INC0000123"
+
+@pytest.mark.parametrize("text", [
+    "```json\n" + INCIDENT_JSON + "\n```",
+    "Here is the analysis: " + INCIDENT_JSON + " Hope that helps.",
+    "{'action_type': 'incident', 'incident_number': 'inc0000123', 'search_keywords': None, 'confidence': 0.95,}",
+    '{"action_type": "incident", "incident_number": "INC0000123", "confidence": 0.95, "conversation_context": "cut'
+])
+def test_common_defects_are_repaired(text):
+    analysis = parse_intent(text)
+    assert analysis["action_type"] == "incident"
+    assert analysis["incident_number"] == "INC0000123"
+
+def test_confidence_is_clamped():
+    assert parse_intent('{"action_type": "conversation", "confidence": 3}')["confidence"] == 1.0
+
+@pytest.mark.parametrize("text", [
+    "no json here",
+    '{"action_type": "delete_everything", "confidence": 1}',
+    '{"action_type": "incident", "incident_number": "12345", "confidence": 0.9}'
+])
+def test_invalid_intents_are_rejected(text):
+    with pytest.raises(IntentParseError):
+        parse_intent(text)
+
+def test_incremental_parser_routes_before_the_completion_ends():
+    parser = IncrementalIntentParser("what about INC0000123 and INC0000456")
+    chunks = ['{"action_type": "inc', 'ident", "incident_', 'number": "INC0000123"', ', "search_keywords": null']
+    results = [parser.feed(chunk) for chunk in chunks]
+    assert results[:2] == [None, None]
+    assert results[2]["incident_number"] == "INC0000123"
+    assert parser.close()["partial"] is True
+
+def test_incremental_parser_never_trusts_a_number_the_user_did_not_type():
+    parser = IncrementalIntentParser("what about INC0000123 and INC0000456")
+    assert parser.feed('{"action_type": "incident", "incident_number": "INC0000999"') is None
+    parser.feed(', "confidence": 0.9}')
+    assert parser.close()["incident_number"] == "INC0000999"
+
+def test_incremental_parser_matches_whole_incident_numbers_only():
+    parser = IncrementalIntentParser("status of INC00001234 please")
+    assert parser.feed('{"action_type": "incident", "incident_number": "INC0000123"') is None
+    assert parser.feed(', "confidence": 0.9}') is None
+
+def test_incremental_parser_waits_for_the_whole_object_on_kb_search():
+    parser = IncrementalIntentParser("look for vpn drops")
+    assert parser.feed('{"action_type": "kb_search", "incident_number": null, "search_keywords": "vpn drops"') is None
+    parser.feed(', "conversation_context": null, "confidence": 0.4}')
+    assert parser.close()["confidence"] == 0.4
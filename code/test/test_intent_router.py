@@ -0,0 +1,60 @@
+import pytest
+
+from createModels.intent_router import IntentRouter
+
+@pytest.fixture
+def router() -> IntentRouter:
+    return IntentRouter(min_confidence=0.85)
+
+@pytest.mark.parametrize("text, number", [
+    ("what is the status of inc0000123", "INC0000123"),
+    ("INC0000123", "INC0000123"),
+    ("please check INC0000123 again, INC0000123 is still open", "INC0000123")
+])
+def test_a_single_incident_number_is_routed_without_the_llm(router, text, number):
+    analysis = router.route(text)
+    assert analysis["action_type"] == "incident"
+    assert analysis["incident_number"] == number
+
+def test_several_incident_numbers_go_to_the_llm(router):
+    assert router.route("compare INC0000001 and INC0000002") is None
+
+@pytest.mark.parametrize("text", ["hi", "Hello there!", "thanks", "good morning team"])
+def test_greetings(router, text):
+    assert router.route(text)["action_type"] == "conversation"
+
+@pytest.mark.parametrize("text", ["hey, find kb on vpn", "hi, search the knowledge base for printer offline"])
+def test_a_greeting_does_not_swallow_a_kb_request(router, text):
+    analysis = router.route(text)
+    assert analysis["action_type"] == "kb_search"
+    assert analysis["search_keywords"] in ("vpn", "printer offline")
+
+def test_kb_search_keywords_are_extracted(router):
+    analysis = router.route("can you search the kb for vpn drops, printer offline")
+    assert analysis["action_type"] == "kb_search"
+    assert analysis["search_keywords"] == "vpn drops, printer offline"
+
+def test_weak_triggers_are_left_to_the_llm(router):
+    assert router.route("how do I fix my printer") is None
+    assert router.classify("how do I fix my printer")["confidence"] < 0.85
+
+def test_empty_input(router):
+    assert router.route("   ") is None
+
+@pytest.mark.parametrize("text", [
+    "search the knowledge base for vpn drops",
+    "can you recheck the keywords like job failed, job error",
+    "look up known errors about printer offline"
+])
+def test_a_search_verb_with_a_kb_noun_is_routed(router, text):
+    assert router.route(text)["action_type"] == "kb_search"
+
+@pytest.mark.parametrize("text", [
+    "why is the KB slow today",
+    "Can you explain what a known error is?",
+    "what does this article say",
+    "search for my lost email"
+])
+def test_a_kb_noun_or_search_verb_alone_is_left_to_the_llm(router, text):
+    assert router.route(text) is None
+    assert router.classify(text)["confidence"] == 0.6
@@ -0,0 +1,114 @@
+import threading
+
+from langchainActions.kb_index import KBIndex, tokenize
+
+def article(number, title, cause="", workaround="", updated_on="2024-01-01 00:00:00"):
+    return {"number": number, "sys_id": number.lower(), "short_description": title, "kb_cause": cause,
+            "kb_workaround": workaround, "sys_updated_on": updated_on}
+
+class FakeTable:
+    """Serves the KB table API the way the sync pages through it."""
+
+    def __init__(self, articles):
+        self.articles = {a["sys_id"]: a for a in articles}
+        self.queries = []
+
+    def __call__(self, params):
+        query = params["sysparm_query"]
+        self.queries.append(query)
+        rows = sorted(self.articles.values(), key=lambda a: a["sys_updated_on"])
+        if query.startswith("sys_updated_on>="):
+            since = query[len("sys_updated_on>="):].split("^")[0]
+            rows = [a for a in rows if a["sys_updated_on"] >= since]
+        offset, limit = int(params["sysparm_offset"]), int(params["sysparm_limit"])
+        return {"result": rows[offset:offset + limit]}
+
+ARTICLES = [
+    article("KB0000001", "VPN connection drops every few minutes", "MTU mismatch", "lower the MTU"),
+    article("KB0000002", "Printer offline after driver update", "spooler crash", "restart the spooler service",
+            "2024-01-02 00:00:00"),
+    article("KB0000003", "Outlook keeps asking for password", "stale token", "clear cached credentials",
+            "2024-01-03 00:00:00"),
+]
+
+def test_tokenize_drops_stop_words_and_single_characters():
+    assert tokenize("The VPN is down on a Mac-book") == ["vpn", "down", "mac", "book"]
+
+def test_title_matches_rank_above_body_matches():
+    index = KBIndex()
+    index.upsert([article("KB0000010", "Disk full on build agent", workaround="clear the vpn cache"),
+                  article("KB0000011", "VPN client will not start")])
+    hits = index.search("vpn")
+    assert [hit["number"] for hit in hits] == ["KB0000011", "KB0000010"]
+    assert hits[0]["score"] > hits[1]["score"]
+    assert index.search("kerberos") == []
+
+def test_incremental_sync_pages_from_the_watermark():
+    table = FakeTable(ARTICLES)
+    index = KBIndex()
+    assert index.sync(table, page_size=2) == 3
+    assert len(index) == 3 and index.watermark == "2024-01-03 00:00:00"
+    assert len(table.queries) == 2
+
+    table.articles["kb0000002"] = article("KB0000002", "Printer jams on tray two", updated_on="2024-01-04 00:00:00")
+    table.queries.clear()
+    index.sync(table)
+    assert table.queries[0].startswith("sys_updated_on>=2024-01-03 00:00:00")
+    assert index.search("printer")[0]["short_description"] == "Printer jams on tray two"
+    assert index.search("spooler") == []
+
+def test_full_sync_drops_removed_articles_and_keeps_serving_until_swapped():
+    index = KBIndex()
+    index.sync(FakeTable(ARTICLES))
+    table = FakeTable(ARTICLES[1:])
+    page_started = threading.Event()
+    release = threading.Event()
+
+    def slow_fetch(params):
+        page_started.set()
+        release.wait(1)
+        return table(params)
+
+    worker = threading.Thread(target=index.sync, args=(slow_fetch,), kwargs={"full": True})
+    worker.start()
+    assert page_started.wait(1)
+    # The live index is untouched while the full sync is still fetching
+    assert index.search("vpn")[0]["number"] == "KB0000001"
+    release.set()
+    worker.join(1)
+    assert index.search("vpn") == []
+    assert len(index) == 2 and index.last_full_sync > 0
+
+def test_failed_full_sync_leaves_the_index_alone():
+    index = KBIndex()
+    index.sync(FakeTable(ARTICLES))
+    assert index.sync(lambda params: None, full=True) == 0
+    assert len(index) == 3 and index.last_full_sync == 0.0
+
+def test_full_sync_is_due_on_its_interval():
+    index = KBIndex(full_sync_interval=60)
+    assert index.full_sync_due()
+    index.sync(FakeTable(ARTICLES), full=True)
+    assert not index.full_sync_due()
+    index.last_full_sync -= 61
+    assert index.full_sync_due()
+    assert not KBIndex(full_sync_interval=0).full_sync_due()
+
+def test_saved_index_reloads_with_the_same_ranking(tmp_path):
+    path = str(tmp_path / "kb_index.json.gz")
+    index = KBIndex(path=path)
+    index.sync(FakeTable(ARTICLES), full=True)
+    index.upsert([article("KB0000001", "VPN tunnel drops on wifi", updated_on="2024-01-05 00:00:00")])
+    index.save()
+
+    reloaded = KBIndex(path=path)
+    assert reloaded.load()
+    assert len(reloaded) == 3
+    assert reloaded.watermark == "2024-01-05 00:00:00"
+    assert reloaded.last_full_sync == index.last_full_sync
+    assert not reloaded.is_stale()
+    for query in ("vpn wifi", "printer spooler", "password"):
+        assert reloaded.search(query) == index.search(query)
+
+def test_load_without_a_file_reports_false(tmp_path):
+    assert not KBIndex(path=str(tmp_path / "missing.json.gz")).load()
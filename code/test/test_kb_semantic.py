@@ -0,0 +1,57 @@
+import numpy as np
+
+from langchainActions.kb_semantic import HashingEmbedder, SemanticKBIndex
+
+ARTICLES = [
+    {"number": "KB0000001", "short_description": "VPN connection drops every few minutes",
+     "kb_cause": "MTU mismatch on the tunnel", "kb_workaround": "lower the MTU to 1400"},
+    {"number": "KB0000002", "short_description": "Printer offline after driver update",
+     "kb_cause": "print spooler crash", "kb_workaround": "restart the spooler service"},
+    {"number": "KB0000003", "short_description": "Outlook keeps asking for password",
+     "kb_cause": "stale cached token", "kb_workaround": "clear cached credentials"},
+]
+
+def test_build_gives_unit_rows_and_search_ranks_the_closest_article():
+    index = SemanticKBIndex(embedder=HashingEmbedder(dim=128))
+    index.build(ARTICLES, source_sync=5.0)
+    assert len(index) == 3 and index.source_sync == 5.0
+    assert index.matrix.shape == (3, 128) and index.matrix.flags["C_CONTIGUOUS"]
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0)
+    assert index.search("vpn keeps dropping")[0]["number"] == "KB0000001"
+    assert index.search("spooler restart", limit=1)[0]["number"] == "KB0000002"
+    assert index.search("") == []
+
+def test_fit_returns_the_idf_instead_of_mutating_the_embedder():
+    embedder = HashingEmbedder(dim=64)
+    matrix, idf = embedder.fit_embed_documents(["vpn drops", "printer offline"])
+    assert matrix.shape == (2, 64) and idf.shape == (64,)
+    assert not hasattr(embedder, "idf")
+
+def test_rebuild_swaps_the_idf_with_the_matrix():
+    index = SemanticKBIndex(embedder=HashingEmbedder(dim=128))
+    index.build(ARTICLES)
+    first_idf = index.idf
+    index.build(ARTICLES[:1])
+    assert index.idf is not first_idf
+    # Scores stay consistent with the matrix they were weighted for
+    hits = index.search("vpn connection drops")
+    assert [hit["number"] for hit in hits] == ["KB0000001"]
+    assert hits[0]["score"] > 0.5
+
+def test_reload_memory_maps_the_matrix(tmp_path):
+    built = SemanticKBIndex(directory=str(tmp_path), embedder=HashingEmbedder(dim=128))
+    built.build(ARTICLES, source_sync=7.0)
+
+    reloaded = SemanticKBIndex(directory=str(tmp_path), embedder=HashingEmbedder(dim=128))
+    assert reloaded.load()
+    assert isinstance(reloaded.matrix, np.memmap)
+    assert reloaded.source_sync == 7.0
+    assert np.array_equal(reloaded.idf, built.idf)
+    for query in ("vpn tunnel", "password prompt", "printer"):
+        assert reloaded.search(query) == built.search(query)
+
+def test_reload_ignores_an_index_from_another_embedder(tmp_path):
+    SemanticKBIndex(directory=str(tmp_path), embedder=HashingEmbedder(dim=128)).build(ARTICLES)
+    other = SemanticKBIndex(directory=str(tmp_path), embedder=HashingEmbedder(dim=64))
+    assert not other.load()
+    assert len(other) == 0
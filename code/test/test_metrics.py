@@ -0,0 +1,69 @@
+import pytest
+
+from pipelineRuntime.metrics import Histogram, MetricsRegistry, REGISTRY, measure, request_trace
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "test", ("step",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, step="a")
+    text = registry.render()
+    assert 'test_seconds_bucket{step="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{step="a",le="1"} 2' in text
+    assert 'test_seconds_bucket{step="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{step="a"} 3' in text
+
+def test_measure_records_the_request_breakdown():
+    histogram = Histogram("test_measure_seconds", "test", ("node",))
+    with request_trace() as trace:
+        with measure(histogram, "classify", node="classify"):
+            pass
+        with measure(histogram, "node:query", node="query") as labels:
+            labels["node"] = "query_done"
+    assert [row["step"] for row in trace.breakdown()] == ["classify", "node:query"]
+    assert 'node="query_done"' in "\n".join(histogram.render())
+
+def test_workflow_requests_are_exported(workflow):
+    workflow.invoke_chain("INC0000007")
+    text = REGISTRY.render()
+    for name in ("ipe_request_seconds", "ipe_graph_node_seconds", "ipe_snow_request_seconds", "ipe_llm_request_seconds"):
+        assert f"{name}_count" in text
+
+class FakeSpan:
+    def __init__(self, spans: list):
+        self.spans = spans
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.spans.append(exc_info)
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_as_current_span(self, name, attributes=None):
+        return FakeSpan(self.spans)
+
+def test_a_failed_block_is_exported_as_an_error(monkeypatch):
+    import pipelineRuntime.metrics as metrics
+    otel = FakeTracer()
+    monkeypatch.setattr(metrics, "tracer", lambda: otel)
+    histogram = Histogram("test_failed_seconds", "test", ("table", "status"))
+    with pytest.raises(TimeoutError):
+        with measure(histogram, "snow:incident", table="incident"):
+            raise TimeoutError("read timed out")
+    with measure(histogram, "snow:incident", table="incident"):
+        pass
+    text = "\n".join(histogram.render())
+    assert 'test_failed_seconds_count{table="incident",status="error"} 1' in text
+    assert 'test_failed_seconds_count{table="incident",status="ok"} 1' in text
+    assert otel.spans[0][0] is TimeoutError and otel.spans[1] == (None, None, None)
+
+def test_a_status_set_by_the_caller_is_kept():
+    histogram = Histogram("test_node_seconds", "test", ("node", "status"))
+    with pytest.raises(ValueError):
+        with measure(histogram, "node:query", node="query", status="exception"):
+            raise ValueError("boom")
+    assert 'status="exception"' in "\n".join(histogram.render())
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from createModels.model_router import ModelRouter, ModelTier
+
+PROMPT = "Analyze these incident details:\nShort Description: VPN drops"
+
+@pytest.fixture
+def router() -> ModelRouter:
+    """A private fake-backend router, so tier health does not leak into other tests."""
+    tiers = {
+        "fast": ModelTier("fast", "fake-fast", timeout=5.0, latency_budget=0.05, fallback="large",
+                          fake_tokens_per_second=100000.0, fake_first_token_latency=0.0),
+        "large": ModelTier("large", "fake-large", timeout=5.0, latency_budget=1.0, fallback="fast",
+                           fake_tokens_per_second=100000.0, fake_first_token_latency=0.0)
+    }
+    return ModelRouter(tiers, backend="fake", cooldown_seconds=30.0, failure_threshold=2, ewma_alpha=0.5)
+
+def slow(router: ModelRouter, tier: str, first_token_latency: float):
+    router.tiers[tier].fake_first_token_latency = first_token_latency
+    router._fake_clients.clear()
+
+def test_latency_is_tracked_as_an_ewma(router):
+    router.record("fast", 0.02, task="classify")
+    router.record("fast", 0.04, task="classify")
+    stats = router.stats()["tiers"]["fast"]
+    assert stats["latency_ewma"] == pytest.approx(0.03)
+    assert stats["calls"] == 2 and not stats["degraded"]
+
+def test_a_tier_over_its_latency_budget_is_degraded_after_five_calls(router):
+    for _ in range(4):
+        router.record("fast", 0.2, task="classify")
+    assert router.tier_order("classify") == ["fast", "large"]
+    router.record("fast", 0.2, task="classify")
+    assert router.tier_order("classify") == ["large", "fast"]
+    # Half-open: the probe after the cooldown is judged on fresh numbers
+    assert router.tiers["fast"].latency_ewma is None
+    assert router.stats()["tiers"]["fast"]["degraded"]
+
+def test_consecutive_failures_degrade_but_a_success_resets_them(router):
+    router.record("fast", 0.01, error=TimeoutError("slow"), task="classify")
+    router.record("fast", 0.01, task="classify")
+    router.record("fast", 0.01, error=TimeoutError("slow"), task="classify")
+    assert router.tier_order("classify") == ["fast", "large"]
+    router.record("fast", 0.01, error=TimeoutError("slow"), task="classify")
+    assert router.tier_order("classify") == ["large", "fast"]
+    stats = router.stats()["tiers"]["fast"]
+    assert stats["failures"] == 3 and stats["timeouts"] == 3
+
+def test_a_timed_out_call_is_answered_by_the_fallback_tier(router):
+    slow(router, "fast", 0.2)
+    llm = router.for_task("classify")
+    result = llm.invoke(PROMPT, timeout=0.05)
+    assert result.response_metadata["tier"] == "large"
+    assert not llm.answered_by_primary(result)
+    stats = router.stats()
+    assert stats["fallbacks"] == 1
+    assert stats["tiers"]["fast"]["timeouts"] == 1 and stats["tiers"]["large"]["calls"] == 1
+    assert stats["task_calls"]["classify"] == 1
+
+def test_a_degraded_tier_is_skipped_until_its_cooldown_ends(router):
+    router.cooldown_seconds = 0.1
+    slow(router, "fast", 0.2)
+    llm = router.for_task("classify")
+    for _ in range(2):
+        llm.invoke(PROMPT, timeout=0.05)
+    assert router.fallbacks == 2
+    # Degraded: the fallback answers first, without waiting on the slow tier
+    assert llm.invoke(PROMPT, timeout=0.05).response_metadata["tier"] == "large"
+    assert router.fallbacks == 2 and router.tiers["fast"].calls == 2
+
+    time.sleep(0.15)
+    slow(router, "fast", 0.0)
+    result = llm.invoke(PROMPT, timeout=0.05)
+    assert result.response_metadata["tier"] == "fast" and llm.answered_by_primary(result)
+    assert not router.stats()["tiers"]["fast"]["degraded"]
+
+class RefusingModel:
+    def stream(self, input, config=None, **kwargs):
+        raise ConnectionError("connection refused")
+        yield
+
+def test_streams_fall_back_before_the_first_chunk(router, monkeypatch):
+    client = router.client
+    monkeypatch.setattr(router, "client", lambda tier, *args: RefusingModel() if tier == "fast" else client(tier, *args))
+    text = "".join(chunk.content for chunk in router.for_task("classify").stream(PROMPT))
+    assert "Main issue" in text
+    stats = router.stats()
+    assert stats["fallbacks"] == 1
+    assert stats["tiers"]["fast"]["failures"] == 1 and stats["tiers"]["large"]["calls"] == 1
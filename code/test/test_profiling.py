@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from pipelineRuntime.metrics import RequestTrace
+from pipelineRuntime.profiling import ProfileSession, current_session, profile_section
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("profile_dir", str(tmp_path))
+    monkeypatch.setenv("profile_interval", "0.001")
+    return tmp_path
+
+@pytest.fixture(params=["sync", "async"])
+def manager(request, workflow, async_workflow):
+    return workflow if request.param == "sync" else async_workflow
+
+@pytest.mark.parametrize("mode, files", [("sampling", {"folded", "summary"}), ("both", {"folded", "pstats", "summary"})])
+def test_a_profiled_request_writes_its_report(workflow, profile_dir, monkeypatch, mode, files):
+    monkeypatch.setenv("profile_mode", mode)
+    trace = RequestTrace()
+    assert "Incident details found" in workflow.invoke_chain("INC0000002", trace=trace, profile=True)
+    summary = trace.profile
+    assert set(summary["files"]) == files
+    for path in summary["files"].values():
+        assert path.startswith(str(profile_dir))
+    sections = [section["section"] for section in summary["sections"]]
+    assert sections[0] == "classify" and "node:query" in sections and "node:analyze" in sections
+    report = open(summary["files"]["summary"]).read()
+    assert report.startswith("Profile of 'INC0000002'") and "node:kb_search" in report
+
+def test_an_unprofiled_request_starts_no_profiler(manager, profile_dir, monkeypatch):
+    def refuse(self, *args, **kwargs):
+        raise AssertionError("an unprofiled request created a profile session")
+
+    monkeypatch.setattr(ProfileSession, "__init__", refuse)
+    trace = RequestTrace()
+    assert "Incident details found" in manager.invoke_chain("INC0000003", trace=trace)
+    assert trace.profile is None
+    assert list(profile_dir.iterdir()) == []
+    assert not any(thread.name == "profile-sampler" for thread in threading.enumerate())
+
+def test_sections_are_free_outside_a_profile():
+    with profile_section("node:query"):
+        assert current_session() is None
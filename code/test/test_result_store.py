@@ -0,0 +1,43 @@
+import time
+
+from langchainActions.result_store import ResultStore
+
+def test_values_are_visible_before_they_are_written(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"), flush_interval=1.0)
+    store.put("incident", "INC0000001", {"number": "INC0000001"})
+    assert store.get("incident", "INC0000001") == {"number": "INC0000001"}
+    store.flush()
+    assert store.count("incident") == 1
+
+def test_writes_are_committed_in_batches(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"), batch_size=100, flush_interval=0.2)
+    for index in range(50):
+        store.put("kb", f"key{index}", {"index": index})
+    store.flush()
+    assert store.count("kb") == 50
+    assert store.stats()["written"] == 50
+    assert store.stats()["batches"] < 50
+
+def test_values_survive_a_restart(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = ResultStore(path)
+    store.put("analysis", "abc", "1. **Main issue:** VPN")
+    store.flush()
+    assert ResultStore(path).get("analysis", "abc") == "1. **Main issue:** VPN"
+
+def test_expired_and_deleted_values_are_misses(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"), ttls={"kb": 0.05})
+    store.put("kb", "short", ["article"])
+    store.put("incident", "INC0000001", {"number": "INC0000001"})
+    store.delete("incident", "INC0000001")
+    store.flush()
+    time.sleep(0.1)
+    assert store.get("kb", "short") is None
+    assert store.get("incident", "INC0000001") is None
+
+def test_last_write_of_a_key_wins(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"), flush_interval=0.2)
+    for version in range(5):
+        store.put("incident", "INC0000001", {"version": version})
+    store.flush()
+    assert ResultStore(str(tmp_path / "results.db")).get("incident", "INC0000001") == {"version": 4}
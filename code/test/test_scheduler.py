@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pipelineRuntime.scheduler import QueueTimeout, UpstreamScheduler, request_priority, current_priority
+
+def test_aimd_grows_by_one_per_window_and_halves_on_throttle():
+    scheduler = UpstreamScheduler("test", max_concurrency=16, min_concurrency=1)
+    scheduler.limit = 4.0
+    for _ in range(4):
+        with scheduler.acquire():
+            pass
+    # +1/limit per success: a window of four successes adds just under one slot
+    assert 4.9 < scheduler.limit < 5.0
+    grown = scheduler.limit
+
+    with scheduler.acquire() as permit:
+        permit.throttled(retry_after=0.01)
+    assert scheduler.limit == pytest.approx(grown / 2)
+    assert scheduler.throttled == 1
+    assert scheduler.paused_until > 0
+
+def test_decrease_never_goes_below_min_concurrency():
+    scheduler = UpstreamScheduler("test", max_concurrency=8, min_concurrency=2)
+    for _ in range(5):
+        scheduler.last_decrease = 0.0
+        scheduler._decrease(time.monotonic(), 0.5)
+    assert scheduler.limit == 2.0
+
+def test_latency_over_target_cuts_the_limit():
+    scheduler = UpstreamScheduler("test", max_concurrency=10, latency_target=0.01)
+    with scheduler.acquire():
+        time.sleep(0.02)
+    assert scheduler.limit == pytest.approx(9.0)
+
+def test_interactive_waiter_is_served_before_bulk():
+    scheduler = UpstreamScheduler("test", max_concurrency=1, min_concurrency=1, interactive_reserve=0)
+    order = []
+    holder = scheduler.acquire(priority="interactive")
+
+    def wait(priority: str):
+        with scheduler.acquire(priority=priority, timeout=5):
+            order.append(priority)
+
+    bulk = threading.Thread(target=wait, args=("bulk",))
+    bulk.start()
+    while scheduler.stats()["queue_depth"] < 1:
+        time.sleep(0.001)
+    interactive = threading.Thread(target=wait, args=("interactive",))
+    interactive.start()
+    while scheduler.stats()["queue_depth"] < 2:
+        time.sleep(0.001)
+    holder.__exit__(None, None, None)
+    bulk.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "bulk"]
+
+def test_background_work_leaves_the_interactive_reserve_free():
+    scheduler = UpstreamScheduler("test", max_concurrency=4, min_concurrency=1, interactive_reserve=0.25)
+    permits = [scheduler.acquire(priority="bulk", timeout=1) for _ in range(3)]
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire(priority="bulk", timeout=0.05)
+    with scheduler.acquire(priority="interactive", timeout=0.05):
+        assert scheduler.in_flight == 4
+    for permit in permits:
+        permit.__exit__(None, None, None)
+    assert scheduler.timeouts == 1
+
+def test_request_bucket_spaces_out_calls():
+    scheduler = UpstreamScheduler("test", requests_per_minute=600, max_concurrency=4)
+    scheduler.requests.level = 1
+    started = time.monotonic()
+    for _ in range(2):
+        with scheduler.acquire(timeout=2):
+            pass
+    # 600 per minute refills one request every 0.1s
+    assert time.monotonic() - started >= 0.08
+
+def test_aacquire_waits_without_blocking_the_loop():
+    scheduler = UpstreamScheduler("test", max_concurrency=1, min_concurrency=1)
+
+    async def main():
+        order = []
+
+        async def call(name: str, hold: float):
+            with await scheduler.aacquire(timeout=2):
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        await asyncio.gather(call("first", 0.05), call("second", 0))
+        return order
+
+    assert asyncio.run(main()) == ["first", "second"]
+    assert scheduler.in_flight == 0
+
+def test_request_priority_is_scoped():
+    assert current_priority() == "interactive"
+    with request_priority("bulk"):
+        assert current_priority() == "bulk"
+    assert current_priority() == "interactive"
+    with pytest.raises(ValueError):
+        with request_priority("urgent"):
+            pass
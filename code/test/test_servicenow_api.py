@@ -0,0 +1,75 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import pytest
+
+from langchainActions.async_servicenow_tools import AsyncServiceNowAPI
+from langchainActions.servicenow_tools import ServiceNowAPI
+from pipelineRuntime.scheduler import UpstreamScheduler
+
+PARAMS = {"sysparm_query": "number=INC0000001", "sysparm_limit": "1"}
+
+@pytest.fixture
+def make_api(monkeypatch):
+    """ServiceNowAPI with its own scheduler, so the 429s here do not pause the shared one."""
+    monkeypatch.setenv("snow_max_retry_after", "0.2")
+
+    def make(cls=ServiceNowAPI, max_retries: int = 2):
+        api = cls(max_retries=max_retries, backoff_factor=0.01)
+        api.scheduler = UpstreamScheduler("snow-test")
+        return api
+    return make
+
+def test_503s_are_retried_within_the_budget(make_api, snow, snow_url):
+    api = make_api(max_retries=2)
+    snow.failures.extend([(503, None), (503, None)])
+    data = api.get_details(f"{snow_url}/incident", PARAMS)
+    assert data["result"][0]["number"] == "INC0000001"
+    assert snow.calls["incident"] == 3
+    assert api.pool_stats()["errors"] == 0
+
+def test_an_exhausted_budget_gives_an_empty_result(make_api, snow, snow_url):
+    api = make_api(max_retries=2)
+    snow.failures.extend([(503, None)] * 3)
+    assert api.get_details(f"{snow_url}/incident", PARAMS) == {}
+    assert snow.calls["incident"] == 3
+    stats = api.pool_stats()
+    assert stats["requests"] == 1 and stats["errors"] == 1
+
+def test_retry_after_is_honoured_up_to_the_cap(make_api, snow, snow_url):
+    api = make_api(max_retries=1)
+    snow.failures.append((429, "30"))
+    started = time.monotonic()
+    assert api.get_details(f"{snow_url}/incident", PARAMS)["result"]
+    elapsed = time.monotonic() - started
+    # Retry-After asked for 30s; snow_max_retry_after cuts it to 0.2s
+    assert 0.2 <= elapsed < 2.0
+    assert snow.calls["incident"] == 2
+    assert api.scheduler.stats()["throttled"] == 1
+
+def test_pool_stats_show_one_kept_alive_connection(make_api, snow, snow_url):
+    api = make_api()
+    for number in ("INC0000001", "INC0000002", "INC0000003"):
+        api.get_details(f"{snow_url}/incident", {"sysparm_query": f"number={number}"})
+    stats = api.pool_stats()
+    assert stats["requests"] == 3 and stats["errors"] == 0
+    host = stats["hosts"][f"http://127.0.0.1:{urlsplit(snow_url).port}"]
+    assert host["connections_opened"] == 1 and host["requests_sent"] == 3
+    assert host["idle_connections"] == 1 and host["max_size"] == api.pool_size
+
+def test_async_reads_follow_the_same_retry_policy(make_api, snow):
+    api = snow.install(make_api(AsyncServiceNowAPI, max_retries=2))
+    snow.failures.extend([(429, "30"), (503, None)])
+    url = "https://snow.test/api/now/table/incident"
+
+    started = time.monotonic()
+    data = asyncio.run(api.get_details(url, PARAMS))
+    assert data["result"][0]["number"] == "INC0000001"
+    assert 0.2 <= time.monotonic() - started < 2.0
+    assert snow.calls["incident"] == 3
+
+    snow.failures.extend([(503, None)] * 3)
+    assert asyncio.run(api.get_details(url, PARAMS)) == {}
+    stats = api.pool_stats()
+    assert stats["requests"] == 2 and stats["errors"] == 1 and stats["in_flight"] == 0
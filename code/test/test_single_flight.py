@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from langchainActions.single_flight import AsyncSingleFlight, SingleFlight
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fetch(number: str) -> str:
+        calls.append(number)
+        release.wait(5)
+        return f"details of {number}"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("INC1", fetch, "INC1"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ["INC1"]
+    assert results == ["details of INC1"] * 5
+    assert flight.stats()["executions"] == 1
+    assert flight.in_flight() == 0
+
+def test_joiners_receive_the_leaders_exception():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    joiner = threading.Thread(target=call)
+    joiner.start()
+    while flight.stats()["coalesced"] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    joiner.join(5)
+    assert errors == ["upstream down", "upstream down"]
+
+def test_calls_after_completion_run_again():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+    assert flight.stats()["executions"] == 2
+
+def test_async_callers_share_one_execution():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch(number: str) -> str:
+        calls.append(number)
+        await asyncio.sleep(0.02)
+        return f"details of {number}"
+
+    async def main():
+        return await asyncio.gather(*(flight.do(("incident", "INC1"), fetch, "INC1") for _ in range(4)))
+
+    assert asyncio.run(main()) == ["details of INC1"] * 4
+    assert calls == ["INC1"]
+    assert flight.stats()["coalesced"] == 3
+
+def test_async_joiner_timing_out_does_not_cancel_the_shared_call():
+    flight = AsyncSingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flight.do("key", slow), 0.01)
+        return await leader
+
+    assert asyncio.run(main()) == "done"
+
+def test_a_cancelled_async_leader_does_not_cancel_its_joiners():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fetch() -> str:
+        calls.append(len(calls))
+        await asyncio.sleep(0.05)
+        return "details"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0.01)
+        joiners = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*joiners)
+
+    assert asyncio.run(main()) == ["details"] * 3
+    # One joiner took over as leader, the others joined it
+    assert calls == [0, 1]
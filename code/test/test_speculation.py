@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+from fake_servicenow import INCIDENT_TABLE
+
+from pipelineRuntime.deadline import remaining, request_deadline
+
+@pytest.fixture
+def speculating(workflow):
+    workflow.speculator.enabled = True
+    return workflow
+
+def test_candidates_are_unique_and_capped(speculating):
+    speculator = speculating.speculator
+    assert speculator.candidates("inc0000001, INC0000001 then INC0000002 and INC0000003") == ["INC0000001", "INC0000002"]
+    assert speculator.candidates("hello") == []
+
+def test_rule_routed_incident_is_fetched_once_and_confirmed(speculating, snow):
+    response = speculating.invoke_chain("INC0000002")
+    assert "Incident details found" in response
+    stats = speculating.speculation_stats()
+    assert stats["started"] == 1 and stats["confirmed"] == 1 and stats["discarded"] == 0
+    # The workflow's query step joined the speculative fetch or hit the cache it filled
+    assert snow.calls[INCIDENT_TABLE] == 1
+
+def test_speculation_disagreeing_with_the_classifier_is_discarded(speculating):
+    speculator = speculating.speculator
+    lookups = speculator.start("anything like INC0000003 in the kb?")
+    assert speculator.resolve(lookups, {"action_type": "kb_search", "confidence": 0.9}) is None
+    assert lookups["INC0000003"].outcome == "discarded"
+    stats = speculating.speculation_stats()
+    assert stats["started"] == 1 and stats["discarded"] == 1 and stats["confirmed"] == 0
+
+def test_short_description_does_not_count_as_a_cache_lookup(speculating):
+    tools = speculating.snow_tools
+    tools.query_incident("INC0000004")
+    before = tools.incident_cache.hits, tools.incident_cache.misses
+    assert speculating.speculator.short_description("INC0000004")
+    assert speculating.speculator.short_description("INC0009999") is None
+    assert (tools.incident_cache.hits, tools.incident_cache.misses) == before
+
+def test_speculative_fetch_runs_under_the_request_deadline(speculating):
+    seen = {}
+    done = threading.Event()
+
+    def query_incident(incident_number):
+        seen["remaining"] = remaining()
+        done.set()
+        return "Incident not found."
+
+    speculating.snow_tools.query_incident = query_incident
+    with request_deadline(5):
+        speculating.speculator.start("INC0000005")
+    assert done.wait(1)
+    assert seen["remaining"] is not None and seen["remaining"] <= 5
+
+def test_disabled_speculator_starts_nothing(workflow, snow):
+    assert workflow.speculate("INC0000006") == {}
+    assert workflow.speculation_stats()["started"] == 0
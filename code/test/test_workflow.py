@@ -0,0 +1,74 @@
+import pytest
+
+from langchainActions.servicenow_tools import IncidentStatus, WorkflowManager
+
+@pytest.fixture(params=["sync", "async"])
+def manager(request, workflow, async_workflow):
+    return workflow if request.param == "sync" else async_workflow
+
+def test_incident_request_runs_query_analyze_and_kb_search(manager, snow):
+    response = manager.invoke_chain("what is going on with INC0000002")
+    assert "Incident details found: Short Description: File share access denied for team folder" in response
+    assert "Analysis complete:" in response
+    assert "KB articles found" in response and "re-apply the folder ACL" in response
+
+def test_stream_matches_invoke(manager):
+    streamed = "".join(manager.stream_chain("INC0000003"))
+    assert streamed == manager.invoke_chain("INC0000003")
+
+def test_unknown_incident_ends_after_the_query(manager):
+    response = manager.invoke_chain("INC0009999")
+    assert response.endswith("Incident not found.")
+    assert "Analysis" not in response
+
+def test_kb_search_request(manager):
+    response = manager.invoke_chain("search the kb for printer offline")
+    assert response.startswith("KB articles found")
+    assert "restart the spooler service" in response
+
+def test_conversation_request(manager):
+    assert "fake model" in manager.invoke_chain("hi")
+
+def test_routing_follows_the_status_field():
+    assert WorkflowManager.get_next_step({"status": IncidentStatus.FOUND}) == "analyze"
+    assert WorkflowManager.get_next_step({"status": IncidentStatus.ANALYZED}) == "kb_search"
+    for status in (IncidentStatus.NOT_FOUND, IncidentStatus.ERROR, IncidentStatus.PARTIAL, IncidentStatus.DONE):
+        assert WorkflowManager.get_next_step({"status": status}) == "end"
+
+def test_concurrent_requests_for_one_incident_share_the_pipeline(workflow, snow):
+    from concurrent.futures import ThreadPoolExecutor
+    snow.latency = 0.05
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(workflow.invoke_chain, ["INC0000004"] * 4))
+    assert len(set(responses)) == 1
+    assert workflow.coalescing_stats()["pipeline"]["coalesced"] >= 1
+
+def test_stopping_a_stream_early_cancels_the_request(async_workflow):
+    import asyncio
+    import threading
+    closed = threading.Event()
+
+    async def astream_chain(user_input, trace=None, profile=None):
+        try:
+            yield "first"
+            await asyncio.sleep(5)
+            yield "never"
+        finally:
+            closed.set()
+
+    async_workflow.astream_chain = astream_chain
+    stream = async_workflow.stream_chain("INC0000001")
+    assert next(stream) == "first"
+    stream.close()
+    assert closed.wait(1)
+
+@pytest.mark.parametrize("mode", ["stream", "json"])
+def test_sync_and_async_classification_agree(mode, monkeypatch):
+    import asyncio
+    from createModels.model_actions import InputAnalyzer
+    monkeypatch.setenv("intent_output_mode", mode)
+    analyzer = InputAnalyzer()
+    text = "compare INC0000001 and INC0000002"
+    sync = analyzer.analyze_input(text)
+    assert asyncio.run(analyzer.aanalyze_input(text)) == sync
+    assert sync["tier"] == "llm"